@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+
+from database.config import get_settings
+from routes.auth import auth_router
+from routes.event import event_router
+from routes.predict import predict_router
+from services.health import create_monitor
+from services.metrics import HTTP_REQUEST_SECONDS, REGISTRY, SharedMetrics
+from services.ml.runtime import MLRuntime
+from services.ratelimit import RateLimiter, database_balance_lookup
+from services.startup import StartupTimer
+
+# С preload_app модуль импортируется в мастере gunicorn, поэтому здесь только
+# время импорта; таймер запуска заводит каждый воркер в lifespan
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timer = StartupTimer()
+    timer.record("import_app", _IMPORT_SECONDS)
+    app.state.timer = timer
+    settings = get_settings()
+    # Под gunicorn у каждого воркера свой реестр: /metrics складывает их снимки
+    app.state.metrics = SharedMetrics(
+        settings.METRICS_DIR, interval=settings.METRICS_FLUSH_INTERVAL,
+    ).start() if settings.METRICS_DIR else None
+    ml = MLRuntime(settings, timer)
+    app.state.ml = ml
+    # Число воркеров проставляет gunicorn.conf.py (post_fork), без gunicorn процесс один
+    app.state.rate_limiter = RateLimiter(
+        database_balance_lookup, tier_ttl=settings.RATE_LIMIT_TIER_TTL,
+        workers=int(os.getenv("WEB_WORKERS", "1")),
+    ) if settings.RATE_LIMIT_ENABLED else None
+    app.state.producer = None
+    if settings.RABBITMQ_URL:
+        from services.ml.pipeline import PredictionProducer, RabbitMQBroker
+
+        # Соединение откроется при первой публикации
+        app.state.producer = PredictionProducer(RabbitMQBroker(
+            settings.RABBITMQ_URL, max_pending=settings.PREDICTION_QUEUE_MAX_PENDING))
+    if settings.MODEL_LOADING == "eager":
+        if not await ml.ensure_loaded():
+            # Сервис стартует неготовым, загрузка повторяется в фоне
+            ml.start_background()
+    elif settings.MODEL_LOADING == "background":
+        ml.start_background()
+    compactor = None
+    if settings.LEDGER_COMPACTOR_ENABLED:
+        from database.database import get_database_engine
+        from services.ledger import LedgerCompactor
+
+        compactor = LedgerCompactor(get_database_engine(), settings.LEDGER_SNAPSHOT_EVERY,
+                                    settings.LEDGER_COMPACTION_INTERVAL).start()
+    health = create_monitor(settings, ml).start()
+    app.state.health = health
+    timer.record("serving", timer.uptime)
+    yield
+    await health.stop()
+    if compactor is not None:
+        compactor.stop()
+    await ml.shutdown()
+    if app.state.producer is not None:
+        app.state.producer.close()
+    if app.state.metrics is not None:
+        app.state.metrics.stop()
+
+
+async def _profile(request: Request, call_next) -> HTMLResponse:
+    """Выполняет запрос под сэмплирующим профилировщиком и отдаёт отчёт вместо ответа"""
+    from pyinstrument import Profiler
+
+    profiler = Profiler(interval=0.001, async_mode="enabled")
+    profiler.start()
+    response = await call_next(request)
+    async for _ in response.body_iterator:
+        pass
+    profiler.stop()
+    return HTMLResponse(profiler.output_html())
+
+
+def create_app() -> FastAPI:
+    settings = get_settings()
+    app = FastAPI(title=settings.APP_NAME, description=settings.APP_DESCRIPTION,
+                  version=settings.API_VERSION, lifespan=lifespan)
+
+    @app.middleware("http")
+    async def observe_requests(request: Request, call_next):
+        if settings.PROFILING_ENABLED and request.headers.get("X-Profile"):
+            return await _profile(request, call_next)
+        started = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(response.status_code))
+        return response
+
+    @app.get("/health")
+    async def health() -> dict:
+        """Liveness: процесс жив и обслуживает запросы"""
+        return {"status": "ok"}
+
+    @app.get("/ready")
+    async def ready(request: Request) -> JSONResponse:
+        """
+        Readiness: база отвечает, модель загружена и прогрета, плюс тайминги запуска.
+
+        Отдаёт последний результат фоновых проверок (services.health) и сам
+        к зависимостям не обращается.
+        """
+        state = request.app.state.health.snapshot()
+        startup = request.app.state.timer.phases
+        return JSONResponse(
+            {**state, "error": request.app.state.ml.error, "startup": startup},
+            status_code=200 if state["ready"] else 503)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics(request: Request) -> PlainTextResponse:
+        """Метрики всех воркеров при METRICS_DIR, иначе только этого процесса"""
+        shared = request.app.state.metrics
+        body = await asyncio.to_thread(shared.render) if shared is not None \
+            else REGISTRY.render()
+        return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+    app.include_router(auth_router)
+    app.include_router(predict_router)
+    app.include_router(event_router)
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("api:app", host="0.0.0.0", port=8080)
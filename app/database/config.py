@@ -0,0 +1,172 @@
+import secrets
+from decimal import Decimal
+from functools import lru_cache
+from typing import Literal, Optional
+
+from pydantic import Field, SecretStr
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Настройки приложения, читаются из переменных окружения и app/.env.
+
+    Attributes:
+        DATABASE_URL (Optional[str]): явный URL базы (например sqlite:///./app.db),
+            иначе URL собирается из DB_HOST/DB_PORT/DB_USER/DB_PASS/DB_NAME
+        DB_POOL_SIZE (int): число постоянных соединений в пуле
+        DB_MAX_OVERFLOW (int): сколько соединений можно открыть сверх пула
+        DB_POOL_TIMEOUT (float): ожидание свободного соединения, секунды
+        DB_POOL_RECYCLE (int): пересоздавать соединения старше, секунды
+        DB_POOL_PRE_PING (bool): проверять соединение перед выдачей из пула
+        EVENT_PARTITIONING (bool): создавать таблицу событий секционированной по месяцам (только Postgres)
+        EVENT_PARTITION_MONTHS_AHEAD (int): на сколько месяцев вперёд заводить секции событий
+        MODEL_PATH (str): путь до весов классификатора (.npz)
+        MODEL_LOADING (str): когда загружать модель - eager (до начала обслуживания),
+            background (фоновый прогрев после старта) или lazy (при первом запросе)
+        MODEL_RETRY_INTERVAL (float): пауза перед повторной загрузкой модели после ошибки, секунды
+            (удваивается с каждой неудачей)
+        MODEL_RETRY_MAX_INTERVAL (float): предел паузы между повторными загрузками, секунды
+        MODEL_BACKEND (str): чем выполнять прямой проход - numpy, onnx или onnx-int8
+        INFERENCE_INTRA_OP_THREADS (Optional[int]): потоков на операцию модели (по умолчанию - ядра процесса)
+        INFERENCE_INTER_OP_THREADS (int): потоков для независимых операций графа (ONNX)
+        INFERENCE_PIN_THREADS (bool): закреплять каждый воркер gunicorn за своей частью ядер
+        INT8_MIN_AGREEMENT (float): минимальное совпадение top-1 int8 с float, иначе float
+        MODEL_MANIFEST (Optional[str]): JSON-манифест с версиями моделей для реестра
+        MODEL_REGISTRY_MAX_MODELS (int): сколько моделей держать загруженными
+        MODEL_REGISTRY_MAX_BYTES (Optional[int]): лимит памяти под веса моделей
+        UPLOAD_MAX_BYTES (int): максимальный размер загружаемого изображения
+        UPLOAD_MEMORY_BYTES (int): сколько байт загрузки держать в памяти до выгрузки на диск
+        UPLOAD_MAX_IN_FLIGHT (int): сколько загрузок обрабатывается одновременно
+        UPLOAD_MAX_PIXELS (int): максимальное число пикселей декодируемого изображения
+            (JPEG - после масштабирования при декодировании), больше - 413
+        PREPROCESS_WORKERS (int): потоков для декодирования изображений
+        PREDICTION_CACHE_ENTRIES (int): размер кеша прогнозов /predict в памяти, 0 - кеш выключен
+        PREDICTION_CACHE_DIR (Optional[str]): каталог дискового уровня кеша прогнозов
+        PREDICTION_CACHE_TTL (Optional[float]): время жизни записи на диске, секунды
+        PREDICTION_CACHE_EVICT_INTERVAL (float): как часто удалять просроченные записи с диска, секунды
+        INFERENCE_QUEUE_SLO (float): допустимое ожидание в очереди к модели, дольше - отказ сразу, секунды
+        INFERENCE_QUEUE_TIMEOUT (float): через сколько секунд задание в очереди к модели отбрасывается
+        INFERENCE_MAX_QUEUED (int): предел числа заданий в очереди к модели
+        PASSWORD_HASH_WORKERS (Optional[int]): процессов для хеширования паролей (по умолчанию - число CPU)
+        USER_CACHE_MAX_ENTRIES (int): размер кеша пользователей в памяти процесса
+        USER_CACHE_TTL (float): время жизни записи кеша пользователей, секунды
+        LEDGER_SNAPSHOT_EVERY (int): снимок баланса на каждые столько транзакций пользователя
+        LEDGER_COMPACTOR_ENABLED (bool): поддерживать снимки балансов фоновым потоком приложения
+        LEDGER_COMPACTION_INTERVAL (float): пауза между проходами компактора, секунды
+        RABBITMQ_URL (Optional[str]): адрес RabbitMQ; если задан - проверяется в /ready и
+            включает асинхронные вызовы модели (POST /events/model-call)
+        PREDICTION_QUEUE_MAX_PENDING (int): предел длины очереди прогнозов, 0 - без ограничения
+        PREDICTION_WORKERS_PER_CORE (int): процессов-обработчиков очереди на ядро
+        PREDICTION_PREFETCH (int): сколько неподтверждённых заданий держит один обработчик
+        PREDICTION_UPLOAD_DIR (str): каталог изображений асинхронных вызовов, общий для API
+            и обработчиков
+        MODEL_CALL_PRICE (Decimal): стоимость вызова модели, списывается при постановке в очередь
+        HEALTH_CHECK_INTERVAL (float): как часто проверять базу, брокер и модель для /ready, секунды
+        HEALTH_CHECK_TIMEOUT (float): предел времени одной проверки, секунды
+        RATE_LIMIT_ENABLED (bool): лимит запросов к модели на пользователя (корзины - в памяти
+            каждого воркера, лимит уровня делится между воркерами gunicorn поровну)
+        RATE_LIMIT_TIER_TTL (float): как долго кешировать уровень лимита пользователя, секунды
+        TRUST_USER_ID_HEADER (bool): доверять заголовку X-User-Id; включать, только если прокси
+            перед приложением перезаписывает его аутентифицированным пользователем
+        AUTH_SECRET (SecretStr): ключ подписи токенов доступа (POST /auth/token); по умолчанию
+            случайный при запуске - общий для воркеров gunicorn (настройки читаются в мастере
+            до fork), но токены не переживают перезапуск
+        AUTH_TOKEN_TTL (float): время жизни токена доступа, секунды
+        PROFILING_ENABLED (bool): разрешить профилирование запроса по заголовку X-Profile
+        METRICS_DIR (Optional[str]): общий каталог снимков метрик процессов, /metrics отдаёт
+            их сумму (services.metrics.SharedMetrics); gunicorn.conf.py по умолчанию
+            заводит временный, без него /metrics отдаёт метрики одного процесса
+        METRICS_FLUSH_INTERVAL (float): как часто процесс записывает снимок метрик, секунды
+    """
+    DB_HOST: Optional[str] = None
+    DB_PORT: Optional[int] = 5432
+    DB_USER: Optional[str] = None
+    DB_PASS: Optional[str] = None
+    DB_NAME: Optional[str] = None
+    DATABASE_URL: Optional[str] = None
+
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    EVENT_PARTITIONING: bool = False
+    EVENT_PARTITION_MONTHS_AHEAD: int = 3
+
+    MODEL_PATH: str = "model.npz"
+    MODEL_LOADING: Literal["eager", "background", "lazy"] = "background"
+    MODEL_RETRY_INTERVAL: float = 1.0
+    MODEL_RETRY_MAX_INTERVAL: float = 60.0
+    MODEL_BACKEND: Literal["numpy", "onnx", "onnx-int8"] = "numpy"
+    INFERENCE_INTRA_OP_THREADS: Optional[int] = None
+    INFERENCE_INTER_OP_THREADS: int = 1
+    INFERENCE_PIN_THREADS: bool = False
+    INT8_MIN_AGREEMENT: float = 0.98
+    MODEL_MANIFEST: Optional[str] = None
+    MODEL_REGISTRY_MAX_MODELS: int = 4
+    MODEL_REGISTRY_MAX_BYTES: Optional[int] = None
+    UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024
+    UPLOAD_MEMORY_BYTES: int = 1024 * 1024
+    UPLOAD_MAX_IN_FLIGHT: int = 32
+    UPLOAD_MAX_PIXELS: int = 4096 * 4096
+    PREPROCESS_WORKERS: int = 4
+    PREDICTION_CACHE_ENTRIES: int = 4096
+    PREDICTION_CACHE_DIR: Optional[str] = None
+    PREDICTION_CACHE_TTL: Optional[float] = None
+    PREDICTION_CACHE_EVICT_INTERVAL: float = 600.0
+    INFERENCE_QUEUE_SLO: float = 1.0
+    INFERENCE_QUEUE_TIMEOUT: float = 5.0
+    INFERENCE_MAX_QUEUED: int = 1024
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    USER_CACHE_MAX_ENTRIES: int = 10_000
+    USER_CACHE_TTL: float = 30.0
+    LEDGER_SNAPSHOT_EVERY: int = 1000
+    LEDGER_COMPACTOR_ENABLED: bool = False
+    LEDGER_COMPACTION_INTERVAL: float = 60.0
+    RABBITMQ_URL: Optional[str] = None
+    PREDICTION_QUEUE_MAX_PENDING: int = 10_000
+    PREDICTION_WORKERS_PER_CORE: int = 1
+    PREDICTION_PREFETCH: int = 8
+    PREDICTION_UPLOAD_DIR: str = "uploads"
+    MODEL_CALL_PRICE: Decimal = Decimal("0.01")
+    HEALTH_CHECK_INTERVAL: float = 10.0
+    HEALTH_CHECK_TIMEOUT: float = 2.0
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_TIER_TTL: float = 30.0
+    TRUST_USER_ID_HEADER: bool = False
+    AUTH_SECRET: SecretStr = Field(default_factory=lambda: SecretStr(secrets.token_urlsafe(32)))
+    AUTH_TOKEN_TTL: float = 3600.0
+    PROFILING_ENABLED: bool = False
+    METRICS_DIR: Optional[str] = None
+    METRICS_FLUSH_INTERVAL: float = 1.0
+
+    APP_NAME: str = "Birds classification"
+    APP_DESCRIPTION: str = "Сервис по классификации птиц по изображению"
+    DEBUG: bool = False
+    API_VERSION: str = "1.0"
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    @property
+    def DATABASE_URL_psycopg(self) -> str:
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
+        return (f"postgresql+psycopg2://{self.DB_USER}:{self.DB_PASS}"
+                f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}")
+
+    @property
+    def DATABASE_URL_asyncpg(self) -> str:
+        url = self.DATABASE_URL_psycopg
+        if url.startswith("sqlite://"):
+            return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.DATABASE_URL_psycopg.startswith("sqlite")
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    return Settings()
@@ -0,0 +1,101 @@
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterator
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.config import get_settings
+from services.metrics import instrument_engine
+
+
+def _engine_options() -> Dict:
+    settings = get_settings()
+    options = {"echo": settings.DEBUG, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if settings.is_sqlite:
+        # Ждать освобождения блокировки записи, а не падать с "database is locked"
+        options["connect_args"] = {"timeout": 30}
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+@lru_cache()
+def get_database_engine():
+    """Синхронный движок, один на процесс"""
+    engine = create_engine(get_settings().DATABASE_URL_psycopg, **_engine_options())
+    instrument_engine(engine)
+    return engine
+
+
+@lru_cache()
+def get_async_engine() -> AsyncEngine:
+    """Асинхронный движок (asyncpg / aiosqlite), один на процесс"""
+    engine = create_async_engine(get_settings().DATABASE_URL_asyncpg, **_engine_options())
+    instrument_engine(engine)
+    return engine
+
+
+@lru_cache()
+def get_async_session_maker() -> async_sessionmaker:
+    return async_sessionmaker(get_async_engine(), class_=AsyncSession,
+                              expire_on_commit=False)
+
+
+def get_session() -> Iterator[Session]:
+    with Session(get_database_engine()) as session:
+        yield session
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with get_async_session_maker()() as session:
+        yield session
+
+
+def _import_models() -> None:
+    # Таблицы регистрируются в metadata при импорте моделей
+    import models.event  # noqa: F401
+    import models.user  # noqa: F401
+    import models.wallet  # noqa: F401
+
+
+def _create_schema(conn) -> None:
+    from database.partitioning import create_partitioned_event
+    from database.schema import ensure_columns, ensure_indexes, ensure_timestamptz
+
+    settings = get_settings()
+    if settings.EVENT_PARTITIONING and conn.dialect.name == "postgresql":
+        # До create_all: существующую таблицу он не трогает
+        create_partitioned_event(conn, settings.EVENT_PARTITION_MONTHS_AHEAD)
+    SQLModel.metadata.create_all(conn)
+    # Колонки и индексы, добавленные в модели после создания таблиц
+    ensure_columns(conn)
+    ensure_timestamptz(conn)
+    ensure_indexes(conn)
+
+
+def init_db(drop_all: bool = False) -> None:
+    _import_models()
+    engine = get_database_engine()
+    if drop_all:
+        SQLModel.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        _create_schema(conn)
+
+
+async def init_db_async(drop_all: bool = False) -> None:
+    _import_models()
+    async with get_async_engine().begin() as conn:
+        if drop_all:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(_create_schema)
+
+
+if __name__ == "__main__":
+    # Создание схемы - отдельный шаг деплоя: python -m database.database
+    init_db()
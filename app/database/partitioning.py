@@ -0,0 +1,134 @@
+"""
+Помесячное секционирование таблицы событий на Postgres.
+
+Секционированная таблица event создаётся вместо обычной (PARTITION BY
+RANGE (created_at)): запросы за период читают только нужные месяцы, а
+старые месяцы удаляются DROP TABLE секции вместо DELETE. Первичный ключ
+секционированной таблицы обязан включать ключ секционирования, поэтому
+он (id, created_at); id по-прежнему выдаётся последовательностью.
+
+Секции создаются заранее на months_ahead месяцев вперёд (ensure_partitions
+надо вызывать периодически, например при каждом деплое и раз в сутки).
+Строки вне созданных месяцев попадают в секцию event_default; пока там
+есть строки за какой-то месяц, секцию этого месяца создать нельзя.
+
+Включается настройкой EVENT_PARTITIONING, на SQLite не действует.
+"""
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import Connection, Engine, inspect, text
+from sqlalchemy.schema import CreateTable
+
+from models.event import Event
+
+DEFAULT_PARTITION = "event_default"
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"event_y{month.year}m{month.month:02d}"
+
+
+def partitioned_event_ddl(bind: Connection) -> str:
+    """CREATE TABLE event из модели, но секционированной по created_at"""
+    ddl = str(CreateTable(Event.__table__).compile(dialect=bind.dialect)).strip()
+    if "PRIMARY KEY (id)" not in ddl:
+        raise RuntimeError("Unexpected event table DDL, primary key not found")
+    ddl = ddl.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, created_at)")
+    return f"{ddl} PARTITION BY RANGE (created_at)"
+
+
+def is_partitioned(bind: Connection, table: str = "event") -> bool:
+    return bind.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table"), {"table": table}).first() is not None
+
+
+def ensure_partitions(bind: Connection, months_ahead: int = 3,
+                      since: Optional[date] = None) -> List[str]:
+    """
+    Создаёт недостающие помесячные секции от since (по умолчанию - текущий
+    месяц) до months_ahead месяцев вперёд, и секцию по умолчанию.
+
+    Возвращает имена созданных секций.
+    """
+    existing = set(inspect(bind).get_table_names())
+    month = _month_start(since or datetime.now(timezone.utc).date())
+    last = _add_months(_month_start(datetime.now(timezone.utc).date()), months_ahead)
+    created = []
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            upper = _add_months(month, 1)
+            bind.execute(text(
+                f"CREATE TABLE {name} PARTITION OF event "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') "
+                f"TO ('{upper.isoformat()} 00:00+00')"))
+            created.append(name)
+        month = _add_months(month, 1)
+    if DEFAULT_PARTITION not in existing:
+        bind.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF event DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+    return created
+
+
+def create_partitioned_event(bind: Connection, months_ahead: int = 3) -> bool:
+    """Создаёт секционированную event, если таблицы ещё нет; True - создана"""
+    if inspect(bind).has_table(Event.__tablename__):
+        return False
+    bind.execute(text(partitioned_event_ddl(bind)))
+    ensure_partitions(bind, months_ahead)
+    return True
+
+
+def migrate_event_to_partitioned(engine: Engine, months_ahead: int = 3) -> int:
+    """
+    Переносит существующую обычную таблицу event в секционированную.
+
+    В одной транзакции: старая таблица переименовывается в event_unpartitioned
+    (вместе с последовательностью, ключом и индексами, чтобы имена не
+    конфликтовали), создаётся секционированная с секциями от месяца самого
+    старого события, данные копируются, последовательность id продолжается.
+    Старую таблицу после проверки удалить вручную. Пишущие в event на время
+    миграции надо остановить. Возвращает число перенесённых строк.
+    """
+    from database.schema import ensure_indexes
+
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return 0
+        old = "event_unpartitioned"
+        conn.execute(text(f"ALTER TABLE event RENAME TO {old}"))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS event_id_seq RENAME TO {old}_id_seq"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS event_pkey RENAME TO {old}_pkey"))
+        for index in Event.__table__.indexes:
+            conn.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {old}_{index.name}"))
+        oldest = conn.execute(text(f"SELECT min(created_at) FROM {old}")).scalar()
+        conn.execute(text(partitioned_event_ddl(conn)))
+        ensure_partitions(conn, months_ahead, since=oldest.date() if oldest else None)
+        columns = ", ".join(column.name for column in Event.__table__.columns)
+        moved = conn.execute(text(
+            f"INSERT INTO event ({columns}) SELECT {columns} FROM {old}")).rowcount
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('event', 'id'), "
+            "coalesce((SELECT max(id) FROM event), 0) + 1, false)"))
+        ensure_indexes(conn)
+    return moved
+
+
+if __name__ == "__main__":
+    # Досоздание секций по расписанию: python -m database.partitioning
+    from database.config import get_settings
+    from database.database import get_database_engine
+
+    with get_database_engine().begin() as connection:
+        print(ensure_partitions(connection, get_settings().EVENT_PARTITION_MONTHS_AHEAD))
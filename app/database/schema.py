@@ -0,0 +1,129 @@
+"""
+Изменения схемы, которые create_all не делает сам.
+
+create_all создаёт индексы и колонки только вместе с новой таблицей, поэтому
+индексы и nullable-колонки, добавленные в модели позже, досоздаются здесь
+(ALTER TABLE ... ADD COLUMN). Колонки NOT NULL без значения по умолчанию так
+не добавить - для них нужна ручная миграция. Колонки времени, ставшие в
+модели timezone-aware, переводятся на Postgres в timestamptz (старые
+значения - UTC). Здесь же - разбор планов запросов (EXPLAIN), чтобы
+проверять, что горячие запросы идут по индексам.
+"""
+from typing import List, Union
+
+from sqlalchemy import Connection, DateTime, Engine, inspect, text
+from sqlalchemy.sql import Executable
+from sqlmodel import SQLModel
+
+Bind = Union[Engine, Connection]
+
+
+def ensure_indexes(bind: Bind) -> List[str]:
+    """Создаёт недостающие индексы всех таблиц, возвращает имена созданных"""
+    created = []
+    inspector = inspect(bind)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind)
+                created.append(index.name)
+    return created
+
+
+def ensure_columns(bind: Bind) -> List[str]:
+    """Добавляет недостающие nullable-колонки существующих таблиц, возвращает их имена"""
+    added = []
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                raise RuntimeError(f"Column {table.name}.{column.name} is NOT NULL, "
+                                   "add it with a manual migration")
+            column_type = column.type.compile(dialect=bind.dialect)
+            _execute_ddl(bind, f"ALTER TABLE {preparer.format_table(table)} "
+                               f"ADD COLUMN {preparer.format_column(column)} {column_type}")
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _execute_ddl(bind: Bind, statement: str) -> None:
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            conn.execute(text(statement))
+    else:
+        bind.execute(text(statement))
+
+
+def ensure_timestamptz(bind: Bind) -> List[str]:
+    """
+    Переводит в timestamptz колонки, которые в модели DateTime(timezone=True),
+    а в базе - timestamp without time zone; возвращает их имена.
+
+    Только Postgres: asyncpg не принимает aware datetime для колонок без
+    часового пояса. Ключ секционирования event так не изменить (Postgres
+    запрещает ALTER TYPE колонки ключа) - для него RuntimeError с просьбой
+    о ручной миграции, а не молчаливо сломанные запросы.
+    """
+    if bind.dialect.name != "postgresql":
+        return []
+    changed = []
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if not (isinstance(column.type, DateTime) and column.type.timezone):
+                continue
+            current = existing.get(column.name)
+            if current is None or getattr(current, "timezone", True):
+                continue
+            name = preparer.format_column(column)
+            if table.name == "event" and column.name == "created_at" \
+                    and _is_partitioned(bind):
+                raise RuntimeError(
+                    "event.created_at is the partition key and is timestamp without time "
+                    "zone; recreate the partitioned event table with timestamptz manually")
+            _execute_ddl(bind, f"ALTER TABLE {preparer.format_table(table)} "
+                               f"ALTER COLUMN {name} TYPE TIMESTAMP WITH TIME ZONE "
+                               f"USING {name} AT TIME ZONE 'UTC'")
+            changed.append(f"{table.name}.{column.name}")
+    return changed
+
+
+def _is_partitioned(bind: Bind) -> bool:
+    from database.partitioning import is_partitioned
+
+    if isinstance(bind, Engine):
+        with bind.connect() as conn:
+            return is_partitioned(conn)
+    return is_partitioned(bind)
+
+
+def explain(bind: Bind, statement: Executable) -> str:
+    """
+    План запроса текстом: EXPLAIN QUERY PLAN на SQLite, EXPLAIN на Postgres.
+
+    Параметры подставляются в SQL литералами - планировщик видит те же
+    значения, что и при обычном выполнении.
+    """
+    dialect = bind.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN" if dialect.name == "sqlite" else "EXPLAIN"
+    if isinstance(bind, Engine):
+        with bind.connect() as conn:
+            rows = conn.execute(text(f"{prefix} {sql}")).all()
+    else:
+        rows = bind.execute(text(f"{prefix} {sql}")).all()
+    # SQLite: (id, parent, notused, detail), Postgres: одна колонка QUERY PLAN
+    return "\n".join(str(row[-1]) for row in rows)
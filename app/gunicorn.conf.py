@@ -0,0 +1,102 @@
+"""
+Боевой запуск: gunicorn-мастер с N uvicorn-воркерами.
+
+Приложение и веса модели загружаются один раз в мастере (preload_app),
+воркеры получают их через fork copy-on-write. gc.freeze() перед fork
+убирает объекты мастера из обхода сборщика мусора, чтобы он не трогал
+их страницы и они оставались общими. Схему БД запуск не трогает.
+При INFERENCE_PIN_THREADS каждый воркер закрепляется за своей частью ядер,
+и потоки модели воркеров не конкурируют за одни и те же ядра. Часть ядер -
+наименьший слот, не занятый живым воркером, поэтому перезапущенный воркер
+занимает ядра упавшего. INFERENCE_INTRA_OP_THREADS ограничивает потоки BLAS
+ещё и переменными окружения до импорта NumPy - на случай, если
+threadpoolctl не установлен.
+При MODEL_LOADING=lazy веса не предзагружаются, воркеры поднимаются
+сразу, а модель читается при первом запросе.
+Воркеры пишут снимки своих метрик в METRICS_DIR (по умолчанию - временный
+каталог мастера), и /metrics любого воркера отдаёт их сумму.
+"""
+import gc
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from database.config import get_settings
+
+_BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+# До первого get_settings(): воркеры пишут снимки метрик в общий каталог, и
+# /metrics любого из них отдаёт сумму по всем (services.metrics.SharedMetrics)
+_OWN_METRICS_DIR = "METRICS_DIR" not in os.environ
+if _OWN_METRICS_DIR:
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="metrics-")
+
+# До preload_app: пулы потоков BLAS читают их один раз при импорте NumPy
+if get_settings().INFERENCE_INTRA_OP_THREADS:
+    for name in _BLAS_THREAD_VARS:
+        os.environ.setdefault(name, str(get_settings().INFERENCE_INTRA_OP_THREADS))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 75
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+# Адреса прокси, которым разрешено передавать X-Forwarded-For: за nginx
+# request.client - это адрес клиента, а не прокси. "*" - только если порт
+# приложения недоступен никому, кроме прокси (как в docker-compose.yaml)
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def when_ready(server):
+    from models.model import load_weights
+    from services.metrics import clear_directory
+
+    settings = get_settings()
+    if settings.METRICS_DIR:
+        clear_directory(settings.METRICS_DIR)
+    model_path = Path(settings.MODEL_PATH).resolve()
+    if settings.MODEL_LOADING == "lazy":
+        server.log.info("MODEL_LOADING=lazy, weights are loaded on first request")
+    elif model_path.exists():
+        load_weights(model_path)
+        server.log.info("Model weights preloaded from %s", model_path)
+    else:
+        server.log.warning("Model weights not found at %s", model_path)
+    gc.collect()
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    # В мастере: наименьший слот, не занятый живыми воркерами (fork их копирует)
+    taken = {getattr(alive, "cpu_slot", None) for alive in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in itertools.count() if slot not in taken)
+
+
+def post_fork(server, worker):
+    # Лимит запросов (services.ratelimit) делится между воркерами поровну
+    os.environ["WEB_WORKERS"] = str(server.num_workers)
+    if get_settings().INFERENCE_PIN_THREADS:
+        from services.ml.backends import pin_worker
+
+        cores = pin_worker(worker.cpu_slot, server.num_workers)
+        server.log.info("Worker %s pinned to cores %s (slot %d)", worker.pid, cores, worker.cpu_slot)
+
+
+def child_exit(server, worker):
+    # Счётчики завершившегося воркера остаются в сумме /metrics
+    if get_settings().METRICS_DIR:
+        from services.metrics import mark_process_dead
+
+        mark_process_dead(get_settings().METRICS_DIR, worker.pid)
+
+
+def on_exit(server):
+    if _OWN_METRICS_DIR:
+        shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
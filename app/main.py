@@ -4,7 +4,8 @@ from services.crud.user import get_all_users, create_user
 from sqlmodel import Session
 from models.event import Event
 from models.user import User
-import hashlib
+from services.passwords import hash_password
+import sys
 
 
 if __name__ == "__main__":
@@ -17,15 +18,16 @@ if __name__ == "__main__":
     print(settings.DB_NAME)
     print(settings.DB_USER)
     
-    init_db(drop_all=True)
+    # Схема пересоздаётся только по явному флагу, иначе данные сохраняются
+    init_db(drop_all="--reset" in sys.argv)
     print('Init db has been success')
     
     test_user_1 = User(id=1, email="Nick@gmail.com",
-                    password_hash=hashlib.sha256("password123".encode()).hexdigest())
+                    password_hash=hash_password("password123"))
     test_user_2 = User(id=2, email="Peter@gmail.com",    
-                    password_hash=hashlib.sha256("password456".encode()).hexdigest())
+                    password_hash=hash_password("password456"))
     test_user_3 = User(id=3, email="birdwatcher@gmail.com", 
-                    password_hash=hashlib.sha256("password789".encode()).hexdigest())
+                    password_hash=hash_password("password789"))
 
            
     test_event_1 = Event(id = 1, title='test', image='test', description='test', 
@@ -39,24 +41,24 @@ if __name__ == "__main__":
     engine = get_database_engine()
     
     with Session(engine) as session:
-        create_user(test_user_1, session)
-        create_user(test_user_2, session)
-        create_user(test_user_3, session)
-        users = get_all_users(session)
+        if not get_all_users(session, events="noload"):
+            create_user(test_user_1, session)
+            create_user(test_user_2, session)
+            create_user(test_user_3, session)
+        users = get_all_users(session, events="selectin")
         
-    print('-------')
-    print(f'Id локального пользователя: {id(test_user_1)}')
-    print(f'Id пользователя из БД: {id(users[0])}')
-    print(f'Id одинаковые: {id(test_user_1) == id(users[0])}')
-
-    print('-------')
-    print('Пользователи из БД:')        
-    for user in users:
-        print(user)
-        print('Пользовательские события:')
-        if user.event_count == 0:
-            print('Пользователь не имеет событий')
-        else:
-            for event in user.events:
-                print(event)
+        print('-------')
+        print(f'Id локального пользователя: {id(test_user_1)}')
+        print(f'Id пользователя из БД: {id(users[0])}')
+        print(f'Id одинаковые: {id(test_user_1) == id(users[0])}')
 
+        print('-------')
+        print('Пользователи из БД:')        
+        for user in users:
+            print(user)
+            print('Пользовательские события:')
+            if user.event_count == 0:
+                print('Пользователь не имеет событий')
+            else:
+                for event in user.events:
+                    print(event)
@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, Index
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List, TYPE_CHECKING
 from decimal import Decimal
@@ -6,6 +7,15 @@ from decimal import Decimal
 if TYPE_CHECKING:
     from models.user import User
 
+TITLE_MIN_LENGTH, TITLE_MAX_LENGTH = 1, 100
+DESCRIPTION_MAX_LENGTH = 500
+MODEL_CALL_TITLE = "Вызов модели"
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class EventBase(SQLModel):
     """
     Base Event model with common fields.
@@ -17,7 +27,7 @@ class EventBase(SQLModel):
         location (Optional[str]): Event location
         tags (Optional[List[str]]): Event tags
     """
-    title: str = Field(..., min_length=1, max_length=100)
+    title: str = Field(..., min_length=TITLE_MIN_LENGTH, max_length=TITLE_MAX_LENGTH)
     image: str = Field(..., min_length=1)
     description: str = Field(..., min_length=1, max_length=1000)
 
@@ -30,19 +40,22 @@ class Event(EventBase, table=True):
         id (Optional[int]): Primary key
         creator_id (Optional[int]): Foreign key to User
         creator (Optional[User]): Relationship to User
-        created_at (datetime): Event creation timestamp
+        created_at (datetime): Event creation timestamp (UTC, timezone-aware)
+        model_version (Optional[str]): Version of the model that produced the result
     """
     id: Optional[int] = Field(default=None, primary_key=True)
     title: Optional[str]
     creator_id: Optional[int] = Field(default=None, foreign_key="user.id")
     creator: Optional["User"] = Relationship(
         back_populates="events",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "select"}
     )
     description: Optional[str]
     result: Optional[str] = None
+    model_version: Optional[str] = None
     amount: Optional[Decimal] = Decimal("0.00")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now, nullable=False,
+                                 sa_type=DateTime(timezone=True))
     
     def __str__(self) -> str:
         result = (f"Id: {self.id}. Title: {self.title}. Creator: {self.creator.email}")
@@ -54,12 +67,12 @@ class Event(EventBase, table=True):
 
     def _validate_title(self) -> None:
         """Проверяет длину названия события."""
-        if not 1 <= len(self.title) <= 100:
+        if not TITLE_MIN_LENGTH <= len(self.title) <= TITLE_MAX_LENGTH:
             raise ValueError("Title must be between 1 and 100 characters")
 
     def _validate_description(self) -> None:
         """Проверяет длину описания события."""
-        if len(self.description) > 500:
+        if len(self.description) > DESCRIPTION_MAX_LENGTH:
             raise ValueError("Description must not exceed 500 characters")            
            
  ##   def action(self, model: Optional[Model], billing : BillingService) -> None:
@@ -92,6 +105,15 @@ class Event(EventBase, table=True):
                 if len(self.description) > max_length
                 else self.description)
 
+# История пользователя (keyset-пагинация по created_at, id от новых к старым)
+Index("ix_event_creator_id_created_at", Event.creator_id,
+      Event.created_at.desc(), Event.id.desc())
+# Вызовы модели за интервал времени (биллинг, выгрузки); частичный - только вызовы модели
+Index("ix_event_model_calls_created_at", Event.created_at.desc(),
+      postgresql_where=Event.title == MODEL_CALL_TITLE,
+      sqlite_where=Event.title == MODEL_CALL_TITLE)
+
+
 class EventCreate(EventBase):
     """Schema for creating new events"""
     pass
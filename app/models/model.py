@@ -1,36 +1,213 @@
-from dataclasses import dataclass, field
-from typing import List, TYPE_CHECKING
-import re
-from decimal import Decimal
+import hashlib
+import logging
+import time
 from pathlib import Path
-from typing import Optional
-from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from services.metrics import (INFERENCE_BATCH_SIZE, INFERENCE_SECONDS, MODEL_LOAD_SECONDS,
+                              PREPROCESS_SECONDS)
+from services.ml.backends import BackendOptions, InferenceBackend, create_backend
+
+logger = logging.getLogger(__name__)
+
+ImageInput = Union[str, Path, np.ndarray]
+
+# Веса загружаются один раз на процесс и разделяются всеми экземплярами Model
+_WEIGHTS_CACHE: Dict[Path, "ModelWeights"] = {}
+_WEIGHTS_LOCK = Lock()
+
+
+class ModelWeights:
+    """
+    Веса классификатора птиц (многослойный перцептрон).
+
+    Attributes:
+        layers (List[Tuple[np.ndarray, np.ndarray]]): пары (W, b) для каждого слоя
+        classes (List[str]): названия классов
+        input_size (Tuple[int, int]): размер входного изображения (высота, ширина)
+        version (str): версия модели - хеш содержимого файла с весами
+        file_stat (Tuple[int, int]): mtime_ns и размер файла на момент чтения
+    """
+
+    def __init__(self, layers: List[Tuple[np.ndarray, np.ndarray]],
+                 classes: List[str], input_size: Tuple[int, int], version: str = "",
+                 file_stat: Tuple[int, int] = (0, 0)):
+        self.layers = layers
+        self.classes = classes
+        self.input_size = input_size
+        self.version = version
+        self.file_stat = file_stat
+
+    @classmethod
+    def from_file(cls, path: Path) -> "ModelWeights":
+        """Читает веса из .npz файла: W0, b0, W1, b1, ..., classes, input_size"""
+        file_stat = _file_stat(path)
+        with np.load(path, allow_pickle=False) as data:
+            n_layers = sum(1 for key in data.files if key.startswith("W"))
+            layers = [
+                (np.ascontiguousarray(data[f"W{i}"], dtype=np.float32),
+                 np.ascontiguousarray(data[f"b{i}"], dtype=np.float32))
+                for i in range(n_layers)
+            ]
+            classes = [str(name) for name in data["classes"]]
+            height, width = (int(x) for x in data["input_size"])
+        with open(path, "rb") as f:
+            version = hashlib.file_digest(f, "sha256").hexdigest()[:12]
+        return cls(layers, classes, (height, width), version, file_stat)
+
+    @property
+    def input_dim(self) -> int:
+        return self.layers[0][0].shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Объём памяти, занимаемый весами"""
+        return sum(w.nbytes + b.nbytes for w, b in self.layers)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        """Векторизованный прямой проход для батча формы (N, input_dim)"""
+        x = batch
+        last = len(self.layers) - 1
+        for i, (w, b) in enumerate(self.layers):
+            x = x @ w
+            x += b
+            if i != last:
+                np.maximum(x, 0, out=x)
+        x -= x.max(axis=1, keepdims=True)
+        np.exp(x, out=x)
+        x /= x.sum(axis=1, keepdims=True)
+        return x
+
+
+def load_weights(model_path: Path) -> ModelWeights:
+    """Возвращает веса модели, загружая их с диска только при первом обращении"""
+    weights = _WEIGHTS_CACHE.get(model_path)
+    if weights is None:
+        with _WEIGHTS_LOCK:
+            weights = _WEIGHTS_CACHE.get(model_path)
+            if weights is None:
+                weights = ModelWeights.from_file(model_path)
+                _WEIGHTS_CACHE[model_path] = weights
+    return weights
+
+
+def release_weights(model_path: Path) -> None:
+    """Убирает веса из кеша процесса; память освободится, когда их не использует ни одна Model"""
+    with _WEIGHTS_LOCK:
+        _WEIGHTS_CACHE.pop(model_path, None)
+
+
+def release_if_changed(model_path: Path) -> bool:
+    """
+    Убирает веса из кеша, только если файл изменился после чтения (mtime или размер).
+
+    Неизменённые веса, предзагруженные в мастере gunicorn, остаются общими
+    страницами copy-on-write для всех воркеров.
+    """
+    with _WEIGHTS_LOCK:
+        weights = _WEIGHTS_CACHE.get(model_path)
+        if weights is None or not model_path.exists() \
+                or weights.file_stat == _file_stat(model_path):
+            return False
+        del _WEIGHTS_CACHE[model_path]
+        return True
+
+
+def _file_stat(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
 
-if TYPE_CHECKING:
-    from models.user import User
 
 class Model:
     """
     Класс для вызова модели
-    model_path (str): путь до модели
+    model_path (str): путь до модели (.npz с весами классификатора)
+    backend (Optional[BackendOptions]): чем выполнять прямой проход (по умолчанию NumPy)
     """
-    
-    def __init__(self, model_path):
-        self.model_path = Path(model_path)
+
+    def __init__(self, model_path, backend: Optional[BackendOptions] = None):
+        self.model_path = Path(model_path).resolve()
+        self.backend_options = backend or BackendOptions()
+        self._weights = None
+        self._backend: Optional[InferenceBackend] = None
         self._load_model()
-       
+
     def _load_model(self):
+        started = time.perf_counter()
         if self.model_path.exists():
+            self._weights = load_weights(self.model_path)
+            self._backend = create_backend(self._weights, self.backend_options)
             self._is_loaded = True
         else:
-            print(f'Ошибка загрузки модели')
+            logger.error('Ошибка загрузки модели: %s', self.model_path)
             self._is_loaded = False
-    
-    def predict(self, input_data: str) -> str:
-        """Прогноз модели для конкретного изображения"""    
-        result = 'Model'.predict(input_data)
-        
-        return {
-            "input": input_data,
-            "output": result
-        }
\ No newline at end of file
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - started,
+                                   status="ok" if self._is_loaded else "error")
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._is_loaded
+
+    @property
+    def version(self) -> str:
+        return self._weights.version if self._weights is not None else ""
+
+    @property
+    def backend(self) -> str:
+        return self._backend.name if self._backend is not None else ""
+
+    @property
+    def nbytes(self) -> int:
+        return self._backend.nbytes if self._backend is not None else 0
+
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        """Размер входного изображения (высота, ширина)"""
+        return self._weights.input_size
+
+    def _preprocess(self, input_data: ImageInput) -> np.ndarray:
+        """Приводит изображение к вектору признаков float32 в диапазоне [0, 1]"""
+        if isinstance(input_data, np.ndarray):
+            array = input_data
+        else:
+            from PIL import Image
+
+            height, width = self._weights.input_size
+            with PREPROCESS_SECONDS.time(), Image.open(input_data) as image:
+                image.draft("RGB", (width, height))
+                array = np.asarray(image.convert("RGB").resize((width, height)))
+        features = array.reshape(-1)
+        if features.shape[0] != self._weights.input_dim:
+            raise ValueError("Image does not match model input size")
+        if features.dtype == np.uint8:
+            return features.astype(np.float32) / 255.0
+        return features.astype(np.float32, copy=False)
+
+    def predict_batch(self, images: Sequence[ImageInput]) -> List[Dict]:
+        """Прогноз модели для батча изображений за один прямой проход"""
+        if not self._is_loaded:
+            raise RuntimeError("Model is not loaded")
+        if not images:
+            return []
+        batch = np.stack([self._preprocess(image) for image in images])
+        with INFERENCE_SECONDS.time():
+            probs = self._backend.forward(batch)
+        INFERENCE_BATCH_SIZE.observe(len(images))
+        top = probs.argmax(axis=1)
+        classes = self._weights.classes
+        return [
+            {
+                "input": image if isinstance(image, (str, Path)) else None,
+                "output": classes[idx],
+                "score": float(probs[row, idx]),
+                "model_version": self._weights.version
+            }
+            for row, (image, idx) in enumerate(zip(images, top))
+        ]
+
+    def predict(self, input_data: ImageInput) -> Dict:
+        """Прогноз модели для конкретного изображения"""
+        return self.predict_batch([input_data])[0]
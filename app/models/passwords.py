@@ -0,0 +1,74 @@
+"""
+Хеширование паролей (scrypt) без зависимостей от сервисов.
+
+Модель User хеширует и проверяет пароли здесь; пул процессов для
+обработчиков запросов - services.passwords.PasswordHasher.
+"""
+import base64
+import hashlib
+import hmac
+import os
+
+# scrypt: ~16 МБ памяти и десятки миллисекунд CPU на хеш
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+_PREFIX = "scrypt"
+_LEGACY_SHA256_LENGTH = 64
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=HASH_BYTES)
+
+
+def hash_password(password: str) -> str:
+    """Хеш пароля со случайной солью: scrypt$n$r$p$соль$хеш"""
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def is_legacy_hash(stored: str) -> bool:
+    return len(stored) == _LEGACY_SHA256_LENGTH and "$" not in stored
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """
+    Проверка пароля в постоянное время.
+
+    Понимает и старый формат - несолёный sha256 в hex, такие хеши
+    стоит пересчитать после успешного входа (см. needs_rehash).
+    """
+    if is_legacy_hash(stored):
+        return hmac.compare_digest(stored, hashlib.sha256(password.encode()).hexdigest())
+    try:
+        prefix, n, r, p, salt, digest = stored.split("$")
+        if prefix != _PREFIX:
+            return False
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(expected, actual)
+
+
+def needs_rehash(stored: str) -> bool:
+    """Хеш в старом формате или с параметрами слабее текущих"""
+    if is_legacy_hash(stored):
+        return True
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != _PREFIX:
+        return True
+    try:
+        params = int(parts[1]), int(parts[2]), int(parts[3])
+    except ValueError:
+        # Повреждённые параметры - хеш пересчитывается при следующем входе
+        return True
+    return params != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
@@ -1,11 +1,22 @@
-from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import DateTime, func
+from sqlalchemy.orm import object_session
+from sqlmodel import SQLModel, Field, Relationship, select
 from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
 import re
 
+from models.event import utc_now
+from models.passwords import hash_password, verify_password
+
 if TYPE_CHECKING:
     from models.event import Event
 
+EMAIL_REGEX = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+# Компилируется один раз; fullmatch не пропускает перевод строки в конце
+EMAIL_PATTERN = re.compile(EMAIL_REGEX)
+EMAIL_MIN_LENGTH, EMAIL_MAX_LENGTH = 5, 255
+PASSWORD_MIN_LENGTH = 8
+
 class User(SQLModel, table=True): 
     """
     User model representing application users.
@@ -14,7 +25,7 @@ class User(SQLModel, table=True):
         id (int): Primary key
         email (str): User's email address
         password (str): Hashed password
-        created_at (datetime): Account creation timestamp
+        created_at (datetime): Account creation timestamp (UTC, timezone-aware)
         events (List[Event]): List of user's events
     """
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -22,17 +33,17 @@ class User(SQLModel, table=True):
         ...,  # Required field
         unique=True,
         index=True,
-        min_length=5,
-        max_length=255
+        min_length=EMAIL_MIN_LENGTH,
+        max_length=EMAIL_MAX_LENGTH
     )
     password_hash: str = Field(...,  min_length=4)    # init=False, repr=False,
     #wallet: Wallet = Field(default_factory=Wallet)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now, sa_type=DateTime(timezone=True))
     events: List["Event"] = Relationship(
         back_populates="creator",
         sa_relationship_kwargs={
             "cascade": "all, delete-orphan",
-            "lazy": "selectin"
+            "lazy": "select"
         }
     )
     
@@ -49,8 +60,7 @@ class User(SQLModel, table=True):
         Raises:
             ValueError: If email format is invalid
         """
-        pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-        if not pattern.match(self.email):
+        if not EMAIL_PATTERN.fullmatch(self.email):
             raise ValueError("Invalid email format")
         return True
 
@@ -60,19 +70,23 @@ class User(SQLModel, table=True):
         
     def _validate_email(self) -> None:
         """Проверяет корректность email."""
-        email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-        if not email_pattern.match(self.email):
+        if not EMAIL_PATTERN.fullmatch(self.email):
             raise ValueError("Invalid email format")
 
     def _validate_password(self, password : str) -> str:
-        """Проверяет минимальную длину пароля."""
-        if len(password) < 8:
+        """Проверяет минимальную длину пароля и возвращает солёный хеш (scrypt)."""
+        if len(password) < PASSWORD_MIN_LENGTH:
             raise ValueError("Password must be at least 8 characters long")
-        return hashlib.sha256(password.encode()).hexdigest()
+        return hash_password(password)
         
     def check_password(self, password: str) -> bool:
-        """Проверка соответствия пароля."""
-        return self.password_hash == hashlib.sha256(password.encode()).hexdigest()
+        """
+        Проверка соответствия пароля (понимает и старые хеши sha256).
+
+        KDF дорогой - в обработчиках запросов используйте
+        PasswordHasher.verify, который считает его в пуле процессов.
+        """
+        return verify_password(password, self.password_hash)
 
     def add_event(self, event: 'Event') -> None:
         """Добавляет событие в список событий пользователя."""
@@ -89,8 +103,23 @@ class User(SQLModel, table=True):
     
     @property
     def event_count(self) -> int:
-        """Number of events associated with user"""
-        return len(self.events)
+        """
+        Number of events associated with user.
+
+        For a user attached to a session runs COUNT(*) in the database
+        (pending events are autoflushed first): the loaded collection may
+        be empty because of noload. Detached and new users count the
+        collection. Under AsyncSession use count_user_events_async.
+        """
+        session = object_session(self)
+        if session is None or self.id is None:
+            return len(self.events)
+        if session.get_bind().dialect.is_async:
+            raise RuntimeError("User.event_count needs a sync session, "
+                               "use await count_user_events_async(user.id, session)")
+        from models.event import Event
+        return session.scalar(
+            select(func.count()).select_from(Event).where(Event.creator_id == self.id))
 
     class Config:
         """Model configuration"""
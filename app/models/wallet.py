@@ -0,0 +1,75 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import DateTime, Index
+from sqlmodel import SQLModel, Field
+
+from models.event import utc_now
+
+
+class Wallet(SQLModel, table=True):
+    """
+    Wallet model holding the current balance of a user.
+
+    Attributes:
+        user_id (int): Primary key, foreign key to User
+        balance (Decimal): Current balance
+        updated_at (datetime): Last balance change timestamp (UTC, timezone-aware)
+    """
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    balance: Decimal = Field(default=Decimal("0.00"), max_digits=12, decimal_places=2)
+    updated_at: datetime = Field(default_factory=utc_now, sa_type=DateTime(timezone=True))
+
+
+class Transaction(SQLModel, table=True):
+    """
+    Transaction model - append-only record of wallet changes.
+
+    Attributes:
+        id (Optional[int]): Primary key, allocated by the database sequence
+        user_id (int): Foreign key to User
+        txn_type (str): Transaction type (Deposit / Service)
+        amount (Decimal): Transaction amount, always positive
+        balance_after (Decimal): Wallet balance right after the transaction
+        idempotency_key (Optional[str]): Client key, repeated requests return the same transaction
+        created_at (datetime): Transaction timestamp (UTC, timezone-aware)
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    txn_type: str = Field(max_length=32)
+    amount: Decimal = Field(max_digits=12, decimal_places=2)
+    balance_after: Decimal = Field(max_digits=12, decimal_places=2)
+    idempotency_key: Optional[str] = Field(default=None, unique=True, max_length=64)
+    created_at: datetime = Field(default_factory=utc_now, sa_type=DateTime(timezone=True))
+
+    def __str__(self) -> str:
+        return (f"[{self.created_at.strftime('%Y-%m-%d %H:%M')}] TXN-{self.id}: "
+                f"{self.txn_type} | {self.amount} | User: {self.user_id}")
+
+
+# Хвост журнала пользователя после снимка читается диапазоном по этому индексу
+Index("ix_transaction_user_id_id", Transaction.user_id, Transaction.id)
+
+
+class WalletSnapshot(SQLModel, table=True):
+    """
+    Wallet snapshot - balance computed from the ledger up to a transaction.
+
+    Balance at any moment is the nearest earlier snapshot plus the
+    transactions after it, so reads never replay the whole history.
+
+    Attributes:
+        user_id (int): Primary key, foreign key to User
+        txn_id (int): Primary key, last transaction included in the balance
+        balance (Decimal): Balance right after txn_id, summed from the ledger
+        txn_count (int): Number of transactions up to and including txn_id
+        txn_created_at (datetime): Timestamp of txn_id
+        created_at (datetime): When the snapshot was taken (UTC, timezone-aware)
+    """
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    txn_id: int = Field(primary_key=True)
+    balance: Decimal = Field(max_digits=12, decimal_places=2)
+    txn_count: int
+    txn_created_at: datetime = Field(sa_type=DateTime(timezone=True))
+    created_at: datetime = Field(default_factory=utc_now, sa_type=DateTime(timezone=True))
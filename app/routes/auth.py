@@ -0,0 +1,46 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request, status
+from pydantic import BaseModel
+
+auth_router = APIRouter(prefix="/auth", tags=["Auth"])
+
+
+class TokenRequest(BaseModel):
+    email: str
+    password: str
+
+
+def _find_user(email: str):
+    from sqlmodel import Session
+
+    from database.database import get_database_engine
+    from services.crud.user import get_cached_user_by_email
+
+    with Session(get_database_engine()) as session:
+        return get_cached_user_by_email(email, session)
+
+
+@auth_router.post("/token")
+async def create_token(credentials: TokenRequest, request: Request) -> dict:
+    """
+    Токен доступа по email и паролю.
+
+    Токен передаётся в Authorization: Bearer; по нему /predict выбирает
+    корзину лимита пользователя, а /events - владельца событий. Пароль
+    проверяется в пуле процессов хеширования, вне event loop.
+    """
+    from services.auth import issue_token
+    from services.passwords import get_password_hasher
+
+    user = await asyncio.to_thread(_find_user, credentials.email)
+    if user is None or not await get_password_hasher().verify(credentials.password,
+                                                              user.password_hash):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Invalid email or password",
+                            headers={"WWW-Authenticate": "Bearer"})
+    settings = request.app.state.ml.settings
+    token = issue_token(user.id, settings.AUTH_SECRET.get_secret_value(),
+                        settings.AUTH_TOKEN_TTL)
+    return {"access_token": token, "token_type": "bearer",
+            "expires_in": int(settings.AUTH_TOKEN_TTL)}
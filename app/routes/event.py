@@ -0,0 +1,163 @@
+import asyncio
+import os
+import shutil
+import uuid
+from decimal import Decimal
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, status
+
+from routes.predict import _user_id
+
+event_router = APIRouter(prefix="/events", tags=["Events"])
+
+
+def _store_upload(spool: SpooledTemporaryFile, sha256: str, upload_dir: str) -> str:
+    """
+    Сохраняет изображение в общий с обработчиками каталог под его sha256.
+
+    Проверяется только заголовок изображения; повторная загрузка того же
+    файла не пишется на диск заново.
+    """
+    from PIL import Image
+
+    with Image.open(spool):
+        pass
+    directory = Path(upload_dir).resolve()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / sha256
+    if not path.exists():
+        spool.seek(0)
+        partial = path.with_name(f"{sha256}.{os.getpid()}.part")
+        with open(partial, "wb") as f:
+            shutil.copyfileobj(spool, f)
+        os.replace(partial, path)
+    return str(path)
+
+
+def _create_model_call(user_id: int, image: str, description: str, price: Decimal,
+                       job_id: str):
+    """Заводит событие "Вызов модели" и списывает его стоимость (ключ - id задания)"""
+    from sqlmodel import Session
+
+    from database.database import get_database_engine
+    from models.event import MODEL_CALL_TITLE, Event
+    from services.crud.event import create_event, delete_event
+    from services.crud.user import get_cached_user
+    from services.crud.wallet import charge
+
+    with Session(get_database_engine()) as session:
+        if get_cached_user(user_id, session) is None:
+            raise LookupError(f"User {user_id} not found")
+        event = create_event(Event(title=MODEL_CALL_TITLE, image=image, description=description,
+                                   creator_id=user_id, amount=price), session)
+        try:
+            charge(user_id, price, session, idempotency_key=f"model-call:{job_id}")
+        except ValueError:
+            delete_event(event.id, session)
+            raise
+        # Списание закоммитило сессию; атрибуты читаются и после её закрытия
+        session.refresh(event)
+        return event
+
+
+def _cancel_model_call(event, job_id: str) -> None:
+    """Возвращает списание и удаляет событие, задание которого не опубликовано"""
+    from sqlmodel import Session
+
+    from database.database import get_database_engine
+    from services.crud.event import delete_event
+    from services.crud.wallet import deposit
+
+    with Session(get_database_engine()) as session:
+        deposit(event.creator_id, event.amount, session,
+                idempotency_key=f"model-call-refund:{job_id}")
+        delete_event(event.id, session)
+
+
+@event_router.post("/model-call", status_code=status.HTTP_202_ACCEPTED)
+async def create_model_call(request: Request, description: str = "Вызов модели") -> dict:
+    """
+    Асинхронный вызов модели: изображение в теле запроса.
+
+    Изображение сохраняется в PREDICTION_UPLOAD_DIR, событие заводится и
+    оплачивается, задание публикуется в очередь RabbitMQ, и запрос сразу
+    возвращает job id и id события. Прогноз выполняют обработчики очереди
+    (python -m services.ml.pipeline) и записывают его в Event.result;
+    статус - GET /events/{event_id}.
+    """
+    user_id = _user_id(request)
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Model calls require an authenticated user")
+    producer = request.app.state.producer
+    if producer is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Prediction queue is not configured")
+    from services.crud.wallet import InsufficientFundsError
+    from services.ml.pipeline import BrokerUnavailableError, QueueFullError
+    from services.ml.preprocessing import UploadTooLargeError, spool_upload
+
+    settings = request.app.state.ml.settings
+    job_id = uuid.uuid4().hex
+    try:
+        spool, stats = await spool_upload(request.stream(), settings.UPLOAD_MEMORY_BYTES,
+                                          settings.UPLOAD_MAX_BYTES)
+        with spool:
+            image = await asyncio.to_thread(_store_upload, spool, stats.sha256,
+                                            settings.PREDICTION_UPLOAD_DIR)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=str(e))
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid image: {e}")
+    try:
+        event = await asyncio.to_thread(_create_model_call, user_id, image, description,
+                                        settings.MODEL_CALL_PRICE, job_id)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except InsufficientFundsError as e:
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        await asyncio.to_thread(producer.submit, event, job_id)
+    except (QueueFullError, BrokerUnavailableError) as e:
+        await asyncio.to_thread(_cancel_model_call, event, job_id)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e),
+                            headers={"Retry-After": "1"})
+    return {"job_id": job_id, "event_id": event.id, "status": "queued"}
+
+
+def _get_model_call(event_id: int, user_id: int) -> Optional[dict]:
+    from sqlmodel import Session
+
+    from database.database import get_database_engine
+    from services.crud.event import get_event_by_id
+
+    with Session(get_database_engine()) as session:
+        event = get_event_by_id(event_id, session)
+        if event is None or event.creator_id != user_id:
+            return None
+        return {
+            "event_id": event.id,
+            "status": "queued" if event.result is None else "done",
+            "result": event.result,
+            "model_version": event.model_version,
+        }
+
+
+@event_router.get("/{event_id}")
+async def get_model_call(event_id: int, request: Request) -> dict:
+    """Статус асинхронного вызова модели: queued, пока обработчик не записал результат"""
+    user_id = _user_id(request)
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Authentication required")
+    state = await asyncio.to_thread(_get_model_call, event_id, user_id)
+    if state is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    return state
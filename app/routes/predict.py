@@ -0,0 +1,115 @@
+import asyncio
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+predict_router = APIRouter(tags=["Predict"])
+
+# Пользователь определяется по токену доступа (Authorization: Bearer, выдаёт
+# POST /auth/token). X-User-Id учитывается, только если токена нет и включён
+# TRUST_USER_ID_HEADER: его должен проставлять слой аутентификации перед
+# приложением, иначе клиент выбирал бы себе корзину лимита сам
+USER_ID_HEADER = "X-User-Id"
+
+
+def _user_id(request: Request) -> Optional[int]:
+    settings = request.app.state.ml.settings
+    authorization = request.headers.get("Authorization")
+    if authorization is not None:
+        from services.auth import verify_token
+
+        scheme, _, token = authorization.partition(" ")
+        user_id = verify_token(token.strip(), settings.AUTH_SECRET.get_secret_value()) \
+            if scheme.lower() == "bearer" else None
+        if user_id is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Invalid or expired access token",
+                                headers={"WWW-Authenticate": "Bearer"})
+        return user_id
+    if not settings.TRUST_USER_ID_HEADER:
+        return None
+    value = request.headers.get(USER_ID_HEADER)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid {USER_ID_HEADER} header")
+
+
+@predict_router.post("/predict")
+async def predict(request: Request, response: Response) -> dict:
+    """
+    Классифицирует изображение из тела запроса.
+
+    Тело читается потоком и не буферизуется целиком, декодирование
+    и прогноз выполняются вне event loop. Запросы лимитируются по
+    пользователю, одинаковые изображения в полёте склеиваются в один прогноз,
+    а повторно загруженные отвечаются из кеша прогнозов без декодирования.
+    Очередь к модели справедливо делится между пользователями с учётом
+    уровня; если ожидание превысит SLO, запрос сразу получает 503.
+    """
+    user_id = _user_id(request)
+    # За nginx адрес клиента берётся из X-Forwarded-For (FORWARDED_ALLOW_IPS в gunicorn.conf.py)
+    client = request.client.host if request.client else ""
+    # Очередь к модели делится между пользователями, анонимы - по адресу
+    flow, tier = (f"user:{user_id}" if user_id is not None else f"ip:{client}"), None
+    limiter = request.app.state.rate_limiter
+    if limiter is not None:
+        decision = await limiter.check(user_id, client)
+        if not decision.allowed:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Rate limit exceeded", headers=decision.headers)
+        response.headers.update(decision.headers)
+        tier = decision.tier
+
+    ml = request.app.state.ml
+    if not ml.ready and (ml.settings.MODEL_LOADING != "lazy" or not await ml.ensure_loaded()):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=ml.error or "Model is warming up")
+    from services.ml.preprocessing import UploadTooLargeError
+    from services.ml.scheduler import AdmissionRejected, DeadlineExceeded
+
+    weight, tier_name = (tier.weight, tier.name) if tier is not None else (1.0, "")
+    try:
+        # Отказ по перегрузке - до чтения и декодирования загрузки
+        ml.batcher.scheduler.check(flow, weight, tier=tier_name)
+        # Версия модели по A/B-разбиению реестра, стабильно для пользователя;
+        # веса версии могут читаться с диска - вне event loop
+        model = await asyncio.to_thread(ml.model.resolve, flow)
+        async with ml.preprocessor.upload(request.stream()) as (spool, stats):
+            # Ключ как у services.ml.cache.cache_key: версия и sha256 байтов изображения
+            key = f"{model.version}-{stats.sha256}"
+
+            async def infer() -> dict:
+                cached = await ml.cached(key)
+                if cached is not None:
+                    return cached
+                tensor = await ml.preprocessor.decode(spool, stats)
+                prediction = await asyncio.wrap_future(
+                    ml.batcher.submit(tensor, flow, weight, tier=tier_name, model=model))
+                await ml.remember(key, prediction)
+                return prediction
+
+            prediction, shared = await ml.coalescer.do(key, infer)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=str(e),
+                            headers={"Retry-After": str(max(1, round(e.retry_after + 0.5)))})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=str(e))
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid image: {e}")
+    return {
+        "output": prediction["output"],
+        "score": prediction["score"],
+        "model_version": prediction["model_version"],
+        "coalesced": shared,
+        "upload": asdict(stats),
+    }
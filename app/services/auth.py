@@ -0,0 +1,36 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+
+def _signature(payload: str, secret: str) -> str:
+    digest = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue_token(user_id: int, secret: str, ttl: float, now: Optional[float] = None) -> str:
+    """
+    Токен доступа "user_id.expires.signature" (HMAC-SHA256 от AUTH_SECRET).
+
+    Проверка не обращается к БД, поэтому токен остаётся действительным до
+    expires даже после смены пароля; ttl держите коротким.
+    """
+    expires = int((time.time() if now is None else now) + ttl)
+    payload = f"{user_id}.{expires}"
+    return f"{payload}.{_signature(payload, secret)}"
+
+
+def verify_token(token: str, secret: str, now: Optional[float] = None) -> Optional[int]:
+    """Id пользователя из токена; None - подпись не сошлась, токен истёк или испорчен"""
+    payload, _, signature = token.rpartition(".")
+    if not hmac.compare_digest(signature.encode(), _signature(payload, secret).encode()):
+        return None
+    user_id, _, expires = payload.partition(".")
+    try:
+        if int(expires) <= (time.time() if now is None else now):
+            return None
+        return int(user_id)
+    except ValueError:
+        return None
@@ -0,0 +1,187 @@
+import csv
+import io
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+from sqlalchemy import Table, insert
+from sqlmodel import Session, SQLModel
+
+from models.event import Event
+from models.user import User
+from services.passwords import PasswordHasher, get_password_hasher
+from services.user_cache import get_user_cache
+from services.validation import ValidationReport, validate_events, validate_users
+
+Row = Union[SQLModel, Dict[str, Any]]
+
+DEFAULT_CHUNK_SIZE = 5000
+_COPY_NULL = "\\N"
+
+
+@dataclass
+class BulkInsertReport:
+    """
+    Итог массовой вставки.
+
+    Attributes:
+        rows (int): вставлено строк
+        chunks (int): число пачек
+        seconds (float): общее время
+    """
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"Inserted {self.rows} rows in {self.chunks} chunks, "
+                f"{self.seconds:.2f}s ({self.rows_per_sec:.0f} rows/sec)")
+
+
+def _chunks(rows: Iterable[Row], size: int) -> Iterator[List[Row]]:
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _to_dict(model: Type[SQLModel], row: Row, table: Table) -> Dict[str, Any]:
+    if isinstance(row, SQLModel):
+        data = row.model_dump()
+    else:
+        data = dict(row)
+        # Для словарей подставляем значения по умолчанию из модели (created_at и т.п.)
+        for name, field in model.model_fields.items():
+            if name not in data and name in table.columns:
+                data[name] = field.get_default(call_default_factory=True)
+    # Пустой первичный ключ отдаём базе (autoincrement)
+    for column in table.primary_key.columns:
+        if data.get(column.name) is None:
+            data.pop(column.name, None)
+    return data
+
+
+def _insert_chunk(session: Session, table: Table, columns: List[str],
+                  rows: List[Dict[str, Any]]) -> None:
+    session.execute(insert(table), [{c: row.get(c) for c in columns} for row in rows])
+
+
+def _copy_chunk(session: Session, table: Table, columns: List[str],
+                rows: List[Dict[str, Any]]) -> None:
+    """COPY ... FROM STDIN для Postgres (psycopg2)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_COPY_NULL if row.get(c) is None else row.get(c) for c in columns])
+    buffer.seek(0)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    cursor = session.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY \"{table.name}\" ({column_list}) FROM STDIN "
+            f"WITH (FORMAT csv, NULL '{_COPY_NULL}')",
+            buffer)
+    finally:
+        cursor.close()
+
+
+def _by_columns(table: Table, rows: List[Dict[str, Any]]
+                ) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+    """
+    Делит пачку по набору ключей строк.
+
+    Строки с явным первичным ключом и без него (autoincrement) или с разными
+    необязательными полями пишутся отдельными запросами: колонка, которой нет
+    в строке, не должна превращаться в NULL.
+    """
+    groups: Dict[frozenset, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(frozenset(row), []).append(row)
+    for keys, group in groups.items():
+        yield [c.name for c in table.columns if c.name in keys], group
+
+
+def bulk_insert(model: Type[SQLModel], rows: Iterable[Row], session: Session,
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                use_copy: Optional[bool] = None) -> BulkInsertReport:
+    """
+    Массовая вставка строк пачками по chunk_size.
+
+    В памяти одновременно держится только одна пачка, поэтому rows может
+    быть генератором любой длины. Каждая пачка - один executemany
+    (или COPY на Postgres) на каждый набор колонок и один commit.
+    """
+    table: Table = model.__table__
+    if use_copy is None:
+        use_copy = session.get_bind().dialect.name == "postgresql"
+    write_chunk = _copy_chunk if use_copy else _insert_chunk
+    report = BulkInsertReport()
+    started = time.perf_counter()
+    for chunk in _chunks(rows, chunk_size):
+        data = [_to_dict(model, row, table) for row in chunk]
+        for columns, group in _by_columns(table, data):
+            write_chunk(session, table, columns, group)
+        session.commit()
+        report.rows += len(data)
+        report.chunks += 1
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def bulk_insert_users(users: Iterable[Row], session: Session,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      use_copy: Optional[bool] = None) -> BulkInsertReport:
+    return bulk_insert(User, users, session, chunk_size, use_copy)
+
+
+def _creator_id(event: Row) -> Optional[int]:
+    return event.creator_id if isinstance(event, SQLModel) else event.get("creator_id")
+
+
+def bulk_insert_events(events: Iterable[Row], session: Session,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       use_copy: Optional[bool] = None) -> BulkInsertReport:
+    creators = set()
+
+    def tracked() -> Iterator[Row]:
+        for event in events:
+            creators.add(_creator_id(event))
+            yield event
+
+    report = bulk_insert(Event, tracked(), session, chunk_size, use_copy)
+    # Число событий авторов изменилось
+    get_user_cache().invalidate_many(creators)
+    return report
+
+
+def bulk_signup_users(emails: Sequence[str], passwords: Sequence[str], session: Session,
+                      hasher: Optional[PasswordHasher] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE
+                      ) -> Tuple[BulkInsertReport, ValidationReport]:
+    """
+    Массовая регистрация: пакетная проверка, хеши паролей в пуле процессов,
+    вставка только прошедших проверку строк. Отклонённые строки и причины -
+    в ValidationReport.
+    """
+    validation = validate_users(emails, passwords)
+    rows = np.flatnonzero(validation.valid)
+    hashes = (hasher or get_password_hasher()).hash_many([passwords[i] for i in rows])
+    users = ({"email": emails[i], "password_hash": password_hash}
+             for i, password_hash in zip(rows, hashes))
+    return bulk_insert(User, users, session, chunk_size), validation
+
+
+def bulk_import_events(events: Sequence[Dict[str, Any]], session: Session,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       use_copy: Optional[bool] = None
+                       ) -> Tuple[BulkInsertReport, ValidationReport]:
+    """Импорт событий: вставляются только строки с корректными title и description"""
+    validation = validate_events([event.get("title") for event in events],
+                                 [event.get("description") for event in events])
+    rows = (events[i] for i in np.flatnonzero(validation.valid))
+    return bulk_insert_events(rows, session, chunk_size, use_copy), validation
@@ -0,0 +1,98 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, literal, or_
+from sqlalchemy.sql import Select
+from sqlmodel import Session, select
+
+from models.event import MODEL_CALL_TITLE, Event
+from services.crud.loading import LoadStrategy, load_option
+
+EventCursor = Tuple[datetime, int]
+
+
+def get_event_by_id(event_id: int, session: Session) -> Optional[Event]:
+    return session.get(Event, event_id)
+
+
+def create_event(new_event: Event, session: Session) -> Event:
+    session.add(new_event)
+    session.commit()
+    session.refresh(new_event)
+    return new_event
+
+
+def delete_event(event_id: int, session: Session) -> bool:
+    event = session.get(Event, event_id)
+    if event is None:
+        return False
+    session.delete(event)
+    session.commit()
+    return True
+
+
+def set_event_result(event_id: int, result: str, session: Session,
+                     model_version: Optional[str] = None) -> Optional[Event]:
+    """Записывает результат модели и версию модели, которая его получила"""
+    event = session.get(Event, event_id)
+    if event is None:
+        return None
+    event.result = result
+    event.model_version = model_version
+    session.add(event)
+    session.commit()
+    session.refresh(event)
+    return event
+
+
+def event_cursor(event: Event) -> EventCursor:
+    """Курсор для продолжения выборки после данного события"""
+    return event.created_at, event.id
+
+
+def user_events_statement(user_id: int, after: Optional[EventCursor] = None,
+                          limit: int = 50) -> Select:
+    """Запрос страницы событий пользователя, идёт по ix_event_creator_id_created_at"""
+    statement = select(Event).where(Event.creator_id == user_id)
+    if after is not None:
+        created_at, event_id = after
+        statement = statement.where(or_(
+            Event.created_at < created_at,
+            and_(Event.created_at == created_at, Event.id < event_id),
+        ))
+    return statement.order_by(Event.created_at.desc(), Event.id.desc()).limit(limit)
+
+
+def get_user_events(user_id: int, session: Session, after: Optional[EventCursor] = None,
+                    limit: int = 50, creator: LoadStrategy = "select") -> List[Event]:
+    """
+    Страница событий пользователя от новых к старым (keyset-пагинация).
+
+    after - курсор последнего события предыдущей страницы (см. event_cursor),
+    поэтому стоимость страницы не зависит от её номера.
+    """
+    statement = user_events_statement(user_id, after, limit) \
+        .options(load_option(Event.creator, creator))
+    return session.exec(statement).all()
+
+
+def model_calls_statement(start: datetime, end: datetime, limit: int = 1000) -> Select:
+    """
+    Вызовы модели за период [start, end), новые первыми.
+
+    Название подставляется в SQL литералом: частичный индекс
+    ix_event_model_calls_created_at планировщик выбирает, только если
+    видит условие индекса в самом запросе, а не параметр.
+    """
+    return (
+        select(Event)
+        .where(Event.title == literal(MODEL_CALL_TITLE, literal_execute=True))
+        .where(Event.created_at >= start, Event.created_at < end)
+        .order_by(Event.created_at.desc())
+        .limit(limit)
+    )
+
+
+def get_model_calls(session: Session, start: datetime, end: datetime,
+                    limit: int = 1000) -> List[Event]:
+    return session.exec(model_calls_statement(start, end, limit)).all()
@@ -0,0 +1,28 @@
+from typing import Literal
+
+from sqlalchemy.orm import joinedload, lazyload, noload, raiseload, selectinload
+
+LoadStrategy = Literal["noload", "raise", "select", "selectin", "joined"]
+
+_LOADERS = {
+    "noload": noload,
+    "raise": raiseload,
+    "select": lazyload,
+    "selectin": selectinload,
+    "joined": joinedload,
+}
+
+
+def load_option(attribute, strategy: LoadStrategy):
+    """
+    Опция загрузки связи для конкретного запроса.
+
+    noload - связь не загружается (пустая коллекция / None),
+    raise - обращение к связи бросает исключение,
+    select - ленивая загрузка при обращении,
+    selectin / joined - жадная загрузка вместе с запросом.
+    """
+    try:
+        return _LOADERS[strategy](attribute)
+    except KeyError:
+        raise ValueError(f"Unknown loading strategy: {strategy}") from None
@@ -0,0 +1,113 @@
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.event import Event
+from models.user import User
+from models.wallet import Wallet
+from services.crud.loading import LoadStrategy, load_option
+from services.user_cache import UserSnapshot, get_user_cache
+
+
+def get_all_users(session: Session, events: LoadStrategy = "select") -> List[User]:
+    return session.exec(select(User).options(load_option(User.events, events))).all()
+
+
+def get_user_by_id(user_id: int, session: Session,
+                   events: LoadStrategy = "select") -> Optional[User]:
+    return session.get(User, user_id, options=[load_option(User.events, events)])
+
+
+def count_user_events(user_id: int, session: Session) -> int:
+    return session.scalar(
+        select(func.count()).select_from(Event).where(Event.creator_id == user_id))
+
+
+def get_users_with_event_counts(session: Session) -> List[Tuple[User, int]]:
+    """Пользователи с числом событий, посчитанным одним GROUP BY"""
+    statement = (
+        select(User, func.count(Event.id))
+        .outerjoin(Event, Event.creator_id == User.id)
+        .group_by(User.id)
+        .options(load_option(User.events, "noload"))
+    )
+    return session.exec(statement).all()
+
+
+def get_user_by_email(email: str, session: Session) -> Optional[User]:
+    return session.exec(select(User).where(User.email == email)).first()
+
+
+def _load_snapshot(condition, session: Session) -> Optional[UserSnapshot]:
+    """Пользователь, баланс и число событий одним запросом, без ORM-объектов"""
+    event_count = (select(func.count(Event.id))
+                   .where(Event.creator_id == User.id)
+                   .scalar_subquery())
+    statement = (
+        select(User.id, User.email, User.password_hash, User.created_at,
+               Wallet.balance, event_count)
+        .outerjoin(Wallet, Wallet.user_id == User.id)
+        .where(condition)
+    )
+    row = session.exec(statement).first()
+    return UserSnapshot(*row) if row is not None else None
+
+
+def get_cached_user(user_id: int, session: Session) -> Optional[UserSnapshot]:
+    """Снимок пользователя через кеш; session используется только при промахе"""
+    return get_user_cache().get_by_id(
+        user_id, lambda key: _load_snapshot(User.id == key, session))
+
+
+def get_cached_user_by_email(email: str, session: Session) -> Optional[UserSnapshot]:
+    return get_user_cache().get_by_email(
+        email, lambda key: _load_snapshot(User.email == key, session))
+
+
+def create_user(new_user: User, session: Session) -> User:
+    session.add(new_user)
+    session.commit()
+    session.refresh(new_user)
+    get_user_cache().invalidate(new_user.id, new_user.email)
+    return new_user
+
+
+def delete_user(user_id: int, session: Session) -> bool:
+    user = session.get(User, user_id)
+    if user is None:
+        return False
+    email = user.email
+    session.delete(user)
+    session.commit()
+    get_user_cache().invalidate(user_id, email)
+    return True
+
+
+async def get_all_users_async(session: AsyncSession,
+                              events: LoadStrategy = "raise") -> List[User]:
+    statement = select(User).options(load_option(User.events, events))
+    return (await session.exec(statement)).all()
+
+
+async def count_user_events_async(user_id: int, session: AsyncSession) -> int:
+    return await session.scalar(
+        select(func.count()).select_from(Event).where(Event.creator_id == user_id))
+
+
+async def get_user_by_id_async(user_id: int, session: AsyncSession,
+                               events: LoadStrategy = "raise") -> Optional[User]:
+    return await session.get(User, user_id, options=[load_option(User.events, events)])
+
+
+async def get_user_by_email_async(email: str, session: AsyncSession) -> Optional[User]:
+    return (await session.exec(select(User).where(User.email == email))).first()
+
+
+async def create_user_async(new_user: User, session: AsyncSession) -> User:
+    session.add(new_user)
+    await session.commit()
+    await session.refresh(new_user)
+    get_user_cache().invalidate(new_user.id, new_user.email)
+    return new_user
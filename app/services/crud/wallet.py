@@ -0,0 +1,150 @@
+import time
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models.event import utc_now
+from models.wallet import Transaction, Wallet
+from services.metrics import BILLING_SECONDS
+from services.user_cache import get_user_cache
+
+DEPOSIT = "Deposit"
+SERVICE = "Service"
+
+
+class InsufficientFundsError(ValueError):
+    """На балансе недостаточно средств для списания"""
+
+
+class IdempotencyKeyConflictError(ValueError):
+    """Ключ идемпотентности уже использован для другой операции"""
+
+
+def get_wallet(user_id: int, session: Session) -> Optional[Wallet]:
+    return session.get(Wallet, user_id)
+
+
+def get_balance(user_id: int, session: Session) -> Decimal:
+    wallet = session.get(Wallet, user_id)
+    return wallet.balance if wallet is not None else Decimal("0.00")
+
+
+def create_wallet(user_id: int, session: Session) -> Wallet:
+    """Создаёт кошелёк, если его ещё нет (безопасно при гонке)"""
+    wallet = session.get(Wallet, user_id)
+    if wallet is not None:
+        return wallet
+    try:
+        with session.begin_nested():
+            wallet = Wallet(user_id=user_id)
+            session.add(wallet)
+    except IntegrityError:
+        wallet = session.get(Wallet, user_id, populate_existing=True)
+    session.commit()
+    get_user_cache().invalidate(user_id)
+    return wallet
+
+
+def get_transaction_by_key(idempotency_key: str, session: Session) -> Optional[Transaction]:
+    return session.exec(
+        select(Transaction).where(Transaction.idempotency_key == idempotency_key)).first()
+
+
+def _replayed(existing: Transaction, user_id: int, amount: Decimal,
+              txn_type: str) -> Transaction:
+    """
+    Транзакция, уже записанная под ключом, - если повтор совпадает с ней.
+
+    Пользователь, сумма и тип хранятся в самой транзакции; тот же ключ с
+    другими значениями - ошибка клиента, а не повтор.
+    """
+    if (existing.user_id, existing.txn_type, Decimal(existing.amount)) != \
+            (user_id, txn_type, Decimal(amount)):
+        raise IdempotencyKeyConflictError(
+            f"Idempotency key {existing.idempotency_key!r} was used for another operation")
+    return existing
+
+
+def get_user_transactions(user_id: int, session: Session, limit: int = 50) -> List[Transaction]:
+    statement = (select(Transaction).where(Transaction.user_id == user_id)
+                 .order_by(Transaction.id.desc()).limit(limit))
+    return session.exec(statement).all()
+
+
+def _apply(user_id: int, amount: Decimal, txn_type: str, session: Session,
+           idempotency_key: Optional[str]) -> Transaction:
+    started = time.perf_counter()
+    status = "error"
+    try:
+        txn = _apply_atomic(user_id, amount, txn_type, session, idempotency_key)
+        status = "ok"
+        # Баланс изменился - закешированный снимок пользователя устарел
+        get_user_cache().invalidate(user_id)
+        return txn
+    except InsufficientFundsError:
+        status = "insufficient_funds"
+        raise
+    finally:
+        BILLING_SECONDS.observe(time.perf_counter() - started,
+                                txn_type=txn_type, status=status)
+
+
+def _apply_atomic(user_id: int, amount: Decimal, txn_type: str, session: Session,
+                  idempotency_key: Optional[str]) -> Transaction:
+    """
+    Атомарно меняет баланс и пишет транзакцию в одной транзакции БД.
+
+    Баланс меняется одним UPDATE ... WHERE balance >= amount RETURNING balance,
+    поэтому проверка и списание не разделены и параллельные списания
+    не теряют обновления (на Postgres UPDATE сам берёт блокировку строки).
+    """
+    if amount <= 0:
+        raise ValueError("Amount must be positive")
+    if idempotency_key is not None:
+        existing = get_transaction_by_key(idempotency_key, session)
+        if existing is not None:
+            return _replayed(existing, user_id, amount, txn_type)
+
+    delta = amount if txn_type == DEPOSIT else -amount
+    statement = (
+        update(Wallet)
+        .where(Wallet.user_id == user_id)
+        .values(balance=Wallet.balance + delta, updated_at=utc_now())
+        .returning(Wallet.balance)
+    )
+    if txn_type != DEPOSIT:
+        statement = statement.where(Wallet.balance >= amount)
+    balance = session.execute(statement).scalar_one_or_none()
+    if balance is None:
+        session.rollback()
+        if session.get(Wallet, user_id) is None:
+            raise ValueError(f"Wallet for user {user_id} does not exist")
+        raise InsufficientFundsError("Insufficient funds")
+
+    txn = Transaction(user_id=user_id, txn_type=txn_type, amount=amount,
+                      balance_after=Decimal(balance), idempotency_key=idempotency_key)
+    session.add(txn)
+    try:
+        session.commit()
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел первым - наше изменение откатывается
+        session.rollback()
+        existing = get_transaction_by_key(idempotency_key, session) if idempotency_key else None
+        if existing is None:
+            raise
+        return _replayed(existing, user_id, amount, txn_type)
+    session.refresh(txn)
+    return txn
+
+
+def deposit(user_id: int, amount: Decimal, session: Session,
+            idempotency_key: Optional[str] = None) -> Transaction:
+    return _apply(user_id, amount, DEPOSIT, session, idempotency_key)
+
+
+def charge(user_id: int, amount: Decimal, session: Session,
+           idempotency_key: Optional[str] = None) -> Transaction:
+    return _apply(user_id, amount, SERVICE, session, idempotency_key)
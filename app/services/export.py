@@ -0,0 +1,308 @@
+"""
+Выгрузка истории прогнозов и списаний в колоночные файлы (Parquet / Arrow IPC).
+
+Строки читаются из БД потоком пачками по chunk_size (серверный курсор,
+только нужные колонки, без ORM-объектов) и сразу пишутся в датасет,
+разбитый по дате и корзине пользователя:
+
+    <out>/events/date=2026-10-17/user_bucket=3/part-<run>-0.parquet
+
+Инкрементальность - по водяному знаку (created_at, id) последней
+выгруженной строки, он хранится в JSON-файле состояния. Ночной запуск
+читает только строки новее знака. Перед переносом файлов в датасет в
+состояние записываются новый знак и список файлов запуска; если запуск
+прервался посередине, следующий либо принимает знак (все файлы на месте),
+либо удаляет перенесённые файлы и выгружает те же строки заново, так что
+строки не дублируются:
+
+    python -m services.export --out /data/history --state /data/history/state.json
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from sqlalchemy import and_, or_, select
+from sqlmodel import Session
+
+from models.event import Event, utc_now
+from models.wallet import Transaction
+
+Watermark = Tuple[datetime, int]
+
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_USER_BUCKETS = 16
+# Строки моложе лага не выгружаются: транзакции, начатые раньше, могли ещё
+# не закоммититься, и их created_at оказался бы ниже водяного знака
+DEFAULT_LAG = timedelta(minutes=5)
+
+_AMOUNT = pa.decimal128(12, 2)
+_TIMESTAMP = pa.timestamp("us")
+_PARTITIONING = ds.partitioning(
+    pa.schema([("date", pa.date32()), ("user_bucket", pa.int32())]), flavor="hive")
+
+
+@dataclass(frozen=True)
+class ExportSource:
+    """
+    Описание выгружаемой таблицы.
+
+    Attributes:
+        name (str): имя датасета (подкаталог выгрузки и ключ в файле состояния)
+        model: SQLModel-таблица
+        user_column (str): колонка пользователя для разбиения по корзинам
+        schema (pa.Schema): колонки и их типы в выгрузке
+    """
+    name: str
+    model: type
+    user_column: str
+    schema: pa.Schema
+
+    def columns(self) -> List:
+        table = self.model.__table__
+        return [table.columns[name] for name in self.schema.names]
+
+
+SOURCES: Dict[str, ExportSource] = {
+    "events": ExportSource("events", Event, "creator_id", pa.schema([
+        ("id", pa.int64()),
+        ("creator_id", pa.int64()),
+        ("title", pa.string()),
+        ("image", pa.string()),
+        ("result", pa.string()),
+        ("model_version", pa.string()),
+        ("amount", _AMOUNT),
+        ("created_at", _TIMESTAMP),
+    ])),
+    "transactions": ExportSource("transactions", Transaction, "user_id", pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("txn_type", pa.string()),
+        ("amount", _AMOUNT),
+        ("balance_after", _AMOUNT),
+        ("created_at", _TIMESTAMP),
+    ])),
+}
+
+
+@dataclass
+class ExportReport:
+    """
+    Итог выгрузки одного датасета.
+
+    Attributes:
+        name (str): имя датасета
+        rows (int): выгружено строк
+        chunks (int): число пачек
+        files (int): записано файлов
+        seconds (float): общее время
+        watermark (Optional[Watermark]): водяной знак после выгрузки
+    """
+    name: str
+    rows: int = 0
+    chunks: int = 0
+    files: int = 0
+    seconds: float = 0.0
+    watermark: Optional[Watermark] = None
+
+    def __str__(self) -> str:
+        return (f"{self.name}: exported {self.rows} rows in {self.chunks} chunks "
+                f"to {self.files} files, {self.seconds:.2f}s, watermark {self.watermark}")
+
+
+@dataclass
+class ExportState:
+    """
+    Водяные знаки по датасетам, хранятся в JSON-файле.
+
+    Attributes:
+        path (Path): файл состояния
+        watermarks (Dict[str, Watermark]): знаки завершённых выгрузок
+        pending (Dict[str, Tuple[Watermark, List[str]]]): знак и файлы (относительно
+            каталога датасета) выгрузки, которая переносит файлы прямо сейчас
+    """
+    path: Path
+    watermarks: Dict[str, Watermark] = field(default_factory=dict)
+    pending: Dict[str, Tuple[Watermark, List[str]]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "ExportState":
+        path = Path(path)
+        if not path.exists():
+            return cls(path)
+        data = json.loads(path.read_text())
+        return cls(path, {
+            name: _load_mark(mark) for name, mark in data.get("watermarks", {}).items()
+        }, {
+            name: (_load_mark(mark), mark["files"])
+            for name, mark in data.get("pending", {}).items()
+        })
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"watermarks": {
+            name: _dump_mark(mark) for name, mark in self.watermarks.items()
+        }, "pending": {
+            name: {**_dump_mark(mark), "files": files}
+            for name, (mark, files) in self.pending.items()
+        }}
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.path)
+
+
+def _load_mark(data: Dict) -> Watermark:
+    return datetime.fromisoformat(data["created_at"]), data["id"]
+
+
+def _dump_mark(mark: Watermark) -> Dict:
+    created_at, row_id = mark
+    return {"created_at": created_at.isoformat(), "id": row_id}
+
+
+def _recover(name: str, target: Path, state: ExportState) -> None:
+    """Завершает выгрузку, прерванную во время переноса файлов"""
+    if name not in state.pending:
+        return
+    mark, files = state.pending.pop(name)
+    paths = [target / file for file in files]
+    if all(path.exists() for path in paths):
+        state.watermarks[name] = mark
+    else:
+        # Часть файлов не перенесена: откатываем запуск, строки выгрузятся снова
+        for path in paths:
+            path.unlink(missing_ok=True)
+    state.save()
+
+
+def _statement(source: ExportSource, buckets: int, after: Optional[Watermark],
+               until: datetime):
+    table = source.model.__table__
+    created_at, row_id = table.c.created_at, table.c.id
+    user_bucket = (table.c[source.user_column] % buckets).label("user_bucket")
+    statement = select(*source.columns(), user_bucket).where(created_at <= until)
+    if after is not None:
+        statement = statement.where(or_(
+            created_at > after[0],
+            and_(created_at == after[0], row_id > after[1]),
+        ))
+    return statement.order_by(created_at, row_id)
+
+
+def _to_batch(source: ExportSource, schema: pa.Schema, rows: List) -> pa.RecordBatch:
+    columns = list(zip(*rows))
+    arrays = [pa.array(values, type=column.type)
+              for values, column in zip(columns, source.schema)]
+    created_at = arrays[source.schema.get_field_index("created_at")]
+    arrays.append(pc.cast(created_at, pa.date32()))
+    arrays.append(pa.array(columns[-1], type=pa.int32()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_source(source: ExportSource, session: Session, out_dir: Path,
+                  state: ExportState, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  buckets: int = DEFAULT_USER_BUCKETS, file_format: str = "parquet",
+                  lag: timedelta = DEFAULT_LAG) -> ExportReport:
+    """
+    Выгружает строки новее водяного знака и сдвигает знак.
+
+    В памяти одновременно держится одна пачка. Файлы пишутся во временный
+    каталог; перед переносом в датасет новый знак сохраняется вместе со
+    списком файлов (ExportState.pending), после переноса знак становится
+    основным. Прерванный перенос доводит или откатывает следующий запуск.
+    """
+    report = ExportReport(source.name)
+    started = time.perf_counter()
+    schema = source.schema.append(pa.field("date", pa.date32())) \
+        .append(pa.field("user_bucket", pa.int32()))
+    target = Path(out_dir) / source.name
+    _recover(source.name, target, state)
+    until = utc_now() - lag
+    last: List[Watermark] = []
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        result = session.execute(
+            _statement(source, buckets, state.watermarks.get(source.name), until)
+            .execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            report.rows += len(rows)
+            report.chunks += 1
+            last[:] = [(rows[-1].created_at, rows[-1].id)]
+            yield _to_batch(source, schema, rows)
+
+    run_id = f"{until:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    staging = Path(out_dir) / f"_staging-{source.name}-{run_id}"
+    try:
+        ds.write_dataset(
+            batches(), staging, schema=schema, format=file_format,
+            partitioning=_PARTITIONING,
+            basename_template=f"part-{run_id}-{{i}}.{file_format}",
+            max_rows_per_group=chunk_size,
+        )
+        files = [path.relative_to(staging) for path in staging.rglob(f"*.{file_format}")]
+        if last:
+            state.pending[source.name] = (last[0], [str(file) for file in files])
+            state.save()
+        for file in files:
+            destination = target / file
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging / file, destination)
+            report.files += 1
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    if last:
+        del state.pending[source.name]
+        state.watermarks[source.name] = last[0]
+        state.save()
+    report.watermark = state.watermarks.get(source.name)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def export_history(session: Session, out_dir: Path, state_path: Path,
+                   names: Optional[List[str]] = None,
+                   progress: Optional[Callable[[ExportReport], None]] = None,
+                   **options) -> List[ExportReport]:
+    """Инкрементальная выгрузка нескольких датасетов (по умолчанию всех)"""
+    state = ExportState.load(state_path)
+    reports = []
+    for name in names or list(SOURCES):
+        report = export_source(SOURCES[name], session, out_dir, state, **options)
+        if progress is not None:
+            progress(report)
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    from database.database import get_database_engine
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, required=True, help="каталог датасетов")
+    parser.add_argument("--state", type=Path, default=None,
+                        help="файл водяных знаков (по умолчанию <out>/_state.json)")
+    parser.add_argument("--only", default=",".join(SOURCES))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--buckets", type=int, default=DEFAULT_USER_BUCKETS)
+    parser.add_argument("--format", choices=("parquet", "ipc"), default="parquet")
+    parser.add_argument("--lag-seconds", type=float, default=DEFAULT_LAG.total_seconds())
+    args = parser.parse_args()
+
+    with Session(get_database_engine()) as session:
+        export_history(
+            session, args.out, args.state or args.out / "_state.json",
+            names=[name.strip() for name in args.only.split(",") if name.strip()],
+            progress=print, chunk_size=args.chunk_size, buckets=args.buckets,
+            file_format=args.format, lag=timedelta(seconds=args.lag_seconds),
+        )
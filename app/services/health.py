@@ -0,0 +1,247 @@
+"""
+Проверки зависимостей для readiness.
+
+Каждая проверка выполняется фоновой задачей не чаще раза в interval
+секунд (неудачная - раз в retry_interval, чтобы готовность вернулась
+быстро), результат кешируется. /ready только отдаёт последний снимок и
+не делает ввода-вывода, поэтому частые пробы оркестратора не нагружают
+ни базу, ни модель. Проверки:
+
+    database - SELECT 1 через пул асинхронного движка
+    broker   - AMQP-рукопожатие с RabbitMQ до аутентификации (Connection.Start)
+    model    - прогноз модели на нулевом изображении
+
+Некритичная проверка (broker) попадает в ответ, но не снимает готовность.
+Это readiness; liveness контейнера - /health, он от зависимостей не
+зависит, и короткий сбой базы не делает контейнер нездоровым.
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from services.metrics import HEALTH_CHECK_SECONDS, HEALTH_CHECK_UP
+
+logger = logging.getLogger(__name__)
+
+# Заголовок протокола AMQP 0-9-1 и тип кадра метода в ответе брокера
+_AMQP_HEADER = b"AMQP\x00\x00\x09\x01"
+_AMQP_FRAME_METHOD = 1
+
+
+@dataclass
+class CheckResult:
+    """
+    Последний результат проверки.
+
+    Attributes:
+        ok (bool): зависимость отвечает
+        detail (str): ошибка или пояснение
+        latency_ms (float): время проверки
+        checked_at (float): когда проверялась (time.monotonic), 0 - ещё ни разу
+    """
+    ok: bool = False
+    detail: str = "not checked yet"
+    latency_ms: float = 0.0
+    checked_at: float = 0.0
+
+
+class HealthCheck:
+    """
+    Проверка одной зависимости с ограничением частоты.
+
+    Attributes:
+        name (str): имя зависимости
+        critical (bool): без неё сервис не готов
+        interval (float): не проверять чаще, секунды
+        retry_interval (float): не повторять неудачную проверку чаще, секунды
+        timeout (float): предел времени одной проверки, секунды
+        result (CheckResult): последний результат
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[Optional[str]]],
+                 interval: float = 10.0, timeout: float = 2.0, critical: bool = True,
+                 retry_interval: float = 1.0):
+        self.name = name
+        self.critical = critical
+        self.interval = interval
+        self.retry_interval = min(retry_interval, interval)
+        self.timeout = timeout
+        self.result = CheckResult()
+        self._probe = probe
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False) -> CheckResult:
+        """Проверяет зависимость, если результат устарел; параллельные вызовы ждут одну проверку"""
+        async with self._lock:
+            if not force and not self.stale:
+                return self.result
+            started = time.perf_counter()
+            try:
+                detail = await asyncio.wait_for(self._probe(), self.timeout)
+                ok = True
+            except asyncio.TimeoutError:
+                ok, detail = False, f"timed out after {self.timeout}s"
+            except Exception as e:
+                ok, detail = False, f"{type(e).__name__}: {e}"
+            seconds = time.perf_counter() - started
+            if not ok and self.result.ok:
+                logger.warning("Health check %s failed: %s", self.name, detail)
+            self.result = CheckResult(ok, detail or "", round(seconds * 1000, 3), time.monotonic())
+            HEALTH_CHECK_SECONDS.observe(seconds, check=self.name)
+            HEALTH_CHECK_UP.set(1 if ok else 0, check=self.name)
+            return self.result
+
+    @property
+    def stale(self) -> bool:
+        if not self.result.checked_at:
+            return True
+        age = time.monotonic() - self.result.checked_at
+        return age >= (self.interval if self.result.ok else self.retry_interval)
+
+
+class HealthMonitor:
+    """
+    Набор проверок и фоновая задача, обновляющая их результаты.
+
+    Attributes:
+        checks (List[HealthCheck]): проверки зависимостей
+    """
+
+    def __init__(self, checks: List[HealthCheck]):
+        self.checks = checks
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(check.result.ok for check in self.checks if check.critical)
+
+    def snapshot(self) -> Dict:
+        """Кешированное состояние без обращения к зависимостям"""
+        now = time.monotonic()
+        return {
+            "ready": self.ready,
+            "checks": {
+                check.name: {
+                    "ok": check.result.ok,
+                    "critical": check.critical,
+                    "detail": check.result.detail,
+                    "latency_ms": check.result.latency_ms,
+                    "age_seconds": round(now - check.result.checked_at, 3)
+                    if check.result.checked_at else None,
+                }
+                for check in self.checks
+            },
+        }
+
+    async def refresh(self, force: bool = False) -> None:
+        await asyncio.gather(*(check.refresh(force) for check in self.checks))
+
+    async def _run(self) -> None:
+        interval = min(check.retry_interval for check in self.checks)
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Health checks failed")
+            await asyncio.sleep(interval)
+
+    def start(self) -> "HealthMonitor":
+        if self.checks and self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def database_check(engine) -> Callable[[], Awaitable[Optional[str]]]:
+    """SELECT 1 на соединении из пула: проверка не открывает новых подключений"""
+    from sqlalchemy import text
+
+    async def probe() -> Optional[str]:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return None
+
+    return probe
+
+
+def broker_check(url: str) -> Callable[[], Awaitable[Optional[str]]]:
+    """
+    Брокер принимает AMQP-соединения.
+
+    Отправляется заголовок протокола и читается первый кадр ответа
+    (Connection.Start), после чего соединение закрывается: без
+    аутентификации, каналов и фоновых heartbeat-потоков pika.
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname or "localhost", parts.port or 5672
+
+    async def probe() -> Optional[str]:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(_AMQP_HEADER)
+            await writer.drain()
+            frame = await reader.readexactly(7)
+        finally:
+            writer.close()
+        if frame[0] != _AMQP_FRAME_METHOD:
+            raise ConnectionError(f"Unexpected AMQP response {frame!r} from {host}:{port}")
+        return None
+
+    return probe
+
+
+def model_check(ml) -> Callable[[], Awaitable[Optional[str]]]:
+    """
+    Прогноз прогретой модели на нулевом изображении (вне event loop).
+
+    При MODEL_LOADING=lazy ещё не загруженная модель не снимает готовность:
+    она загрузится первым запросом, а запросы не придут, пока сервис не готов.
+    """
+
+    async def probe() -> Optional[str]:
+        if not ml.ready:
+            if ml.settings.MODEL_LOADING == "lazy" and ml.error is None:
+                return "not loaded yet (MODEL_LOADING=lazy)"
+            raise RuntimeError(ml.error or "Model is warming up")
+        # Текущая активная версия из реестра
+        model = ml.model.current
+        if not model.is_loaded:
+            raise RuntimeError(f"Model is not loaded: {model.model_path}")
+        prediction = await asyncio.to_thread(_canary, model)
+        if not math.isfinite(prediction["score"]):
+            raise ValueError(f"Canary prediction score is {prediction['score']}")
+        return f"{model.backend} {model.version}"
+
+    return probe
+
+
+def _canary(model) -> Dict:
+    import numpy as np
+
+    height, width = model.input_size
+    return model.predict(np.zeros((height, width, 3), dtype=np.uint8))
+
+
+def create_monitor(settings, ml) -> HealthMonitor:
+    """Проверки приложения: база, модель и, если задан RABBITMQ_URL, брокер"""
+    from database.database import get_async_engine
+
+    options = {"interval": settings.HEALTH_CHECK_INTERVAL, "timeout": settings.HEALTH_CHECK_TIMEOUT}
+    checks = [HealthCheck("database", database_check(get_async_engine()), **options),
+              HealthCheck("model", model_check(ml), **options)]
+    if settings.RABBITMQ_URL:
+        checks.append(HealthCheck("broker", broker_check(settings.RABBITMQ_URL),
+                                  critical=False, **options))
+    return HealthMonitor(checks)
@@ -0,0 +1,266 @@
+"""
+Журнал кошелька: баланс на момент времени и периодические снимки.
+
+Таблица transaction - неизменяемый журнал, Wallet.balance - текущий баланс
+для чтения за O(1). Баланс на произвольный момент и сверка считаются из
+журнала: ближайший более ранний снимок (WalletSnapshot) плюс транзакции
+после него. Снимки раз в snapshot_every транзакций пользователя пишет
+фоновый LedgerCompactor, поэтому хвост, который приходится суммировать,
+не длиннее snapshot_every и не зависит от длины истории.
+
+Порядок id транзакций пользователя совпадает с порядком их применения:
+транзакция пишется под блокировкой строки кошелька (см. crud.wallet).
+
+Запуск отдельным процессом:
+    python -m services.ledger               # компактор в цикле
+    python -m services.ledger --once        # один проход
+    python -m services.ledger --audit 42    # сверка кошелька пользователя 42
+"""
+import argparse
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models.wallet import Transaction, Wallet, WalletSnapshot
+from services.crud.wallet import DEPOSIT
+from services.metrics import LEDGER_MISMATCHES, LEDGER_SNAPSHOTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_EVERY = 1000
+ZERO = Decimal("0.00")
+
+_signed_amount = case((Transaction.txn_type == DEPOSIT, Transaction.amount),
+                      else_=-Transaction.amount)
+
+
+class LedgerMismatchError(ValueError):
+    """Баланс из журнала разошёлся с balance_after транзакции"""
+
+    def __init__(self, user_id: int, txn_id: int, computed: Decimal, stored: Decimal):
+        super().__init__(f"Ledger mismatch for user {user_id} at transaction {txn_id}: "
+                         f"computed {computed}, stored {stored}")
+        self.user_id = user_id
+        self.txn_id = txn_id
+        self.computed = computed
+        self.stored = stored
+
+
+def _quantize(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(ZERO)
+
+
+def latest_snapshot(user_id: int, session: Session,
+                    at: Optional[datetime] = None) -> Optional[WalletSnapshot]:
+    """Последний снимок пользователя (не позже at, если задан)"""
+    statement = select(WalletSnapshot).where(WalletSnapshot.user_id == user_id)
+    if at is not None:
+        statement = statement.where(WalletSnapshot.txn_created_at <= at)
+    return session.exec(statement.order_by(WalletSnapshot.txn_id.desc()).limit(1)).first()
+
+
+def _tail_sum(user_id: int, session: Session, after_txn_id: int,
+              at: Optional[datetime] = None) -> tuple:
+    statement = (select(func.coalesce(func.sum(_signed_amount), 0), func.count())
+                 .where(Transaction.user_id == user_id, Transaction.id > after_txn_id))
+    if at is not None:
+        statement = statement.where(Transaction.created_at <= at)
+    total, count = session.exec(statement).one()
+    return _quantize(total), count
+
+
+def balance_at(user_id: int, at: datetime, session: Session) -> Decimal:
+    """Баланс сразу после последней транзакции не позже at: снимок + хвост журнала"""
+    snapshot = latest_snapshot(user_id, session, at)
+    base, after = (snapshot.balance, snapshot.txn_id) if snapshot else (ZERO, 0)
+    tail, _ = _tail_sum(user_id, session, after, at)
+    return _quantize(base + tail)
+
+
+@dataclass
+class AuditResult:
+    """
+    Сверка кошелька с журналом.
+
+    Attributes:
+        user_id (int): пользователь
+        stored (Decimal): баланс в Wallet
+        computed (Decimal): баланс из последнего снимка и хвоста журнала
+        tail_length (int): сколько транзакций просуммировано после снимка
+    """
+    user_id: int
+    stored: Decimal
+    computed: Decimal
+    tail_length: int
+
+    @property
+    def ok(self) -> bool:
+        return self.stored == self.computed
+
+
+def audit_wallet(user_id: int, session: Session) -> AuditResult:
+    """Сверяет текущий баланс с журналом, читая только хвост после снимка"""
+    wallet = session.get(Wallet, user_id)
+    snapshot = latest_snapshot(user_id, session)
+    base, after = (snapshot.balance, snapshot.txn_id) if snapshot else (ZERO, 0)
+    tail, count = _tail_sum(user_id, session, after)
+    result = AuditResult(user_id, _quantize(wallet.balance if wallet else 0),
+                         _quantize(base + tail), count)
+    if not result.ok:
+        LEDGER_MISMATCHES.inc()
+    return result
+
+
+def compact_wallet(user_id: int, session: Session,
+                   snapshot_every: int = DEFAULT_SNAPSHOT_EVERY) -> int:
+    """
+    Дописывает снимки пользователя по журналу после последнего снимка.
+
+    Каждая транзакция хвоста сверяется со своим balance_after: при
+    расхождении (как и при любой другой ошибке) новые снимки откатываются
+    и поднимается LedgerMismatchError. Снимки коммитятся только после
+    успешной сверки всего хвоста. Возвращает число новых снимков.
+    """
+    snapshot = latest_snapshot(user_id, session)
+    balance, count, after = ((snapshot.balance, snapshot.txn_count, snapshot.txn_id)
+                             if snapshot else (ZERO, 0, 0))
+    rows = session.execute(
+        select(Transaction.id, Transaction.txn_type, Transaction.amount,
+               Transaction.balance_after, Transaction.created_at)
+        .where(Transaction.user_id == user_id, Transaction.id > after)
+        .order_by(Transaction.id)
+        .execution_options(yield_per=snapshot_every)
+    )
+    created = 0
+    try:
+        for txn_id, txn_type, amount, balance_after, created_at in rows:
+            balance += amount if txn_type == DEPOSIT else -amount
+            count += 1
+            if balance != balance_after:
+                LEDGER_MISMATCHES.inc()
+                raise LedgerMismatchError(user_id, txn_id, balance, balance_after)
+            if count % snapshot_every == 0:
+                session.add(WalletSnapshot(user_id=user_id, txn_id=txn_id, balance=balance,
+                                           txn_count=count, txn_created_at=created_at))
+                created += 1
+    except BaseException:
+        rows.close()
+        session.rollback()
+        raise
+    rows.close()
+    session.commit()
+    LEDGER_SNAPSHOTS.inc(created)
+    return created
+
+
+def users_to_compact(session: Session, snapshot_every: int = DEFAULT_SNAPSHOT_EVERY,
+                     limit: int = 1000) -> List[int]:
+    """Пользователи, у которых после последнего снимка набралось snapshot_every транзакций"""
+    last = (select(WalletSnapshot.user_id, func.max(WalletSnapshot.txn_id).label("txn_id"))
+            .group_by(WalletSnapshot.user_id).subquery())
+    statement = (
+        select(Transaction.user_id)
+        .outerjoin(last, last.c.user_id == Transaction.user_id)
+        .where(Transaction.id > func.coalesce(last.c.txn_id, 0))
+        .group_by(Transaction.user_id)
+        .having(func.count() >= snapshot_every)
+        .limit(limit)
+    )
+    return list(session.exec(statement).all())
+
+
+class LedgerCompactor:
+    """
+    Фоновый поток, поддерживающий снимки балансов.
+
+    Раз в interval секунд находит пользователей с длинным хвостом журнала
+    и дописывает им снимки. Несколько компакторов (например, в разных
+    процессах) не мешают друг другу: повторный снимок отбрасывается
+    по первичному ключу.
+
+    Attributes:
+        engine: движок БД
+        snapshot_every (int): снимок на каждые столько транзакций пользователя
+        interval (float): пауза между проходами, секунды
+    """
+
+    def __init__(self, engine, snapshot_every: int = DEFAULT_SNAPSHOT_EVERY,
+                 interval: float = 60.0):
+        if snapshot_every < 1:
+            raise ValueError("snapshot_every must be positive")
+        self.engine = engine
+        self.snapshot_every = snapshot_every
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        """Один проход по всем отстающим пользователям, возвращает число снимков"""
+        created = 0
+        with Session(self.engine) as session:
+            while True:
+                user_ids = users_to_compact(session, self.snapshot_every)
+                progressed = 0
+                for user_id in user_ids:
+                    try:
+                        progressed += compact_wallet(user_id, session, self.snapshot_every)
+                    except IntegrityError:
+                        # Снимок уже записал другой компактор
+                        session.rollback()
+                    except LedgerMismatchError:
+                        logger.exception("Wallet ledger of user %s is inconsistent", user_id)
+                created += progressed
+                if not user_ids or not progressed:
+                    return created
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Ledger compaction failed")
+            self._stop.wait(self.interval)
+
+    def start(self) -> "LedgerCompactor":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="ledger-compactor",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+
+if __name__ == "__main__":
+    from database.config import get_settings
+    from database.database import get_database_engine
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="один проход и выход")
+    parser.add_argument("--audit", type=int, metavar="USER_ID", help="сверить кошелёк")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    compactor = LedgerCompactor(get_database_engine(), settings.LEDGER_SNAPSHOT_EVERY,
+                                settings.LEDGER_COMPACTION_INTERVAL)
+    if args.audit is not None:
+        with Session(compactor.engine) as session:
+            print(audit_wallet(args.audit, session))
+    elif args.once:
+        print(f"snapshots created: {compactor.run_once()}")
+    else:
+        logging.basicConfig(level=logging.INFO)
+        compactor.run()
@@ -0,0 +1,418 @@
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+# Снимок реестра (Registry.snapshot): имя метрики -> тип, описание, метки и значения
+Snapshot = Dict[str, Dict[str, Any]]
+
+
+class _Metric:
+    """Базовый класс метрики с набором меток"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "documentation": self.documentation,
+                "labelnames": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        lines += [f"{self.name}{self._format_labels(k)} {v}" for k, v in items]
+        return lines
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = [[list(k), v] for k, v in self._values.items()]
+        return {**super().snapshot(), "values": values}
+
+    def merge(self, values: List[list], worker: str) -> None:
+        """Добавляет значения из снимка другого процесса"""
+        with self._lock:
+            for key, value in values:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0.0) + value
+
+
+class Gauge(Counter):
+    """
+    Датчик; multiprocess_mode - как сводить значения процессов в SharedMetrics:
+    sum, min, max или all (значение каждого процесса с меткой worker).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 multiprocess_mode: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**super().snapshot(), "multiprocess_mode": self.multiprocess_mode}
+
+    def merge(self, values: List[list], worker: str) -> None:
+        if self.multiprocess_mode == "sum":
+            super().merge(values, worker)
+            return
+        with self._lock:
+            for key, value in values:
+                key = tuple(key)
+                current = self._values.get(key)
+                if self.multiprocess_mode == "all":
+                    # Метка worker - последняя, её добавил Registry.merge
+                    self._values[key + (worker,)] = value
+                elif current is None:
+                    self._values[key] = value
+                else:
+                    self._values[key] = (min if self.multiprocess_mode == "min" else max)(
+                        current, value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: счётчики по корзинам (+Inf последняя), сумма
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = self._format_labels(key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = [[list(k), list(counts), total[0]]
+                      for k, (counts, total) in self._values.items()]
+        return {**super().snapshot(), "buckets": list(self.buckets), "values": values}
+
+    def merge(self, values: List[list], worker: str) -> None:
+        with self._lock:
+            for key, counts, total in values:
+                entry = self._values.get(tuple(key))
+                if entry is None:
+                    entry = self._values[tuple(key)] = ([0] * (len(self.buckets) + 1), [0.0])
+                for index, count in enumerate(counts):
+                    entry[0][index] += count
+                entry[1][0] += total
+
+
+class Registry:
+    """Реестр метрик процесса, отдаётся в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              multiprocess_mode: str = "sum") -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, multiprocess_mode)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def merge(self, snapshot: Snapshot, worker: str) -> None:
+        """Добавляет снимок реестра другого процесса (см. SharedMetrics)"""
+        for name, spec in snapshot.items():
+            labelnames = spec["labelnames"]
+            if spec["kind"] == "counter":
+                metric = self.counter(name, spec["documentation"], labelnames)
+            elif spec["kind"] == "gauge":
+                mode = spec["multiprocess_mode"]
+                metric = self.gauge(name, spec["documentation"],
+                                    labelnames + ["worker"] if mode == "all" else labelnames,
+                                    mode)
+            else:
+                metric = self.histogram(name, spec["documentation"], labelnames,
+                                        spec["buckets"])
+            metric.merge(spec["values"], worker)
+
+
+def _read_snapshot(path: Path) -> Optional[Snapshot]:
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        # Мастер как раз перенёс снимок завершившегося воркера в архив
+        return None
+
+
+def _write_snapshot(path: Path, snapshot: Snapshot) -> None:
+    # Через временный файл: читатель видит либо старый снимок, либо новый целиком
+    partial = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    partial.write_text(json.dumps(snapshot))
+    os.replace(partial, path)
+
+
+ARCHIVE_FILE = "archive.json"
+
+
+class SharedMetrics:
+    """
+    Метрики нескольких процессов (воркеров gunicorn) через общий каталог.
+
+    Реестр у каждого процесса свой. Процесс раз в interval секунд и при
+    остановке записывает его снимок в directory/{pid}.json, а render
+    складывает свой реестр со снимками остальных процессов: /metrics
+    любого воркера отдаёт метрики всего сервиса, чужие - с задержкой не
+    больше interval. Счётчики и гистограммы суммируются, датчики сводятся
+    по своему multiprocess_mode.
+
+    Снимок завершившегося процесса мастер переносит в archive.json
+    (mark_process_dead): счётчики и гистограммы не уменьшаются при
+    перезапуске воркера, датчики мёртвого процесса отбрасываются.
+
+    Attributes:
+        directory (Path): общий каталог снимков
+        registry (Registry): реестр этого процесса
+        interval (float): как часто записывать снимок, секунды
+    """
+
+    def __init__(self, directory: str, registry: Optional[Registry] = None,
+                 interval: float = 1.0):
+        self.directory = Path(directory)
+        self.registry = registry if registry is not None else REGISTRY
+        self.interval = interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path = self.directory / f"{os.getpid()}.json"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SharedMetrics":
+        self.dump()
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except OSError:
+                logger.exception("Failed to write metrics snapshot to %s", self._path)
+
+    def dump(self) -> None:
+        _write_snapshot(self._path, self.registry.snapshot())
+
+    def render(self) -> str:
+        merged = Registry()
+        merged.merge(self.registry.snapshot(), str(os.getpid()))
+        for path in sorted(self.directory.glob("*.json")):
+            if path == self._path:
+                continue
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                merged.merge(snapshot, path.stem)
+        return merged.render()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """Переносит счётчики и гистограммы завершившегося процесса в архив (вызывает мастер)"""
+    path = Path(directory) / f"{pid}.json"
+    snapshot = _read_snapshot(path)
+    if snapshot is None:
+        return
+    archive_path = Path(directory) / ARCHIVE_FILE
+    merged = Registry()
+    merged.merge(_read_snapshot(archive_path) or {}, "archive")
+    merged.merge({name: spec for name, spec in snapshot.items() if spec["kind"] != "gauge"},
+                 "archive")
+    _write_snapshot(archive_path, merged.snapshot())
+    path.unlink()
+
+
+def clear_directory(directory: str) -> None:
+    """Удаляет снимки прошлого запуска; вызывать в мастере до старта воркеров"""
+    for path in Path(directory).glob("*.json"):
+        path.unlink()
+
+
+REGISTRY = Registry()
+
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "model_load_seconds", "Time to load model weights", ["status"])
+PREPROCESS_DECODE_BYTES = REGISTRY.histogram(
+    "preprocess_decode_bytes", "Peak Pillow buffer memory while decoding one upload",
+    buckets=(1 << 16, 1 << 18, 1 << 20, 4 << 20, 16 << 20, 32 << 20, 64 << 20, 128 << 20))
+PREPROCESS_SECONDS = REGISTRY.histogram(
+    "preprocess_seconds", "Image decode and resize time")
+INFERENCE_SECONDS = REGISTRY.histogram(
+    "inference_seconds", "Model forward pass time per batch")
+INFERENCE_BATCH_SIZE = REGISTRY.histogram(
+    "inference_batch_size", "Images per forward pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BILLING_SECONDS = REGISTRY.histogram(
+    "billing_transaction_seconds", "Wallet transaction time", ["txn_type", "status"])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "SQL statement execution time", ["statement"])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "HTTP request latency", ["method", "route", "status"])
+RATE_LIMITED = REGISTRY.counter(
+    "rate_limited_total", "Requests rejected by the per-user rate limiter", ["tier"])
+COALESCED_REQUESTS = REGISTRY.counter(
+    "coalesced_requests_total", "Requests served by an identical in-flight request")
+USER_CACHE_REQUESTS = REGISTRY.counter(
+    "user_cache_requests_total", "User cache lookups by outcome", ["result"])
+INFERENCE_QUEUE_DEPTH = REGISTRY.gauge(
+    "inference_queue_depth", "Inference jobs waiting in the fair scheduler")
+INFERENCE_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "inference_queue_wait_seconds", "Time an inference job waited in the queue", ["tier"])
+INFERENCE_REJECTED = REGISTRY.counter(
+    "inference_rejected_total", "Inference jobs rejected by admission control or expired",
+    ["reason", "tier"])
+LEDGER_SNAPSHOTS = REGISTRY.counter(
+    "ledger_snapshots_total", "Wallet balance snapshots written by the compactor")
+LEDGER_MISMATCHES = REGISTRY.counter(
+    "ledger_mismatches_total", "Wallet balances that disagree with the transaction ledger")
+HEALTH_CHECK_SECONDS = REGISTRY.histogram(
+    "health_check_seconds", "Dependency health check duration", ["check"])
+HEALTH_CHECK_UP = REGISTRY.gauge(
+    "health_check_up", "Last dependency health check result (1 - ok)", ["check"],
+    multiprocess_mode="min")
+
+_instrumented_engines: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def instrument_engine(engine) -> None:
+    """Подключает замер времени SQL-запросов к движку SQLAlchemy (sync или async)"""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=verb)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("query_started") if context.connection else None
+        if stack:
+            stack.pop()
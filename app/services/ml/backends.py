@@ -0,0 +1,277 @@
+"""
+Бэкенды прямого прохода классификатора на CPU.
+
+numpy - матричные умножения NumPy (BLAS), без дополнительных зависимостей.
+onnx - тот же граф в ONNX Runtime (onnx и onnxruntime импортируются только
+при выборе этого бэкенда). onnx-int8 - ONNX-граф с весами, динамически
+квантованными в int8: меньше памяти и быстрее на больших слоях, ценой
+небольшой погрешности. Поэтому при загрузке его ответы сверяются с float
+на калибровочных входах, и при слишком большом расхождении модель
+остаётся на float.
+
+Число потоков задаётся явно: несколько воркеров на одной машине иначе
+запускают каждый по потоку на ядро и мешают друг другу. pin_worker
+закрепляет процесс воркера за своей частью ядер.
+"""
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("numpy", "onnx", "onnx-int8")
+ONNX_OPSET = 17
+ONNX_IR_VERSION = 9
+
+
+@dataclass(frozen=True)
+class BackendOptions:
+    """
+    Выбор и настройки бэкенда.
+
+    Attributes:
+        name (str): numpy, onnx или onnx-int8
+        intra_op_threads (Optional[int]): потоков внутри одной операции
+            (по умолчанию - число ядер, доступных процессу)
+        inter_op_threads (int): потоков для независимых операций графа (ONNX)
+        min_agreement (float): минимальная доля совпадения top-1 int8 с float
+        max_prob_diff (float): допустимое расхождение вероятностей, при котором
+            несовпадение top-1 считается ничьей (классы с почти равными вероятностями)
+        calibration_samples (int): сколько входов сравнивать при загрузке int8
+    """
+    name: str = "numpy"
+    intra_op_threads: Optional[int] = None
+    inter_op_threads: int = 1
+    min_agreement: float = 0.98
+    max_prob_diff: float = 0.01
+    calibration_samples: int = 256
+
+    @classmethod
+    def from_settings(cls, settings) -> "BackendOptions":
+        return cls(name=settings.MODEL_BACKEND,
+                   intra_op_threads=settings.INFERENCE_INTRA_OP_THREADS,
+                   inter_op_threads=settings.INFERENCE_INTER_OP_THREADS,
+                   min_agreement=settings.INT8_MIN_AGREEMENT)
+
+    @property
+    def threads(self) -> int:
+        return self.intra_op_threads or available_cores()
+
+
+def available_cores() -> int:
+    """Ядра, на которых процессу разрешено выполняться (с учётом закрепления)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def pin_worker(index: int, workers: int) -> List[int]:
+    """
+    Закрепляет текущий процесс за index-й из workers равных частей доступных ядер.
+
+    Возвращает ядра процесса. Если ядер меньше, чем воркеров, части
+    пересекаются по кругу. На системах без sched_setaffinity ничего не делает.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return []
+    cores = sorted(os.sched_getaffinity(0))
+    per_worker = max(1, len(cores) // max(1, workers))
+    start = (index * per_worker) % len(cores)
+    selected = [cores[(start + i) % len(cores)] for i in range(per_worker)]
+    os.sched_setaffinity(0, selected)
+    return selected
+
+
+class InferenceBackend(ABC):
+    """Прямой проход: батч (N, input_dim) float32 -> вероятности классов (N, classes)"""
+
+    name = ""
+
+    @abstractmethod
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        ...
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        """Память под веса бэкенда"""
+
+
+class NumpyBackend(InferenceBackend):
+    """Прямой проход на NumPy; потоки BLAS ограничиваются через threadpoolctl, если он есть"""
+
+    name = "numpy"
+
+    def __init__(self, weights, options: BackendOptions = BackendOptions()):
+        self.weights = weights
+        if options.intra_op_threads:
+            _limit_blas_threads(options.intra_op_threads)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.weights.forward(batch)
+
+    @property
+    def nbytes(self) -> int:
+        return self.weights.nbytes
+
+
+def _limit_blas_threads(threads: int) -> None:
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        logger.warning("threadpoolctl is not installed, set OMP_NUM_THREADS=%d "
+                       "to limit BLAS threads", threads)
+        return
+    # Без with: ограничение действует на весь процесс до конца его жизни
+    threadpool_limits(threads)
+
+
+def build_onnx(weights):
+    """ONNX-граф перцептрона из весов: MatMul + Add (+ Relu) на слой, Softmax в конце"""
+    from onnx import TensorProto, helper, numpy_helper
+
+    nodes, initializers = [], []
+    current, last = "input", len(weights.layers) - 1
+    for i, (w, b) in enumerate(weights.layers):
+        initializers += [numpy_helper.from_array(w, f"W{i}"), numpy_helper.from_array(b, f"b{i}")]
+        nodes += [helper.make_node("MatMul", [current, f"W{i}"], [f"matmul{i}"]),
+                  helper.make_node("Add", [f"matmul{i}", f"b{i}"], [f"logits{i}"])]
+        current = f"logits{i}"
+        if i != last:
+            nodes.append(helper.make_node("Relu", [current], [f"hidden{i}"]))
+            current = f"hidden{i}"
+    nodes.append(helper.make_node("Softmax", [current], ["probs"], axis=1))
+    graph = helper.make_graph(
+        nodes, "birds_mlp",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", weights.input_dim])],
+        [helper.make_tensor_value_info("probs", TensorProto.FLOAT,
+                                       ["batch", len(weights.classes)])],
+        initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", ONNX_OPSET)])
+    model.ir_version = ONNX_IR_VERSION
+    return model
+
+
+def quantize_onnx(model) -> bytes:
+    """Динамическая квантизация весов MatMul в int8 (активации квантуются на лету)"""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = Path(tmp) / "float.onnx", Path(tmp) / "int8.onnx"
+        onnx.save(model, source)
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8, per_channel=True)
+        return target.read_bytes()
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    Прямой проход в ONNX Runtime на CPU.
+
+    Attributes:
+        quantized (bool): веса квантованы в int8
+    """
+
+    def __init__(self, model_bytes: bytes, nbytes: int, options: BackendOptions,
+                 quantized: bool = False):
+        import onnxruntime as ort
+
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = options.threads
+        session_options.inter_op_num_threads = options.inter_op_threads
+        session_options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL
+                                           if options.inter_op_threads > 1
+                                           else ort.ExecutionMode.ORT_SEQUENTIAL)
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_bytes, session_options,
+                                            providers=["CPUExecutionProvider"])
+        self.quantized = quantized
+        self.name = "onnx-int8" if quantized else "onnx"
+        self._nbytes = nbytes
+
+    @classmethod
+    def from_weights(cls, weights, options: BackendOptions,
+                     quantized: bool = False) -> "OnnxBackend":
+        model = build_onnx(weights)
+        if not quantized:
+            return cls(model.SerializeToString(), weights.nbytes, options)
+        # int8-веса в четыре раза меньше float32, смещения остаются float32
+        nbytes = sum(w.size + b.nbytes for w, b in weights.layers)
+        return cls(quantize_onnx(model), nbytes, options, quantized=True)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {"input": np.ascontiguousarray(batch, np.float32)})[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+
+@dataclass
+class CalibrationReport:
+    """
+    Сравнение ответов двух бэкендов на одних входах.
+
+    Attributes:
+        samples (int): число входов
+        top1_agreement (float): доля входов с одинаковым top-1 классом
+        max_abs_diff (float): максимальное расхождение вероятностей
+        mean_abs_diff (float): среднее расхождение вероятностей
+    """
+    samples: int
+    top1_agreement: float
+    max_abs_diff: float
+    mean_abs_diff: float
+
+    def acceptable(self, min_agreement: float, max_prob_diff: float) -> bool:
+        return self.top1_agreement >= min_agreement or self.max_abs_diff <= max_prob_diff
+
+
+def calibration_inputs(weights, samples: int = 256, seed: int = 0) -> np.ndarray:
+    """Синтетические входы в диапазоне признаков модели [0, 1]"""
+    rng = np.random.default_rng(seed)
+    return rng.random((samples, weights.input_dim), dtype=np.float32)
+
+
+def compare_backends(reference: InferenceBackend, candidate: InferenceBackend,
+                     inputs: np.ndarray, batch_size: int = 64) -> CalibrationReport:
+    expected, actual = [], []
+    for start in range(0, len(inputs), batch_size):
+        batch = inputs[start:start + batch_size]
+        expected.append(reference.forward(batch))
+        actual.append(candidate.forward(batch))
+    expected, actual = np.concatenate(expected), np.concatenate(actual)
+    diff = np.abs(expected - actual)
+    return CalibrationReport(
+        samples=len(inputs),
+        top1_agreement=float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean()),
+        max_abs_diff=float(diff.max()),
+        mean_abs_diff=float(diff.mean()),
+    )
+
+
+def create_backend(weights, options: BackendOptions = BackendOptions()) -> InferenceBackend:
+    """Бэкенд по имени; int8, заметно расходящийся с float, заменяется на float ONNX"""
+    if options.name == "numpy":
+        return NumpyBackend(weights, options)
+    if options.name == "onnx":
+        return OnnxBackend.from_weights(weights, options)
+    if options.name != "onnx-int8":
+        raise ValueError(f"Unknown inference backend {options.name!r}, expected one of {BACKENDS}")
+    reference = OnnxBackend.from_weights(weights, options)
+    quantized = OnnxBackend.from_weights(weights, options, quantized=True)
+    report = compare_backends(reference, quantized,
+                              calibration_inputs(weights, options.calibration_samples))
+    if not report.acceptable(options.min_agreement, options.max_prob_diff):
+        logger.warning("int8 model disagrees with float (%s), using float ONNX", report)
+        return reference
+    logger.info("int8 model calibration: %s", report)
+    return quantized
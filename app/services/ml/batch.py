@@ -0,0 +1,521 @@
+"""
+Офлайн-классификация большого набора изображений.
+
+Источник - каталог (обходится рекурсивно, в отсортированном порядке) или
+манифест с путём на строку. Пути читаются лениво, изображения
+декодируются в пуле процессов пачками по --chunk-size, прогноз идёт
+батчами по --batch-size в основном процессе. В полёте держится не больше
+2 * workers пачек, результаты сразу пишутся в JSONL или в каталог
+Parquet-файлов, поэтому память не растёт с размером набора.
+
+Для детерминированного порядка имена в каждом каталоге сортируются в
+памяти, поэтому каталог с больше чем MAX_DIRECTORY_ENTRIES записей
+отклоняется: для таких наборов нужен манифест, например
+
+    find /data/birds -type f -name '*.jpg' | sort > birds.txt
+
+Каждые --checkpoint-every изображений вывод сбрасывается на диск и
+сохраняется контрольная точка; прерванный запуск с тем же --checkpoint
+продолжается с места последней точки:
+
+    python -m services.ml.batch /data/birds --out /data/birds.jsonl \\
+        --checkpoint /data/birds.ckpt.json
+
+С --user-id вызовы модели пишутся в таблицу событий пачкой на каждую
+контрольную точку, с --price за пачку ещё и списывается плата (события
+и списание - в одной транзакции БД, с ключом идемпотентности пачки).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff"})
+FORMATS = ("jsonl", "parquet")
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_CHUNK_SIZE = 32
+DEFAULT_CHECKPOINT_EVERY = 10_000
+# Сколько записей одного каталога сортировать в памяти при обходе
+MAX_DIRECTORY_ENTRIES = 100_000
+
+Record = Dict[str, Any]
+
+
+def walk_images(root: Path, max_entries: int = MAX_DIRECTORY_ENTRIES) -> Iterator[str]:
+    """
+    Пути изображений в каталоге, рекурсивно и в детерминированном порядке.
+
+    В памяти держатся только имена подходящих записей текущих каталогов;
+    каталог больше max_entries записей - ошибка, такой набор задаётся манифестом.
+    """
+    names = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                names.append((entry.name, True))
+            elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                names.append((entry.name, False))
+            if len(names) > max_entries:
+                raise ValueError(f"Directory {root} has more than {max_entries} entries, "
+                                 f"pass a manifest with one path per line instead")
+    names.sort()
+    for name, is_dir in names:
+        path = os.path.join(root, name)
+        if is_dir:
+            yield from walk_images(path, max_entries)
+        else:
+            yield path
+
+
+def read_manifest(path: Path) -> Iterator[str]:
+    """Пути из манифеста: по одному на строку, пустые строки и # - комментарии"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def iter_source(source: Path) -> Iterator[str]:
+    return walk_images(source) if Path(source).is_dir() else read_manifest(source)
+
+
+def load_image(path: str, size: Tuple[int, int]) -> np.ndarray:
+    """Изображение в uint8 (высота, ширина, 3); JPEG масштабируется уже при декодировании"""
+    height, width = size
+    with Image.open(path) as image:
+        image.draft("RGB", (width, height))
+        image = image.convert("RGB")
+        if image.size != (width, height):
+            image = image.resize((width, height))
+        return np.asarray(image)
+
+
+def _decode_chunk(paths: List[str], size: Tuple[int, int]
+                  ) -> Tuple[List[str], np.ndarray, List[Optional[str]]]:
+    """
+    Декодирует пачку в процессе пула.
+
+    Возвращает пути, массив (N, высота, ширина, 3) uint8 и ошибку для
+    каждого пути (None, если изображение прочитано; на месте битого - нули).
+    Любая ошибка декодирования, в том числе DecompressionBombError, остаётся
+    ошибкой своей строки: иначе один файл ронял бы запуск на каждом продолжении.
+    Пиксели передаются в основной процесс одним массивом uint8 - в четыре
+    раза меньше float32.
+    """
+    height, width = size
+    pixels = np.zeros((len(paths), height, width, 3), dtype=np.uint8)
+    errors: List[Optional[str]] = []
+    for i, path in enumerate(paths):
+        try:
+            pixels[i] = load_image(path, size)
+            errors.append(None)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+    return paths, pixels, errors
+
+
+def decode_stream(pool: Executor, paths: Iterable[str], size: Tuple[int, int],
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, window: int = 4
+                  ) -> Iterator[Tuple[List[str], np.ndarray, List[Optional[str]]]]:
+    """
+    Декодированные пачки в порядке путей.
+
+    В пул отправляется не больше window пачек вперёд: следующая пачка
+    ставится, только когда основной процесс забирает готовую.
+    """
+    iterator = iter(paths)
+    pending = deque()
+
+    def submit() -> bool:
+        chunk = list(islice(iterator, chunk_size))
+        if chunk:
+            pending.append(pool.submit(_decode_chunk, chunk, size))
+        return bool(chunk)
+
+    while len(pending) < window and submit():
+        pass
+    while pending:
+        result = pending.popleft().result()
+        submit()
+        yield result
+
+
+def _batches(chunks: Iterable[Tuple[List[str], np.ndarray, List[Optional[str]]]],
+             batch_size: int) -> Iterator[Tuple[List[str], np.ndarray, List[Optional[str]]]]:
+    """Склеивает пачки декодирования в батчи для модели"""
+    buffer: List[Tuple[List[str], np.ndarray, List[Optional[str]]]] = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk[0])
+        if buffered >= batch_size:
+            yield _concat(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield _concat(buffer)
+
+
+def _concat(chunks) -> Tuple[List[str], np.ndarray, List[Optional[str]]]:
+    if len(chunks) == 1:
+        return chunks[0]
+    return ([path for paths, _, _ in chunks for path in paths],
+            np.concatenate([pixels for _, pixels, _ in chunks]),
+            [error for _, _, errors in chunks for error in errors])
+
+
+class JsonlWriter:
+    """Результаты построчно в JSON; при продолжении файл обрезается до контрольной точки"""
+
+    def __init__(self, path: Path, state: Optional[Dict[str, Any]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._file.truncate((state or {}).get("offset", 0))
+        self._file.seek(0, os.SEEK_END)
+
+    def write(self, records: List[Record]) -> None:
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n"
+                                 for record in records).encode("utf-8"))
+
+    def flush(self) -> Dict[str, Any]:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"offset": self._file.tell()}
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Результаты в каталог part-NNNNN.parquet, по файлу на контрольную точку.
+
+    Файл пишется во временный и переименовывается, так что в каталоге
+    не бывает недописанных частей. Части новее контрольной точки (от
+    прерванного запуска) при продолжении удаляются.
+    """
+
+    def __init__(self, path: Path, state: Optional[Dict[str, Any]] = None):
+        import pyarrow as pa
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.part = (state or {}).get("part", 0)
+        self.schema = pa.schema([("path", pa.string()), ("output", pa.string()),
+                                 ("score", pa.float32()), ("model_version", pa.string()),
+                                 ("error", pa.string())])
+        self._records: List[Record] = []
+        for stale in self.path.glob("part-*.parquet"):
+            if int(stale.stem.split("-")[1]) >= self.part:
+                stale.unlink()
+
+    def write(self, records: List[Record]) -> None:
+        self._records.extend(records)
+
+    def flush(self) -> Dict[str, Any]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._records:
+            table = pa.Table.from_pylist(self._records, schema=self.schema)
+            target = self.path / f"part-{self.part:05d}.parquet"
+            tmp = target.with_suffix(f".{os.getpid()}.tmp")
+            pq.write_table(table, tmp)
+            os.replace(tmp, target)
+            self.part += 1
+            self._records = []
+        return {"part": self.part}
+
+    def close(self) -> None:
+        pass
+
+
+WRITERS = {"jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+@dataclass
+class Checkpoint:
+    """
+    Состояние запуска, хранится в JSON-файле.
+
+    Attributes:
+        path (Path): файл контрольной точки
+        run_id (str): идентификатор запуска (часть ключей идемпотентности списаний)
+        source (str): каталог или манифест
+        output (str): файл или каталог результатов
+        format (str): jsonl или parquet
+        batch_size (int): размер батча модели
+        chunk_size (int): изображений в одной задаче декодирования
+        checkpoint_every (int): изображений между контрольными точками
+        processed (int): обработано путей источника
+        last_path (Optional[str]): последний обработанный путь (сверяется при продолжении)
+        classified (int): классифицировано изображений
+        failed (int): не удалось прочитать
+        segments (int): сохранено контрольных точек
+        writer (Dict[str, Any]): состояние вывода (смещение JSONL или номер части Parquet)
+    """
+    path: Path
+    run_id: str
+    source: str
+    output: str
+    format: str
+    batch_size: int
+    chunk_size: int
+    checkpoint_every: int
+    processed: int = 0
+    last_path: Optional[str] = None
+    classified: int = 0
+    failed: int = 0
+    segments: int = 0
+    writer: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Checkpoint"]:
+        path = Path(path)
+        if not path.exists():
+            return None
+        return cls(path=path, **json.loads(path.read_text()))
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = asdict(self)
+        data.pop("path")
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class EventSink:
+    """
+    Запись вызовов модели в таблицу событий пачкой на контрольную точку.
+
+    С ценой события вставляются в той же транзакции, что и списание
+    price * число изображений с ключом batch:<run_id>:<номер точки>:
+    пачка, уже записанная до прерывания, при повторе пропускается.
+    Без цены события пишутся bulk_insert_events, и последняя пачка после
+    падения между commit и сохранением контрольной точки запишется дважды.
+
+    Attributes:
+        user_id (int): пользователь, от имени которого идут вызовы
+        price (Optional[Decimal]): цена одного прогноза
+    """
+
+    def __init__(self, user_id: int, price: Optional[Decimal] = None):
+        from database.database import get_database_engine
+
+        self.user_id = user_id
+        self.price = price
+        self.engine = get_database_engine()
+
+    def write(self, run_id: str, segment: int, records: List[Record]) -> None:
+        from sqlalchemy import insert
+        from sqlmodel import Session
+
+        from models.event import MODEL_CALL_TITLE, Event, utc_now
+        from services.crud.bulk import bulk_insert_events
+        from services.crud.wallet import charge, get_transaction_by_key
+
+        rows = [{"title": MODEL_CALL_TITLE, "image": record["path"],
+                 "creator_id": self.user_id, "result": record["output"],
+                 "model_version": record["model_version"],
+                 "amount": self.price or Decimal("0.00"),
+                 "created_at": utc_now()}
+                for record in records if record["error"] is None]
+        if not rows:
+            return
+        with Session(self.engine) as session:
+            if self.price is None:
+                bulk_insert_events(rows, session)
+                return
+            key = f"batch:{run_id}:{segment}"
+            if get_transaction_by_key(key, session) is not None:
+                logger.info("Segment %d of run %s is already billed, skipping", segment, run_id)
+                return
+            session.execute(insert(Event), rows)
+            # charge коммитит события вместе со списанием или откатывает всё
+            charge(self.user_id, self.price * len(rows), session, idempotency_key=key)
+
+
+@dataclass
+class BatchReport:
+    """
+    Итог запуска.
+
+    Attributes:
+        processed (int): обработано путей (всего, с учётом прошлых запусков)
+        classified (int): классифицировано изображений
+        failed (int): не удалось прочитать
+        seconds (float): время этого запуска
+        images_per_sec (float): скорость этого запуска
+    """
+    processed: int = 0
+    classified: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    images_per_sec: float = 0.0
+
+    def __str__(self) -> str:
+        return (f"Processed {self.processed} images ({self.classified} classified, "
+                f"{self.failed} failed), {self.seconds:.2f}s ({self.images_per_sec:.0f} images/sec)")
+
+
+def _resume(checkpoint: Checkpoint, paths: Iterator[str]) -> Iterator[str]:
+    """Пропускает обработанные пути и проверяет, что источник не изменился"""
+    skipped = None
+    for skipped in islice(paths, checkpoint.processed):
+        pass
+    if skipped != checkpoint.last_path:
+        raise ValueError(f"Source {checkpoint.source} changed since the checkpoint: "
+                         f"expected {checkpoint.last_path!r} at position "
+                         f"{checkpoint.processed}, found {skipped!r}")
+    return paths
+
+
+def classify(source: Path, output: Path, checkpoint_path: Path, model_path: Path,
+             file_format: str = "jsonl", batch_size: int = DEFAULT_BATCH_SIZE,
+             chunk_size: int = DEFAULT_CHUNK_SIZE,
+             checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+             workers: Optional[int] = None, backend=None,
+             sink: Optional[EventSink] = None) -> BatchReport:
+    """
+    Классифицирует изображения источника, продолжая с контрольной точки, если она есть.
+
+    Порядок на контрольной точке: сброс вывода на диск, запись событий
+    и списание, сохранение точки. Прерывание между шагами приводит к
+    повтору пачки: вывод обрезается до точки, списание не повторяется.
+    """
+    from models.model import Model
+    from services.ml.backends import available_cores
+
+    checkpoint = Checkpoint.load(checkpoint_path)
+    if checkpoint is None:
+        checkpoint = Checkpoint(Path(checkpoint_path), uuid.uuid4().hex, str(source),
+                                str(output), file_format, batch_size, chunk_size, checkpoint_every)
+    else:
+        # Границы пачек должны совпасть с прерванным запуском - от них зависят ключи списаний
+        expected = (str(source), str(output), file_format, batch_size, chunk_size,
+                    checkpoint_every)
+        found = (checkpoint.source, checkpoint.output, checkpoint.format,
+                 checkpoint.batch_size, checkpoint.chunk_size, checkpoint.checkpoint_every)
+        if expected != found:
+            raise ValueError(f"Checkpoint {checkpoint_path} belongs to another run: {found}")
+        logger.info("Resuming run %s after %d images", checkpoint.run_id, checkpoint.processed)
+
+    model = Model(model_path, backend)
+    if not model.is_loaded:
+        raise RuntimeError(f"Model is not loaded: {model_path}")
+    writer = WRITERS[file_format](output, checkpoint.writer)
+    workers = workers or available_cores()
+    report = BatchReport()
+    started = time.perf_counter()
+    processed = 0
+    segment: List[Record] = []
+
+    def save() -> None:
+        checkpoint.writer = writer.flush()
+        if sink is not None:
+            sink.write(checkpoint.run_id, checkpoint.segments, segment)
+        checkpoint.segments += 1
+        checkpoint.save()
+        segment.clear()
+
+    # forkserver: воркеры декодирования не наследуют потоки уже загруженного бэкенда
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None)
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            paths = _resume(checkpoint, iter_source(source))
+            chunks = decode_stream(pool, paths, model.input_size, chunk_size, window=2 * workers)
+            for batch_paths, pixels, errors in _batches(chunks, batch_size):
+                ok = [i for i, error in enumerate(errors) if error is None]
+                predictions = iter(model.predict_batch([pixels[i] for i in ok]))
+                records = []
+                for path, error in zip(batch_paths, errors):
+                    prediction = next(predictions) if error is None else {}
+                    records.append({"path": path, "output": prediction.get("output"),
+                                    "score": prediction.get("score"),
+                                    "model_version": prediction.get("model_version"),
+                                    "error": error})
+                writer.write(records)
+                if sink is not None:
+                    segment.extend(records)
+                processed += len(records)
+                checkpoint.processed += len(records)
+                checkpoint.last_path = batch_paths[-1]
+                checkpoint.classified += len(ok)
+                checkpoint.failed += len(records) - len(ok)
+                if checkpoint.processed // checkpoint_every \
+                        != (checkpoint.processed - len(records)) // checkpoint_every:
+                    save()
+            if checkpoint.processed % checkpoint_every:
+                save()
+    finally:
+        writer.close()
+
+    report.processed, report.classified, report.failed = (
+        checkpoint.processed, checkpoint.classified, checkpoint.failed)
+    report.seconds = time.perf_counter() - started
+    report.images_per_sec = processed / report.seconds if report.seconds else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    from database.config import get_settings
+    from services.ml.backends import BACKENDS, BackendOptions
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", type=Path, help="каталог изображений или манифест")
+    parser.add_argument("--out", type=Path, required=True,
+                        help="файл .jsonl или каталог Parquet-частей")
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help="файл контрольной точки (по умолчанию <out>.ckpt.json)")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--model", type=Path, default=Path(settings.MODEL_PATH))
+    parser.add_argument("--backend", choices=BACKENDS, default=settings.MODEL_BACKEND)
+    parser.add_argument("--threads", type=int, default=settings.INFERENCE_INTRA_OP_THREADS,
+                        help="потоков прямого прохода")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="процессов декодирования (по умолчанию - число ядер)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="изображений в одной задаче декодирования")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY)
+    parser.add_argument("--user-id", type=int, default=None,
+                        help="писать вызовы модели в события этого пользователя")
+    parser.add_argument("--price", type=Decimal, default=None,
+                        help="списывать цену за каждый прогноз (нужен --user-id)")
+    args = parser.parse_args()
+    if args.price is not None and args.user_id is None:
+        parser.error("--price requires --user-id")
+
+    logging.basicConfig(level=logging.INFO)
+    options = BackendOptions(args.backend, intra_op_threads=args.threads,
+                             min_agreement=settings.INT8_MIN_AGREEMENT)
+    print(classify(
+        args.source, args.out, args.checkpoint or Path(f"{args.out}.ckpt.json"), args.model,
+        file_format=args.format, batch_size=args.batch_size, chunk_size=args.chunk_size,
+        checkpoint_every=args.checkpoint_every, workers=args.workers, backend=options,
+        sink=EventSink(args.user_id, args.price) if args.user_id is not None else None,
+    ))
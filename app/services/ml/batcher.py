@@ -0,0 +1,166 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Tuple
+
+from models.model import ImageInput, Model
+from services.ml.scheduler import DeadlineExceeded, FairScheduler
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Собирает одиночные запросы к модели в батчи.
+
+    Запросы копятся не дольше max_latency_ms (или до max_batch_size штук)
+    и выполняются одним вызовом Model.predict_batch в фоновом потоке.
+    С планировщиком (FairScheduler) батч собирается не в порядке прихода,
+    а по справедливой очереди пользователей. Запрос может указать свою
+    модель (версию из A/B-разбиения), тогда батч делится по моделям.
+
+    Attributes:
+        model (Model): модель для прогноза
+        max_batch_size (int): максимальный размер батча
+        max_latency_ms (float): сколько ждать добора батча после первого запроса
+        scheduler (Optional[FairScheduler]): очередь с разделением между пользователями
+    """
+
+    def __init__(self, model: Model, max_batch_size: int = 32,
+                 max_latency_ms: float = 5.0, scheduler: Optional[FairScheduler] = None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be positive")
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.scheduler = scheduler
+        if scheduler is not None:
+            scheduler.on_expire = _expire
+        self._queue = scheduler if scheduler is not None else Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "MicroBatcher":
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="model-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Дорабатывает поставленные задания и останавливает поток"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                # Под блокировкой: submit не поставит задание после _STOP
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+            self._fail_pending()
+
+    def __enter__(self) -> "MicroBatcher":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def submit(self, input_data: ImageInput, flow: str = "", weight: float = 1.0,
+               deadline: Optional[float] = None, tier: str = "",
+               model: Optional[Model] = None) -> "Future[Dict]":
+        """
+        Ставит изображение в очередь, результат придёт во Future.
+
+        flow, weight, deadline и tier учитываются планировщиком (см. FairScheduler.put),
+        без него игнорируются. Планировщик может отклонить задание (AdmissionRejected).
+        model - модель для этого запроса (по умолчанию self.model).
+        """
+        future: "Future[Dict]" = Future()
+        with self._lock:
+            if self._thread is None:
+                raise RuntimeError("MicroBatcher is not started")
+            if self.scheduler is not None:
+                self.scheduler.put((input_data, future, model), flow, weight, deadline, tier)
+            else:
+                self._queue.put((input_data, future, model))
+        return future
+
+    def predict(self, input_data: ImageInput, timeout: Optional[float] = None) -> Dict:
+        """Синхронный прогноз через общий батч"""
+        return self.submit(input_data).result(timeout)
+
+    def _collect(self, first: "Item") -> Tuple[List["Item"], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch, stopping = self._collect(item)
+            # Запросы к разным версиям модели (A/B) - отдельными прямыми проходами
+            groups: Dict[int, Tuple[Model, List[Tuple[ImageInput, Future]]]] = {}
+            for data, fut, model in batch:
+                if fut.set_running_or_notify_cancel():
+                    model = model or self.model
+                    groups.setdefault(id(model), (model, []))[1].append((data, fut))
+            if not groups:
+                continue
+            started = time.perf_counter()
+            for model, items in groups.values():
+                self._predict(model, items)
+            if self.scheduler is not None:
+                self.scheduler.observe(sum(len(items) for _, items in groups.values()),
+                                       time.perf_counter() - started)
+
+    def _fail_pending(self) -> None:
+        # Задания, оставшиеся в очереди после остановки, не должны висеть вечно
+        while True:
+            try:
+                item = self._queue.get(block=False)
+            except Empty:
+                return
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("MicroBatcher is stopped"))
+
+    def _predict(self, model: Model, batch: List[Tuple[ImageInput, Future]]) -> None:
+        try:
+            results = model.predict_batch([data for data, _ in batch])
+        except Exception:
+            # Одно битое изображение не должно ронять весь батч
+            self._run_one_by_one(model, batch)
+        else:
+            for (_, fut), result in zip(batch, results):
+                fut.set_result(result)
+
+    def _run_one_by_one(self, model: Model, batch: List[Tuple[ImageInput, Future]]) -> None:
+        for data, fut in batch:
+            try:
+                fut.set_result(model.predict(data))
+            except Exception as exc:
+                fut.set_exception(exc)
+
+
+# Элемент очереди: вход, Future результата и модель запроса (None - модель батчера)
+Item = Tuple[ImageInput, Future, Optional[Model]]
+
+
+def _expire(item: Item) -> None:
+    future = item[1]
+    if future.set_running_or_notify_cancel():
+        future.set_exception(DeadlineExceeded("Inference deadline exceeded in queue"))
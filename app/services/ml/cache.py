@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from models.model import ImageInput, Model
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1 << 20
+
+
+def image_digest(image: ImageInput) -> str:
+    """
+    Хеш содержимого изображения (sha256), а не пути к нему.
+
+    Для массива в хеш входят тип и форма: одни и те же байты как uint8
+    и как float32 или в другой форме - разные изображения. Хеш файла
+    совпадает с UploadStats.sha256 загрузки тех же байтов.
+    """
+    digest = hashlib.sha256()
+    if isinstance(image, np.ndarray):
+        digest.update(f"{image.dtype.str}{image.shape}".encode())
+        digest.update(memoryview(np.ascontiguousarray(image)).cast("B"))
+    else:
+        with open(image, "rb") as f:
+            while chunk := f.read(_CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(image: ImageInput, model_version: str) -> str:
+    return f"{model_version}-{image_digest(image)}"
+
+
+class PredictionCache:
+    """
+    Кеш прогнозов модели по хешу изображения и версии модели.
+
+    Просроченные записи на диске удаляются при чтении, а остальные -
+    фоновым потоком start(interval) или явным вызовом evict_expired.
+
+    Attributes:
+        max_entries (int): размер LRU-кеша в памяти
+        disk_dir (Optional[Path]): каталог дискового уровня кеша
+        ttl (Optional[float]): время жизни записи на диске, секунды
+    """
+
+    def __init__(self, max_entries: int = 4096, disk_dir: Optional[str] = None,
+                 ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._stop = threading.Event()
+        self._evictor: Optional[threading.Thread] = None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def start(self, interval: float = 600.0) -> "PredictionCache":
+        """Запускает периодическое удаление просроченных записей с диска (если есть TTL)"""
+        if self.disk_dir is not None and self.ttl is not None and self._evictor is None:
+            self._stop.clear()
+            self._evictor = threading.Thread(target=self._evict_loop, args=(interval,),
+                                             name="prediction-cache-evictor", daemon=True)
+            self._evictor.start()
+        return self
+
+    def stop(self) -> None:
+        if self._evictor is not None:
+            self._stop.set()
+            self._evictor.join()
+            self._evictor = None
+
+    def _evict_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.evict_expired()
+            except Exception:
+                logger.exception("Prediction cache eviction failed")
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[-2:] / f"{key}.json"
+
+    def _is_expired(self, path: Path, now: float) -> bool:
+        return self.ttl is not None and now - path.stat().st_mtime > self.ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+        value = self._get_from_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_to_memory(key, value)
+        return value
+
+    def _get_from_disk(self, key: str) -> Optional[Dict]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            if self._is_expired(path, time.time()):
+                path.unlink(missing_ok=True)
+                return None
+            return json.loads(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._put_to_memory(key, value)
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(value))
+            os.replace(tmp, path)
+
+    def _put_to_memory(self, key: str, value: Dict) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def evict_expired(self) -> int:
+        """Удаляет просроченные записи дискового уровня, возвращает их число"""
+        if self.disk_dir is None or self.ttl is None:
+            return 0
+        removed = 0
+        now = time.time()
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                if self._is_expired(path, now):
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._memory),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+class CachedModel:
+    """
+    Обёртка над Model: повторные загрузки того же изображения
+    отвечаются из кеша без запуска модели.
+    """
+
+    def __init__(self, model: Model, cache: PredictionCache):
+        self.model = model
+        self.cache = cache
+
+    @property
+    def version(self) -> str:
+        return self.model.version
+
+    def predict_batch(self, images: Sequence[ImageInput]) -> List[Dict]:
+        keys = [cache_key(image, self.model.version) for image in images]
+        results: List[Optional[Dict]] = [self.cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            predictions = self.model.predict_batch([images[i] for i in missing])
+            for i, prediction in zip(missing, predictions):
+                self.cache.put(keys[i], {k: v for k, v in prediction.items() if k != "input"})
+                results[i] = prediction
+        return [
+            {**result, "input": image if isinstance(image, (str, Path)) else None}
+            for image, result in zip(images, results)
+        ]
+
+    def predict(self, input_data: ImageInput) -> Dict:
+        return self.predict_batch([input_data])[0]
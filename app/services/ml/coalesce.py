@@ -0,0 +1,50 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from services.metrics import COALESCED_REQUESTS
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых запросов в полёте.
+
+    Пока первый запрос с данным ключом выполняется, остальные с тем же
+    ключом не запускают работу заново, а ждут его результат (или его
+    исключение). После завершения ключ освобождается - это не кеш.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Возвращает (результат, shared), shared - результат получен от другого запроса"""
+        future = self._inflight.get(key)
+        if future is not None:
+            COALESCED_REQUESTS.inc()
+            try:
+                # shield: отмена ожидающего клиента не отменяет работу ведущего
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # Ведущий запрос отменён (клиент отключился) - выполняем сами
+            return await self.do(key, fn)
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим, само future никто может не прочитать
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import mmap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from services.metrics import PREPROCESS_DECODE_BYTES, PREPROCESS_SECONDS
+
+_SCALE = np.float32(1 / 255)
+# Байт на пиксель в памяти Pillow: RGB и прочие многоканальные режимы хранятся по 4 байта
+_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "I;16L": 2, "I;16N": 2}
+
+
+class UploadTooLargeError(ValueError):
+    """Тело запроса больше допустимого размера"""
+
+
+class ImageTooLargeError(UploadTooLargeError):
+    """Изображение больше лимита пикселей (защита от decompression bomb)"""
+
+
+@dataclass
+class UploadStats:
+    """
+    Статистика обработки одной загрузки.
+
+    Attributes:
+        size (int): размер тела запроса, байт
+        sha256 (str): хеш тела запроса
+        on_disk (bool): тело было выгружено на диск
+        decode_ms (float): время декодирования и ресайза
+        decode_bytes (int): пик памяти буферов Pillow при декодировании, байт
+    """
+    size: int = 0
+    sha256: str = ""
+    on_disk: bool = False
+    decode_ms: float = 0.0
+    decode_bytes: int = 0
+
+
+def _image_bytes(image: Image.Image) -> int:
+    return image.width * image.height * _PIXEL_BYTES.get(image.mode, 4)
+
+
+async def spool_upload(chunks: AsyncIterator[bytes], max_memory: int,
+                       max_size: int) -> Tuple[SpooledTemporaryFile, UploadStats]:
+    """
+    Пишет поток тела запроса в SpooledTemporaryFile.
+
+    Первые max_memory байт держатся в памяти, дальше файл уходит на диск,
+    так что тело целиком в RAM не собирается. Хеш тела считается по ходу.
+    """
+    spool = SpooledTemporaryFile(max_size=max_memory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+            spool.write(chunk)
+            digest.update(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    # SpooledTemporaryFile уходит на диск, как только в нём больше max_memory байт
+    return spool, UploadStats(size=size, sha256=digest.hexdigest(), on_disk=size > max_memory)
+
+
+def decode_image(spool: SpooledTemporaryFile, size: Tuple[int, int],
+                 out: Optional[np.ndarray] = None, on_disk: bool = False,
+                 max_pixels: Optional[int] = None,
+                 stats: Optional[UploadStats] = None) -> np.ndarray:
+    """
+    Декодирует изображение в тензор float32 (высота, ширина, 3) в [0, 1].
+
+    Тело на диске (on_disk) читается через mmap, тело в памяти - через
+    файловый интерфейс самого SpooledTemporaryFile. Для JPEG включается
+    draft-режим (масштабирование при декодировании), нормализация пишется
+    сразу в out. Изображение, у которого после draft больше max_pixels
+    пикселей, отклоняется по заголовку, до декодирования, -
+    ImageTooLargeError (как и превышение лимита самого Pillow).
+
+    Пик памяти буферов Pillow - декодированное изображение плюс его
+    RGB-копия, если исходный режим другой: не больше 8 байт на пиксель.
+    Он пишется в stats.decode_bytes и в гистограмму
+    preprocess_decode_bytes.
+    """
+    started = time.perf_counter()
+    height, width = size
+    source = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) if on_disk else spool
+    try:
+        source.seek(0)
+        with Image.open(source) as image:
+            image.draft("RGB", (width, height))
+            if max_pixels is not None and image.width * image.height > max_pixels:
+                raise ImageTooLargeError(
+                    f"Image has {image.width * image.height} pixels, limit is {max_pixels}")
+            decode_bytes = _image_bytes(image)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+                decode_bytes += _image_bytes(image)
+            if image.size != (width, height):
+                image = image.resize((width, height))
+            pixels = np.asarray(image)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    finally:
+        if isinstance(source, mmap.mmap):
+            source.close()
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.float32)
+    np.multiply(pixels, _SCALE, out=out, casting="unsafe")
+    PREPROCESS_SECONDS.observe(time.perf_counter() - started)
+    PREPROCESS_DECODE_BYTES.observe(decode_bytes)
+    if stats is not None:
+        stats.decode_bytes = decode_bytes
+    return out
+
+
+class Preprocessor:
+    """
+    Предобработка загрузок в пуле потоков.
+
+    Декодирование JPEG отпускает GIL, поэтому выполняется в потоках и не
+    блокирует event loop. Пиковая память ограничена так:
+
+    - тела: семафор держит не больше max_in_flight загрузок, у каждой в
+      памяти не больше max_memory байт (остальное на диске);
+    - декодирование: одновременно идёт не больше workers декодирований,
+      каждое - не больше max_pixels пикселей по 8 байт (см. decode_image);
+    - тензоры: по одному float32 входа модели на загрузку;
+    - тело на диске читается через mmap: его страницы файловые и
+      вытесняемые, но на время декодирования входят в RSS.
+
+    Итого не больше max_in_flight * (max_memory + тензор) +
+    workers * 8 * max_pixels байт; фактический пик декодирования каждой
+    загрузки - UploadStats.decode_bytes и гистограмма preprocess_decode_bytes.
+
+    Attributes:
+        input_size (Tuple[int, int]): размер входа модели (высота, ширина)
+        max_memory (int): сколько байт тела держать в памяти до выгрузки на диск
+        max_size (int): максимальный размер загрузки
+        max_pixels (int): максимальное число пикселей изображения (после draft для JPEG)
+    """
+
+    def __init__(self, input_size: Tuple[int, int], workers: int = 4,
+                 max_in_flight: int = 32, max_memory: int = 1 << 20,
+                 max_size: int = 20 << 20, max_pixels: int = 4096 * 4096):
+        self.input_size = input_size
+        self.max_memory = max_memory
+        self.max_size = max_size
+        self.max_pixels = max_pixels
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="preprocess")
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    @asynccontextmanager
+    async def upload(self, chunks: AsyncIterator[bytes]
+                     ) -> AsyncIterator[Tuple[SpooledTemporaryFile, UploadStats]]:
+        """Принимает тело запроса; слот и временный файл держатся до выхода из блока"""
+        async with self._slots:
+            spool, stats = await spool_upload(chunks, self.max_memory, self.max_size)
+            try:
+                yield spool, stats
+            finally:
+                spool.close()
+
+    async def decode(self, spool: SpooledTemporaryFile, stats: UploadStats) -> np.ndarray:
+        started = time.perf_counter()
+        tensor = await asyncio.get_running_loop().run_in_executor(
+            self._executor, decode_image, spool, self.input_size, None, stats.on_disk,
+            self.max_pixels, stats)
+        stats.decode_ms = (time.perf_counter() - started) * 1000
+        return tensor
+
+    async def process(self, chunks: AsyncIterator[bytes]) -> Tuple[np.ndarray, UploadStats]:
+        async with self.upload(chunks) as (spool, stats):
+            tensor = await self.decode(spool, stats)
+        return tensor, stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models.model import ImageInput, Model, release_if_changed, release_weights
+from services.ml.backends import BackendOptions
+
+ModelKey = Tuple[str, str]
+
+
+class ModelNotFoundError(KeyError):
+    """Модель или версия не зарегистрирована"""
+
+
+class ModelRegistry:
+    """
+    Реестр классификаторов с версиями.
+
+    Модели загружаются при первом обращении, в памяти держится не больше
+    max_models моделей и не больше max_bytes весов, лишние вытесняются
+    по LRU. Запросы, уже получившие модель, дорабатывают на ней даже
+    после переключения или вытеснения.
+
+    Attributes:
+        max_models (int): сколько моделей держать загруженными
+        max_bytes (Optional[int]): лимит суммарного объёма весов
+        backend (Optional[BackendOptions]): бэкенд прямого прохода для всех моделей
+    """
+
+    def __init__(self, max_models: int = 4, max_bytes: Optional[int] = None,
+                 backend: Optional[BackendOptions] = None):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._paths: Dict[ModelKey, Path] = {}
+        self._active: Dict[str, str] = {}
+        self._splits: Dict[str, List[Tuple[str, int]]] = {}
+        self._loaded: "OrderedDict[ModelKey, Model]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def register(self, name: str, version: str, path: str, activate: bool = False) -> None:
+        """Объявляет версию модели без загрузки весов"""
+        with self._lock:
+            self._paths[(name, version)] = Path(path).resolve()
+            if activate or name not in self._active:
+                self._active[name] = version
+
+    def publish(self, name: str, path: str, version: Optional[str] = None) -> Model:
+        """
+        Горячая замена: загружает новую версию и атомарно делает её активной.
+
+        Версия по умолчанию - хеш файла весов (Model.version).
+        """
+        # Файл по тому же пути мог быть перезаписан - тогда читаем его заново
+        release_if_changed(Path(path).resolve())
+        model = Model(path, self.backend)
+        if not model.is_loaded:
+            raise FileNotFoundError(f"Model weights not found: {path}")
+        version = version or model.version
+        with self._lock:
+            key = (name, version)
+            self._paths[key] = model.model_path
+            self._loaded[key] = model
+            self._loaded.move_to_end(key)
+            self._active[name] = version
+            self._splits.pop(name, None)
+            self._evict()
+        return model
+
+    def set_split(self, name: str, weights: Dict[str, int]) -> None:
+        """A/B-разбиение трафика между версиями, например {"v1": 90, "v2": 10}"""
+        with self._lock:
+            for version in weights:
+                if (name, version) not in self._paths:
+                    raise ModelNotFoundError(f"{name}:{version}")
+            self._splits[name] = [(v, w) for v, w in sorted(weights.items()) if w > 0]
+
+    def active_version(self, name: str) -> str:
+        try:
+            return self._active[name]
+        except KeyError:
+            raise ModelNotFoundError(name) from None
+
+    def versions(self, name: str) -> List[str]:
+        return sorted(v for n, v in self._paths if n == name)
+
+    def route(self, name: str, routing_key: Optional[str] = None) -> str:
+        """Выбирает версию: по A/B-разбиению (стабильно для routing_key) или активную"""
+        split = self._splits.get(name)
+        if not split or routing_key is None:
+            return self.active_version(name)
+        total = sum(weight for _, weight in split)
+        point = int.from_bytes(
+            hashlib.blake2b(f"{name}:{routing_key}".encode(), digest_size=8).digest(),
+            "big") % total
+        for version, weight in split:
+            if point < weight:
+                return version
+            point -= weight
+        return split[-1][0]
+
+    def get(self, name: str, version: Optional[str] = None,
+            routing_key: Optional[str] = None) -> Model:
+        """Возвращает модель, загружая её при первом обращении"""
+        with self._lock:
+            version = version or self.route(name, routing_key)
+            key = (name, version)
+            model = self._loaded.get(key)
+            if model is not None:
+                self._loaded.move_to_end(key)
+                return model
+            try:
+                path = self._paths[key]
+            except KeyError:
+                raise ModelNotFoundError(f"{name}:{version}") from None
+        # Загрузка весов идёт без блокировки реестра
+        model = Model(path, self.backend)
+        if not model.is_loaded:
+            raise FileNotFoundError(f"Model weights not found: {path}")
+        with self._lock:
+            model = self._loaded.setdefault(key, model)
+            self._loaded.move_to_end(key)
+            self._evict(keep=key)
+        return model
+
+    def _evict(self, keep: Optional[ModelKey] = None) -> None:
+        def over_limit() -> bool:
+            if len(self._loaded) > self.max_models:
+                return True
+            return (self.max_bytes is not None
+                    and sum(m.nbytes for m in self._loaded.values()) > self.max_bytes)
+
+        for key in list(self._loaded):
+            if not over_limit():
+                break
+            if key == keep or key[1] == self._active.get(key[0]):
+                continue
+            model = self._loaded.pop(key)
+            release_weights(model.model_path)
+
+    @property
+    def loaded(self) -> List[ModelKey]:
+        return list(self._loaded)
+
+    def handle(self, name: str) -> "RoutedModel":
+        return RoutedModel(self, name)
+
+    def load_manifest(self, path: str) -> None:
+        """
+        Регистрирует модели из JSON-манифеста:
+        {"fast": {"versions": {"v1": "fast_v1.npz"}, "active": "v1", "split": {"v1": 100}}}
+        """
+        base = Path(path).resolve().parent
+        manifest = json.loads(Path(path).read_text())
+        for name, spec in manifest.items():
+            for version, weights_path in spec["versions"].items():
+                self.register(name, version, str(base / weights_path),
+                              activate=version == spec.get("active"))
+            if spec.get("split"):
+                self.set_split(name, spec["split"])
+
+
+class RoutedModel:
+    """
+    Ссылка на модель по имени: каждый вызов берёт текущую активную версию,
+    поэтому MicroBatcher и воркеры подхватывают горячую замену сами.
+    """
+
+    def __init__(self, registry: ModelRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    @property
+    def current(self) -> Model:
+        return self.registry.get(self.name)
+
+    @property
+    def version(self) -> str:
+        return self.registry.active_version(self.name)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.current.is_loaded
+
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        return self.current.input_size
+
+    def resolve(self, routing_key: Optional[str] = None) -> Model:
+        """Модель для ключа маршрутизации (пользователя) с учётом A/B-разбиения"""
+        return self.registry.get(self.name, routing_key=routing_key)
+
+    def predict_batch(self, images: Sequence[ImageInput]) -> List[Dict]:
+        return self.current.predict_batch(images)
+
+    def predict(self, input_data: ImageInput) -> Dict:
+        return self.current.predict(input_data)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from database.config import Settings
+from services.ml.coalesce import SingleFlight
+from services.startup import StartupTimer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "default"
+
+
+class MLRuntime:
+    """
+    Отложенная инициализация ML-части приложения.
+
+    NumPy, Pillow и веса модели импортируются и загружаются не при старте
+    процесса, а в фоновой задаче прогрева (MODEL_LOADING=background) или
+    при первом запросе (MODEL_LOADING=lazy). Тяжёлая работа идёт в потоке,
+    чтобы event loop продолжал отвечать на /health.
+
+    Неудачная загрузка повторяется с экспоненциальной паузой (от
+    MODEL_RETRY_INTERVAL до MODEL_RETRY_MAX_INTERVAL): фоновой задачей,
+    пока модель не загрузится, а при lazy - очередным запросом, но не
+    раньше конца паузы.
+
+    Attributes:
+        ready (bool): модель загружена и прогрета
+        error (Optional[str]): ошибка инициализации, если она была
+        coalescer (SingleFlight): склейка одинаковых запросов к модели
+        cache (Optional[PredictionCache]): кеш прогнозов по версии модели и хешу загрузки
+    """
+
+    def __init__(self, settings: Settings, timer: StartupTimer):
+        self.settings = settings
+        self.timer = timer
+        self.registry = None
+        self.model = None
+        self.batcher = None
+        self.preprocessor = None
+        self.cache = None
+        self.ready = False
+        self.error: Optional[str] = None
+        self.coalescer = SingleFlight()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def start_background(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._load_until_ready())
+
+    async def _load_until_ready(self) -> None:
+        while not await self.ensure_loaded():
+            await asyncio.sleep(max(0.0, self._retry_at - time.monotonic()))
+
+    async def ensure_loaded(self) -> bool:
+        if self.ready:
+            return True
+        async with self._lock:
+            if not self.ready and time.monotonic() >= self._retry_at:
+                try:
+                    await asyncio.to_thread(self._load)
+                except Exception as e:
+                    self.error = str(e)
+                    delay = min(self.settings.MODEL_RETRY_INTERVAL * 2 ** self._failures,
+                                self.settings.MODEL_RETRY_MAX_INTERVAL)
+                    self._failures += 1
+                    self._retry_at = time.monotonic() + delay
+                    logger.exception("ML warm-up failed, retrying in %.1fs", delay)
+        return self.ready
+
+    def _load(self) -> None:
+        settings = self.settings
+        with self.timer.phase("import_ml"):
+            import numpy as np
+
+            from services.ml.backends import BackendOptions
+            from services.ml.batcher import MicroBatcher
+            from services.ml.cache import PredictionCache
+            from services.ml.preprocessing import Preprocessor
+            from services.ml.registry import ModelRegistry
+            from services.ml.scheduler import FairScheduler
+
+        with self.timer.phase("load_model"):
+            registry = ModelRegistry(max_models=settings.MODEL_REGISTRY_MAX_MODELS,
+                                     max_bytes=settings.MODEL_REGISTRY_MAX_BYTES,
+                                     backend=BackendOptions.from_settings(settings))
+            if settings.MODEL_MANIFEST:
+                registry.load_manifest(settings.MODEL_MANIFEST)
+            registry.publish(DEFAULT_MODEL, settings.MODEL_PATH)
+            model = registry.handle(DEFAULT_MODEL)
+
+        with self.timer.phase("warmup_inference"):
+            height, width = model.input_size
+            started = time.perf_counter()
+            model.predict(np.zeros((height, width, 3), dtype=np.float32))
+            warmup_seconds = time.perf_counter() - started
+
+        self.registry = registry
+        self.model = model
+        self.preprocessor = Preprocessor(
+            model.input_size,
+            workers=settings.PREPROCESS_WORKERS,
+            max_in_flight=settings.UPLOAD_MAX_IN_FLIGHT,
+            max_memory=settings.UPLOAD_MEMORY_BYTES,
+            max_size=settings.UPLOAD_MAX_BYTES,
+            max_pixels=settings.UPLOAD_MAX_PIXELS,
+        )
+        scheduler = FairScheduler(slo=settings.INFERENCE_QUEUE_SLO,
+                                  timeout=settings.INFERENCE_QUEUE_TIMEOUT,
+                                  max_queued=settings.INFERENCE_MAX_QUEUED)
+        # Первая оценка времени прогноза для допуска, дальше её уточняет батчер
+        scheduler.observe(1, warmup_seconds)
+        self.batcher = MicroBatcher(model, scheduler=scheduler).start()
+        if settings.PREDICTION_CACHE_ENTRIES > 0:
+            self.cache = PredictionCache(
+                settings.PREDICTION_CACHE_ENTRIES, disk_dir=settings.PREDICTION_CACHE_DIR,
+                ttl=settings.PREDICTION_CACHE_TTL,
+            ).start(settings.PREDICTION_CACHE_EVICT_INTERVAL)
+        self.error = None
+        self.ready = True
+        self.timer.record("ready", self.timer.uptime)
+
+    async def cached(self, key: str) -> Optional[Dict]:
+        """Прогноз из кеша; дисковый уровень читается вне event loop"""
+        if self.cache is None:
+            return None
+        if self.cache.disk_dir is None:
+            return self.cache.get(key)
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def remember(self, key: str, prediction: Dict) -> None:
+        if self.cache is None:
+            return
+        value = {k: v for k, v in prediction.items() if k != "input"}
+        if self.cache.disk_dir is None:
+            self.cache.put(key, value)
+        else:
+            await asyncio.to_thread(self.cache.put, key, value)
+
+    async def shutdown(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        if self.batcher is not None:
+            self.batcher.stop()
+        if self.preprocessor is not None:
+            self.preprocessor.shutdown()
+        if self.cache is not None:
+            self.cache.stop()
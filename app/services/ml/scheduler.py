@@ -0,0 +1,281 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from queue import Empty
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from services.metrics import (INFERENCE_QUEUE_DEPTH, INFERENCE_QUEUE_WAIT_SECONDS,
+                              INFERENCE_REJECTED)
+
+# Вес сглаживания оценки времени обработки одного задания
+_EWMA_ALPHA = 0.2
+# Как часто чистить опустевшие потоки, выдач
+_PURGE_EVERY = 1024
+
+
+class AdmissionRejected(RuntimeError):
+    """Задание не принято: ожидание в очереди превысило бы SLO"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Inference queue is overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(RuntimeError):
+    """Задание не дождалось модели до своего дедлайна"""
+
+
+class _Ticket:
+    __slots__ = ("item", "flow", "tier", "cost", "deadline", "enqueued", "seq", "done")
+
+    def __init__(self, item: Any, flow: "_Flow", tier: str, cost: float,
+                 deadline: float, enqueued: float, seq: int):
+        self.item = item
+        self.flow = flow
+        self.tier = tier
+        self.cost = cost
+        self.deadline = deadline
+        self.enqueued = enqueued
+        self.seq = seq
+        self.done = False
+
+
+class _Flow:
+    __slots__ = ("key", "weight", "tag", "pending", "tickets")
+
+    def __init__(self, key: str, weight: float, tag: float):
+        self.key = key
+        self.weight = weight
+        # Виртуальное время, до которого поток уже обслужен
+        self.tag = tag
+        self.pending = 0
+        self.tickets: List[Tuple[float, int, _Ticket]] = []
+
+
+class FairScheduler:
+    """
+    Очередь заданий модели со справедливым разделением между пользователями.
+
+    У каждого пользователя (flow) своя очередь и вес по уровню. Следующим
+    выдаётся задание потока с наименьшим виртуальным временем (взвешенная
+    справедливая очередь): поток с весом 2 получает вдвое больше обработки,
+    чем с весом 1, а пользователь, заваливший очередь, ждёт сам и не
+    задерживает остальных. Внутри потока задания идут по дедлайну. Задание,
+    у которого до дедлайна осталось меньше urgency, выдаётся вне очереди,
+    если его поток не получил больше своей доли; просроченное -
+    отбрасывается, не доходя до модели (on_expire).
+
+    Допуск: ожидание нового задания оценивается по очереди, доле его потока
+    и измеренному времени обработки. Если оно больше slo или дедлайна,
+    задание отклоняется сразу (AdmissionRejected), а не после ожидания.
+
+    Совместима с queue.Queue по put/get, поэтому подставляется в MicroBatcher.
+    put без flow ставит служебное задание (например, сигнал остановки):
+    оно выдаётся, только когда заданий пользователей в очереди нет.
+
+    Attributes:
+        slo (float): целевое максимальное ожидание в очереди, секунды
+        timeout (Optional[float]): дедлайн по умолчанию от постановки в очередь, секунды
+        max_queued (int): жёсткий предел числа заданий в очереди
+        urgency (float): запас до дедлайна, при котором задание выдаётся первым, секунды
+        service_time (float): текущая оценка времени обработки одного задания, секунды
+    """
+
+    def __init__(self, slo: float = 1.0, timeout: Optional[float] = 5.0,
+                 max_queued: int = 1024, urgency: float = 0.05,
+                 service_time: float = 0.0,
+                 on_expire: Optional[Callable[[Any], None]] = None):
+        self.slo = slo
+        self.timeout = timeout
+        self.max_queued = max_queued
+        self.urgency = urgency
+        self.service_time = service_time
+        self.on_expire = on_expire
+        self._flows: Dict[str, _Flow] = {}
+        self._ready: List[Tuple[float, int, _Flow]] = []
+        self._deadlines: List[Tuple[float, int, _Ticket]] = []
+        self._control: Deque[Any] = deque()
+        self._vtime = 0.0
+        self._active_weight = 0.0
+        self._queued = 0
+        self._dispatched = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return self._queued
+
+    def estimate_wait(self, flow: str, weight: float = 1.0) -> float:
+        """Ожидаемое ожидание нового задания потока, секунды"""
+        with self._cond:
+            return self._estimate_wait(self._flows.get(flow), weight)
+
+    def _estimate_wait(self, flow: Optional[_Flow], weight: float) -> float:
+        ahead = flow.pending if flow is not None else 0
+        active_weight = self._active_weight + (0.0 if ahead else weight)
+        # Поток получает долю weight / active_weight обработки, но ждать
+        # дольше, чем разбирается вся очередь, ему не придётся
+        units = min(self._queued, (ahead + 1) * active_weight / weight)
+        return units * self.service_time
+
+    def _admit(self, flow: Optional[_Flow], weight: float, deadline: float,
+               now: float, tier: str) -> None:
+        if self._queued >= self.max_queued:
+            reason, wait, limit = "queue_full", self._estimate_wait(flow, weight), 0.0
+        else:
+            wait = self._estimate_wait(flow, weight)
+            limit = min(self.slo, deadline - now)
+            reason = "slo" if limit == self.slo else "deadline"
+            if wait <= limit:
+                return
+        INFERENCE_REJECTED.inc(reason=reason, tier=tier)
+        raise AdmissionRejected(reason, max(wait - limit, self.service_time))
+
+    def check(self, flow: str, weight: float = 1.0, deadline: Optional[float] = None,
+              tier: str = "") -> None:
+        """Проверка допуска до подготовки задания (например, до чтения загрузки)"""
+        now = time.monotonic()
+        with self._cond:
+            self._admit(self._flows.get(flow), weight, self._deadline(deadline, now), now, tier)
+
+    def _deadline(self, deadline: Optional[float], now: float) -> float:
+        if deadline is not None:
+            return deadline
+        return now + self.timeout if self.timeout is not None else float("inf")
+
+    def put(self, item: Any, flow: Optional[str] = None, weight: float = 1.0,
+            deadline: Optional[float] = None, tier: str = "", cost: float = 1.0) -> None:
+        """
+        Ставит задание в очередь потока flow.
+
+        deadline - момент по time.monotonic(), после которого результат не
+        нужен; по умолчанию через timeout секунд.
+        """
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        now = time.monotonic()
+        with self._cond:
+            if flow is None:
+                self._control.append(item)
+                self._cond.notify()
+                return
+            state = self._flows.get(flow)
+            deadline = self._deadline(deadline, now)
+            self._admit(state, weight, deadline, now, tier)
+            if state is None:
+                state = self._flows[flow] = _Flow(flow, weight, self._vtime)
+            if not state.pending:
+                # Простаивавший поток не копит кредит: начинает с текущего времени
+                state.tag = max(state.tag, self._vtime)
+                self._active_weight += weight
+                heapq.heappush(self._ready, (state.tag, next(self._seq), state))
+            elif state.weight != weight:
+                self._active_weight += weight - state.weight
+            state.weight = weight
+            ticket = _Ticket(item, state, tier, cost, deadline, now, next(self._seq))
+            heapq.heappush(state.tickets, (deadline, ticket.seq, ticket))
+            if deadline != float("inf"):
+                heapq.heappush(self._deadlines, (deadline, ticket.seq, ticket))
+            state.pending += 1
+            self._queued += 1
+            INFERENCE_QUEUE_DEPTH.set(self._queued)
+            self._cond.notify()
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        """Следующее задание; queue.Empty, если за timeout ничего не появилось"""
+        expired: List[_Ticket] = []
+        try:
+            with self._cond:
+                end = None if timeout is None else time.monotonic() + timeout
+                while True:
+                    ticket = self._next(expired)
+                    if ticket is not None:
+                        return ticket.item
+                    if self._control:
+                        return self._control.popleft()
+                    remaining = None if end is None else end - time.monotonic()
+                    if not block or (remaining is not None and remaining <= 0):
+                        raise Empty
+                    self._cond.wait(remaining)
+        finally:
+            # Колбэки - вне блокировки, они могут ставить новые задания
+            for ticket in expired:
+                if self.on_expire is not None:
+                    self.on_expire(ticket.item)
+
+    def _next(self, expired: List[_Ticket]) -> Optional[_Ticket]:
+        now = time.monotonic()
+        while self._deadlines:
+            deadline, _, ticket = self._deadlines[0]
+            if ticket.done:
+                heapq.heappop(self._deadlines)
+            elif deadline < now:
+                heapq.heappop(self._deadlines)
+                self._take(ticket)
+                INFERENCE_REJECTED.inc(reason="expired", tier=ticket.tier)
+                expired.append(ticket)
+            elif deadline - now <= self.urgency and ticket.flow.tag <= self._vtime:
+                # Срочное задание - вне очереди, но в счёт доли своего потока
+                # и только если поток не обогнал остальных
+                heapq.heappop(self._deadlines)
+                return self._dispatch(ticket, now)
+            else:
+                break
+        while self._ready:
+            tag, _, flow = heapq.heappop(self._ready)
+            if not flow.pending or tag != flow.tag:
+                continue
+            while flow.tickets[0][2].done:
+                heapq.heappop(flow.tickets)
+            return self._dispatch(flow.tickets[0][2], now)
+        return None
+
+    def _take(self, ticket: _Ticket) -> None:
+        ticket.done = True
+        flow = ticket.flow
+        flow.pending -= 1
+        self._queued -= 1
+        INFERENCE_QUEUE_DEPTH.set(self._queued)
+        if not flow.pending:
+            self._active_weight -= flow.weight
+            flow.tickets.clear()
+
+    def _dispatch(self, ticket: _Ticket, now: float) -> _Ticket:
+        flow = ticket.flow
+        self._vtime = max(self._vtime, flow.tag)
+        flow.tag += ticket.cost / flow.weight
+        self._take(ticket)
+        if flow.pending:
+            heapq.heappush(self._ready, (flow.tag, next(self._seq), flow))
+        INFERENCE_QUEUE_WAIT_SECONDS.observe(now - ticket.enqueued, tier=ticket.tier)
+        self._dispatched += 1
+        if self._dispatched % _PURGE_EVERY == 0:
+            self._purge()
+        return ticket
+
+    def _purge(self) -> None:
+        # Простаивающий поток, не опережающий виртуальное время, ничем не
+        # отличается от нового - его состояние можно забыть
+        for key in [key for key, flow in self._flows.items()
+                    if not flow.pending and flow.tag <= self._vtime]:
+            del self._flows[key]
+
+    def observe(self, items: int, seconds: float) -> None:
+        """Сообщает время обработки пачки из items заданий"""
+        if items <= 0:
+            return
+        per_item = seconds / items
+        with self._cond:
+            self.service_time = (per_item if not self.service_time else
+                                 (1 - _EWMA_ALPHA) * self.service_time + _EWMA_ALPHA * per_item)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queued": self._queued,
+            "flows": sum(1 for flow in self._flows.values() if flow.pending),
+            "service_time": self.service_time,
+        }
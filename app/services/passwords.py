@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+# Сами функции хеширования - в models.passwords (их использует модель User)
+from models.passwords import (hash_password, is_legacy_hash, needs_rehash,  # noqa: F401
+                              verify_password)
+
+
+class PasswordHasher:
+    """
+    Хеширование паролей в пуле процессов.
+
+    KDF намеренно дорогой, поэтому в event loop и в потоках запросов он
+    не выполняется: процессы не держат GIL и не сериализуют входы
+    нескольких пользователей.
+
+    Attributes:
+        workers (Optional[int]): размер пула (по умолчанию - число CPU)
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return self._pool
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool, hash_password, password)
+
+    async def verify(self, password: str, stored: str) -> bool:
+        if is_legacy_hash(stored):
+            return verify_password(password, stored)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool, verify_password, password, stored)
+
+    def hash_many(self, passwords: Sequence[str], chunksize: int = 16) -> List[str]:
+        """Хеши для массовой регистрации, в порядке паролей"""
+        return list(self.pool.map(hash_password, passwords, chunksize=chunksize))
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+@lru_cache()
+def get_password_hasher() -> PasswordHasher:
+    """Пул хеширования, один на процесс"""
+    from database.config import get_settings
+
+    return PasswordHasher(get_settings().PASSWORD_HASH_WORKERS)
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from services.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+BalanceLookup = Callable[[int], Optional[Decimal]]
+
+
+@dataclass(frozen=True)
+class Tier:
+    """
+    Уровень лимита, определяется балансом кошелька.
+
+    Attributes:
+        name (str): имя уровня
+        min_balance (Decimal): минимальный баланс для уровня
+        rate (float): запросов в секунду в среднем
+        burst (int): сколько запросов можно сделать подряд
+        weight (float): доля в очереди к модели относительно других уровней
+    """
+    name: str
+    min_balance: Decimal
+    rate: float
+    burst: int
+    weight: float = 1.0
+
+
+DEFAULT_TIERS = (
+    Tier("anonymous", Decimal("-Infinity"), rate=1.0, burst=5),
+    Tier("free", Decimal("0"), rate=2.0, burst=10),
+    Tier("basic", Decimal("10"), rate=10.0, burst=30, weight=2.0),
+    Tier("pro", Decimal("100"), rate=50.0, burst=100, weight=4.0),
+)
+
+
+class TokenBucket:
+    """Корзина токенов: пополняется со скоростью rate, вмещает не больше burst"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def acquire(self, now: float) -> float:
+        """Берёт токен; возвращает 0 или сколько секунд ждать до следующего"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class Decision:
+    """
+    Результат проверки лимита.
+
+    Attributes:
+        allowed (bool): запрос пропускается
+        tier (Tier): уровень пользователя
+        remaining (int): сколько запросов осталось без ожидания
+        retry_after (float): через сколько секунд повторить, если не пропущен
+    """
+    allowed: bool
+    tier: Tier
+    remaining: int
+    retry_after: float = 0.0
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"X-RateLimit-Limit": str(self.tier.burst),
+                   "X-RateLimit-Remaining": str(self.remaining)}
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, round(self.retry_after + 0.5)))
+        return headers
+
+
+class RateLimiter:
+    """
+    Лимит запросов к модели на пользователя (корзина токенов).
+
+    Уровень пользователя выбирается по балансу кошелька. Баланс читается
+    из БД не чаще раза в tier_ttl секунд на пользователя и вне event loop.
+    Запросы без пользователя лимитируются по адресу клиента уровнем
+    anonymous. Корзин хранится не больше max_keys, самые давние вытесняются.
+
+    Корзины живут в памяти процесса, у каждого воркера gunicorn свои,
+    поэтому лимит уровня делится между workers воркерами поровну: вместе
+    они пропускают не больше заданного в уровне. Запросы распределяются по
+    воркерам неравномерно (keepalive-соединения nginx), и пользователь,
+    попавший в один воркер, упирается в его долю раньше общего лимита.
+
+    Attributes:
+        tiers (Sequence[Tier]): уровни по возрастанию min_balance, первый - для анонимов
+        tier_ttl (float): время жизни закешированного уровня, секунды
+        max_keys (int): сколько корзин держать в памяти
+        workers (int): между сколькими процессами делится лимит
+    """
+
+    def __init__(self, balance_lookup: BalanceLookup, tiers: Sequence[Tier] = DEFAULT_TIERS,
+                 tier_ttl: float = 30.0, max_keys: int = 100_000, workers: int = 1):
+        self.balance_lookup = balance_lookup
+        self.tiers = tuple(sorted(tiers, key=lambda tier: tier.min_balance))
+        self.tier_ttl = tier_ttl
+        self.max_keys = max_keys
+        self.workers = max(1, workers)
+        self._buckets: "OrderedDict[str, Tuple[Tier, TokenBucket]]" = OrderedDict()
+        self._tiers: Dict[int, Tuple[Tier, float]] = {}
+
+    def tier_for_balance(self, balance: Optional[Decimal]) -> Tier:
+        if balance is None:
+            return self.tiers[0]
+        tier = self.tiers[0]
+        for candidate in self.tiers[1:]:
+            if balance >= candidate.min_balance:
+                tier = candidate
+        return tier
+
+    async def _user_tier(self, user_id: int, now: float) -> Tier:
+        cached = self._tiers.get(user_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        try:
+            balance = await asyncio.to_thread(self.balance_lookup, user_id)
+        except Exception:
+            # БД недоступна - не роняем запрос, а даём минимальный уровень
+            logger.exception("Balance lookup failed for user %s", user_id)
+            balance = Decimal("0")
+        tier = self.tier_for_balance(balance)
+        self._tiers[user_id] = (tier, now + self.tier_ttl)
+        if len(self._tiers) > self.max_keys:
+            self._tiers.pop(next(iter(self._tiers)))
+        return tier
+
+    async def check(self, user_id: Optional[int], client: str = "") -> Decision:
+        now = time.monotonic()
+        if user_id is None:
+            key, tier = f"ip:{client}", self.tiers[0]
+        else:
+            key, tier = f"user:{user_id}", await self._user_tier(user_id, now)
+        entry = self._buckets.get(key)
+        if entry is None or entry[0] != tier:
+            # Новый пользователь или сменился уровень - корзина под новый лимит
+            bucket = TokenBucket(tier.rate / self.workers,
+                                 max(1.0, tier.burst / self.workers), now)
+            entry = self._buckets[key] = (tier, bucket)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        retry_after = entry[1].acquire(now)
+        if retry_after:
+            RATE_LIMITED.inc(tier=tier.name)
+        return Decision(not retry_after, tier, int(entry[1].tokens), retry_after)
+
+    def invalidate(self, user_id: int) -> None:
+        """Сбрасывает закешированный уровень (например, после пополнения)"""
+        self._tiers.pop(user_id, None)
+
+
+def database_balance_lookup(user_id: int) -> Optional[Decimal]:
+    """Баланс кошелька через кеш пользователей; None - кошелька или пользователя нет"""
+    from sqlmodel import Session
+
+    from database.database import get_database_engine
+    from services.crud.user import get_cached_user
+
+    with Session(get_database_engine()) as session:
+        user = get_cached_user(user_id, session)
+        return None if user is None else user.balance
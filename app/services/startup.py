@@ -0,0 +1,38 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from services.metrics import REGISTRY
+
+STARTUP_PHASE_SECONDS = REGISTRY.gauge(
+    "startup_phase_seconds", "Duration of startup phases", ["phase"],
+    multiprocess_mode="all")
+
+
+class StartupTimer:
+    """
+    Замеры фаз запуска (импорты, загрузка модели, прогрев).
+
+    Attributes:
+        phases (Dict[str, float]): длительность каждой фазы, секунды
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = round(seconds, 6)
+        STARTUP_PHASE_SECONDS.set(seconds, phase=name)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    @property
+    def uptime(self) -> float:
+        return time.perf_counter() - self.started
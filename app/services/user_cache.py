@@ -0,0 +1,288 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import count
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from services.metrics import USER_CACHE_REQUESTS
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    """
+    Данные пользователя для обработки запроса - без ORM-объекта и связей.
+
+    Баланс здесь только для чтения (уровни лимитов, отображение):
+    списания всегда идут атомарным UPDATE в БД, а не по этому значению.
+
+    Attributes:
+        id (int): id пользователя
+        email (str): email
+        password_hash (str): хеш пароля
+        created_at (datetime): дата регистрации
+        balance (Optional[Decimal]): баланс кошелька, None - кошелька нет
+        event_count (int): число событий пользователя
+    """
+    id: int
+    email: str
+    password_hash: str
+    created_at: datetime
+    balance: Optional[Decimal]
+    event_count: int
+
+    def dumps(self) -> bytes:
+        data = asdict(self)
+        data["created_at"] = self.created_at.isoformat()
+        data["balance"] = None if self.balance is None else str(self.balance)
+        return json.dumps(data).encode()
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "UserSnapshot":
+        data = json.loads(raw)
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+        data["balance"] = None if data["balance"] is None else Decimal(data["balance"])
+        return cls(**data)
+
+
+class CacheBackend(ABC):
+    """Общий для процессов кеш (например, Redis): байты по строковому ключу с TTL"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        ...
+
+
+class LocalBackend(CacheBackend):
+    """Заглушка общего кеша в памяти процесса - для разработки и тестов"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+def _id_key(user_id: int) -> str:
+    return f"user:id:{user_id}"
+
+
+def _email_key(email: str) -> str:
+    # Регистр не приводим: поиск в БД по email тоже точный
+    return f"user:email:{email}"
+
+
+def _keys(snapshot: UserSnapshot) -> Tuple[str, str]:
+    return _id_key(snapshot.id), _email_key(snapshot.email)
+
+
+class UserCache:
+    """
+    Read-through кеш пользователей по id и email.
+
+    Первый уровень - LRU в памяти процесса, второй (необязательный) -
+    общий backend. Снимок пользователя лежит под обоими ключами, и из LRU
+    они вытесняются и истекают вместе.
+
+    Одновременные промахи по одному ключу грузят пользователя из БД
+    один раз, остальные потоки ждут результат. Загрузка, во время которой
+    этого пользователя инвалидировали, свой результат в кеш не кладёт;
+    инвалидация других пользователей ей не мешает.
+
+    Attributes:
+        max_entries (int): размер LRU в памяти
+        ttl (float): время жизни записи, секунды (ограничивает устаревание
+            между процессами, когда общего backend нет)
+        backend (Optional[CacheBackend]): общий кеш второго уровня
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 30.0,
+                 backend: Optional[CacheBackend] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._local: "OrderedDict[str, Tuple[UserSnapshot, float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        # Версии ключей: момент (по _clock) последней инвалидации ключа. Загрузка
+        # сохраняет результат, только если её ключи не инвалидировались после
+        # её начала. Хранятся, пока идут загрузки
+        self._clock = count(1)
+        self._versions: Dict[str, int] = {}
+        self._cleared_at = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+
+    def get_by_id(self, user_id: int,
+                  loader: Callable[[int], Optional[UserSnapshot]]) -> Optional[UserSnapshot]:
+        return self._read_through(_id_key(user_id), lambda: loader(user_id))
+
+    def get_by_email(self, email: str,
+                     loader: Callable[[str], Optional[UserSnapshot]]) -> Optional[UserSnapshot]:
+        return self._read_through(_email_key(email), lambda: loader(email))
+
+    def _get_local(self, key: str) -> Optional[UserSnapshot]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._drop_local(entry[0])
+            return None
+        self._local.move_to_end(key)
+        return entry[0]
+
+    def _put_local(self, snapshot: UserSnapshot) -> None:
+        expires = time.monotonic() + self.ttl
+        for key in _keys(snapshot):
+            self._local[key] = (snapshot, expires)
+            self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            _, (evicted, _) = self._local.popitem(last=False)
+            self._drop_local(evicted)
+
+    def _drop_local(self, snapshot: UserSnapshot) -> None:
+        """Удаляет оба ключа снимка, если они ещё указывают на него"""
+        for key in _keys(snapshot):
+            entry = self._local.get(key)
+            if entry is not None and entry[0] is snapshot:
+                del self._local[key]
+
+    def _changed_since(self, keys: Iterable[str], started: int) -> bool:
+        return self._cleared_at > started or any(
+            self._versions.get(key, 0) > started for key in keys)
+
+    def _read_through(self, key: str,
+                      load: Callable[[], Optional[UserSnapshot]]) -> Optional[UserSnapshot]:
+        with self._lock:
+            snapshot = self._get_local(key)
+            if snapshot is not None:
+                self.hits += 1
+                USER_CACHE_REQUESTS.inc(result="hit")
+                return snapshot
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                started = next(self._clock)
+        if not leader:
+            # Этого пользователя уже грузит другой поток - ждём его результат
+            USER_CACHE_REQUESTS.inc(result="coalesced")
+            return future.result()
+        try:
+            snapshot = self._load(key, load, started)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(snapshot)
+            return snapshot
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if not self._inflight:
+                    # Загрузок, начатых до этих инвалидаций, не осталось
+                    self._versions.clear()
+
+    def _load(self, key: str, load: Callable[[], Optional[UserSnapshot]],
+              started: int) -> Optional[UserSnapshot]:
+        raw = self.backend.get(key) if self.backend is not None else None
+        snapshot = UserSnapshot.loads(raw) if raw is not None else load()
+        result = "backend_hit" if raw is not None else "miss"
+        USER_CACHE_REQUESTS.inc(result=result)
+        with self._lock:
+            if raw is not None:
+                self.backend_hits += 1
+            else:
+                self.misses += 1
+            if snapshot is None or self._changed_since({key, *_keys(snapshot)}, started):
+                # Во время загрузки пользователя изменили - результат мог устареть
+                return snapshot
+            self._put_local(snapshot)
+        if raw is None and self.backend is not None:
+            payload = snapshot.dumps()
+            self.backend.set(_id_key(snapshot.id), payload, self.ttl)
+            self.backend.set(_email_key(snapshot.email), payload, self.ttl)
+        return snapshot
+
+    def invalidate(self, user_id: int, email: Optional[str] = None) -> None:
+        """Сбрасывает пользователя; вызывать после commit изменения"""
+        id_key = _id_key(user_id)
+        with self._lock:
+            entry = self._local.get(id_key)
+            if entry is not None:
+                self._drop_local(entry[0])
+                email = email or entry[0].email
+            if email is not None:
+                self._local.pop(_email_key(email), None)
+            if self._inflight:
+                version = next(self._clock)
+                self._versions[id_key] = version
+                if email is not None:
+                    self._versions[_email_key(email)] = version
+        if self.backend is None:
+            return
+        if email is None:
+            raw = self.backend.get(id_key)
+            email = UserSnapshot.loads(raw).email if raw is not None else None
+        self.backend.delete(id_key, *([_email_key(email)] if email is not None else []))
+
+    def invalidate_many(self, user_ids: Iterable[Optional[int]]) -> None:
+        for user_id in set(user_ids) - {None}:
+            self.invalidate(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cleared_at = next(self._clock)
+            self._local.clear()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.backend_hits + self.misses
+        return {
+            "hits": self.hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "size": len(self._local),
+            "hit_rate": (self.hits + self.backend_hits) / lookups if lookups else 0.0,
+        }
+
+
+@lru_cache()
+def get_user_cache() -> UserCache:
+    """Кеш пользователей, один на процесс"""
+    from database.config import get_settings
+
+    settings = get_settings()
+    return UserCache(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL)
@@ -0,0 +1,101 @@
+"""
+Пакетная проверка полей пользователей и событий.
+
+Колонка значений превращается в Arrow-массив, длины и формат email
+проверяются векторными ядрами (utf8_length, RE2-регулярка) без цикла
+по строкам в Python. Результат - маски ошибок по каждому правилу.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from models.event import DESCRIPTION_MAX_LENGTH, TITLE_MAX_LENGTH, TITLE_MIN_LENGTH
+from models.user import (EMAIL_MAX_LENGTH, EMAIL_MIN_LENGTH, EMAIL_REGEX,
+                         PASSWORD_MIN_LENGTH)
+
+
+@dataclass
+class ValidationReport:
+    """
+    Итог пакетной проверки.
+
+    Attributes:
+        size (int): число строк
+        errors (Dict[str, np.ndarray]): по каждому правилу булева маска строк, где оно нарушено
+    """
+    size: int
+    errors: Dict[str, np.ndarray]
+
+    @property
+    def invalid(self) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for rule_mask in self.errors.values():
+            mask |= rule_mask
+        return mask
+
+    @property
+    def valid(self) -> np.ndarray:
+        return ~self.invalid
+
+    @property
+    def invalid_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.invalid)
+
+    def row_errors(self, row: int) -> List[str]:
+        return [rule for rule, mask in self.errors.items() if mask[row]]
+
+    def counts(self) -> Dict[str, int]:
+        return {rule: int(mask.sum()) for rule, mask in self.errors.items()}
+
+
+def _column(values: Sequence[Optional[str]]) -> pa.Array:
+    return values if isinstance(values, pa.Array) else pa.array(values, type=pa.string())
+
+
+def _mask(condition: pa.Array) -> np.ndarray:
+    return condition.fill_null(True).to_numpy(zero_copy_only=False)
+
+
+def _length_errors(column: pa.Array, name: str, max_length: int, min_length: int = 0,
+                   required: bool = True) -> Dict[str, np.ndarray]:
+    lengths = pc.utf8_length(column)
+    errors = {}
+    if required:
+        errors[f"{name}_missing"] = column.is_null().to_numpy(zero_copy_only=False)
+    if min_length:
+        errors[f"{name}_too_short"] = _mask(pc.less(lengths, min_length))
+    # Пустое необязательное значение длину не нарушает
+    errors[f"{name}_too_long"] = pc.greater(lengths, max_length).fill_null(False) \
+        .to_numpy(zero_copy_only=False)
+    return errors
+
+
+def validate_users(emails: Sequence[Optional[str]],
+                   passwords: Optional[Sequence[Optional[str]]] = None) -> ValidationReport:
+    """Проверяет колонки email (и паролей, если переданы)"""
+    email_column = _column(emails)
+    errors = _length_errors(email_column, "email", EMAIL_MAX_LENGTH, EMAIL_MIN_LENGTH)
+    errors["email_format"] = _mask(pc.invert(pc.match_substring_regex(email_column, EMAIL_REGEX)))
+    if passwords is not None:
+        if len(passwords) != len(email_column):
+            raise ValueError("emails and passwords must have the same length")
+        password_column = _column(passwords)
+        errors["password_missing"] = password_column.is_null().to_numpy(zero_copy_only=False)
+        errors["password_too_short"] = _mask(
+            pc.less(pc.utf8_length(password_column), PASSWORD_MIN_LENGTH))
+    return ValidationReport(len(email_column), errors)
+
+
+def validate_events(titles: Sequence[Optional[str]],
+                    descriptions: Sequence[Optional[str]]) -> ValidationReport:
+    """Проверяет колонки названий и описаний событий"""
+    title_column, description_column = _column(titles), _column(descriptions)
+    if len(title_column) != len(description_column):
+        raise ValueError("titles and descriptions must have the same length")
+    errors = _length_errors(title_column, "title", TITLE_MAX_LENGTH, TITLE_MIN_LENGTH)
+    errors.update(_length_errors(description_column, "description", DESCRIPTION_MAX_LENGTH,
+                                 required=False))
+    return ValidationReport(len(title_column), errors)
@@ -0,0 +1,79 @@
+"""
+Бэкенды прямого прохода: изображений в секунду на ядро.
+
+Каждый бэкенд меряется на батчах по 32 с одним потоком (результат - это
+и есть изображений/с на ядро) и со всеми ядрами процесса (в params -
+пересчёт на ядро). Для int8 в params - сверка с float (CalibrationReport).
+Бэкенды ONNX пропускаются, если onnx/onnxruntime не установлены. Потоки
+BLAS для numpy ограничиваются на время замера через threadpoolctl; без
+него строки numpy с ограничением потоков пропускаются - иначе это был бы
+замер со всеми ядрами.
+
+    python benchmarks/bench_backends.py
+"""
+import tempfile
+from contextlib import nullcontext
+from dataclasses import asdict
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from bench_inference import make_weights
+from harness import Result, measure
+
+
+def run(images: int = 512, batch_size: int = 32) -> List[Result]:
+    from models.model import load_weights
+    from services.ml.backends import (BACKENDS, BackendOptions, NumpyBackend, OnnxBackend,
+                                      available_cores, calibration_inputs, compare_backends)
+
+    weights = load_weights(make_weights(Path(tempfile.mkdtemp()) / "bench_model.npz"))
+    rng = np.random.default_rng(1)
+    batches = [rng.random((batch_size, weights.input_dim), dtype=np.float32)
+               for _ in range(images // batch_size)]
+    cores = available_cores()
+
+    results = []
+    for name in BACKENDS:
+        for threads in sorted({1, cores}):
+            options = BackendOptions(name, intra_op_threads=threads)
+            try:
+                backend = (NumpyBackend(weights, options) if name == "numpy" else
+                           OnnxBackend.from_weights(weights, options,
+                                                    quantized=name == "onnx-int8"))
+            except ImportError as e:
+                print(f"skip {name}: {e}")
+                break
+            limits = nullcontext()
+            if name == "numpy" and threads != cores:
+                try:
+                    from threadpoolctl import threadpool_limits
+                except ImportError:
+                    print(f"skip {name}[{threads} threads]: threadpoolctl is not installed")
+                    continue
+                limits = threadpool_limits(threads)
+            params = {"backend": name, "threads": threads, "batch_size": batch_size}
+            if name == "onnx-int8":
+                reference = OnnxBackend.from_weights(weights, options)
+                params["calibration"] = asdict(compare_backends(
+                    reference, backend, calibration_inputs(weights)))
+
+            def forward(backend=backend):
+                for batch in batches:
+                    backend.forward(batch)
+
+            with limits:
+                result = measure(f"backends.{name}[{threads} threads]", forward,
+                                 ops=len(batches) * batch_size, unit="image", params=params)
+            result.params["images_per_sec_per_core"] = result.to_dict()["ops_per_sec"] / threads
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    for result in run():
+        calibration = result.params.get("calibration")
+        print(f"{result.name:32s} {result.params['images_per_sec_per_core']:10.1f} image/s/core"
+              + (f"   top-1 agreement {calibration['top1_agreement']:.3f}, "
+                 f"max |dp| {calibration['max_abs_diff']:.2e}" if calibration else ""))
@@ -0,0 +1,56 @@
+"""BillingService.execute_transaction (hw_1) и services.crud.wallet.charge под конкуренцией."""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+
+from harness import Result, measure, reset_database
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def run(threads: int = 8, charges: int = 2000) -> List[Result]:
+    import hw_1
+    from sqlmodel import Session
+
+    from database.database import get_database_engine
+    from models.user import User
+    from services.crud.user import create_user
+    from services.crud.wallet import charge, create_wallet, deposit
+
+    user = hw_1.User(id=1, email="bench@mail.ru", password="bench_password")
+    billing = hw_1.BillingService()
+    per_thread = charges // threads
+
+    def in_memory():
+        hw_1.BillingService.execute_transaction(user, Decimal("10000"), hw_1.DepositTransaction)
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(lambda _: [
+                billing.execute_transaction(user, Decimal("0.01"), hw_1.ServiceTransaction)
+                for _ in range(per_thread)], range(threads)))
+
+    results = [measure("billing.hw1_execute_transaction", in_memory,
+                       ops=per_thread * threads, unit="txn", params={"threads": threads})]
+
+    reset_database()
+    engine = get_database_engine()
+    with Session(engine) as session:
+        user_id = create_user(User(email="bench@mail.ru", password_hash="bench"), session).id
+        create_wallet(user_id, session)
+
+    db_charges = charges // 10 // threads
+
+    def persisted():
+        with Session(engine) as session:
+            deposit(user_id, Decimal("10000"), session)
+        def worker(_):
+            with Session(engine) as session:
+                for _ in range(db_charges):
+                    charge(user_id, Decimal("0.01"), session)
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(worker, range(threads)))
+
+    results.append(measure("billing.wallet_charge", persisted, ops=db_charges * threads,
+                           unit="txn", repeat=3, params={"threads": threads}))
+    return results
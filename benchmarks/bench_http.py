@@ -0,0 +1,44 @@
+"""Сквозная задержка запросов через FastAPI-приложение (in-process клиент)."""
+import io
+import os
+import tempfile
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from bench_inference import make_weights
+from harness import Result, measure
+
+
+def run(requests: int = 200) -> List[Result]:
+    os.environ["MODEL_PATH"] = str(make_weights(Path(tempfile.mkdtemp()) / "bench_model.npz"))
+    # Модель грузится до первого запроса, лимитер не должен резать сам бенчмарк
+    os.environ["MODEL_LOADING"] = "eager"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    from fastapi.testclient import TestClient
+    from PIL import Image
+
+    from database.config import get_settings
+    get_settings.cache_clear()
+    from api import app
+
+    image = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(
+        0, 255, (480, 640, 3), dtype=np.uint8)).save(image, "JPEG")
+    body = image.getvalue()
+
+    with TestClient(app) as client:
+        def health():
+            for _ in range(requests):
+                client.get("/health")
+
+        def predict():
+            for _ in range(requests):
+                client.post("/predict", content=body).raise_for_status()
+
+        return [
+            measure("http.health", health, ops=requests, unit="request"),
+            measure("http.predict", predict, ops=requests, unit="request",
+                    params={"body_bytes": len(body)}),
+        ]
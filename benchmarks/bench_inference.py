@@ -0,0 +1,49 @@
+"""Model.predict по одному изображению против predict_batch и MicroBatcher."""
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from harness import Result, measure
+
+
+def make_weights(path: Path, size: int = 64, hidden: int = 256, classes: int = 200) -> Path:
+    rng = np.random.default_rng(0)
+    np.savez(path,
+             W0=rng.standard_normal((size * size * 3, hidden)) * 0.01, b0=np.zeros(hidden),
+             W1=rng.standard_normal((hidden, classes)) * 0.01, b1=np.zeros(classes),
+             classes=np.array([f"bird_{i}" for i in range(classes)]),
+             input_size=np.array([size, size]))
+    return path
+
+
+def run(images: int = 256, batch_sizes=(8, 32, 128)) -> List[Result]:
+    from models.model import Model
+    from services.ml.batcher import MicroBatcher
+
+    model = Model(make_weights(Path(tempfile.mkdtemp()) / "bench_model.npz"))
+    height, width = model.input_size
+    rng = np.random.default_rng(1)
+    tensors = [rng.random((height, width, 3), dtype=np.float32) for _ in range(images)]
+
+    def single():
+        for tensor in tensors:
+            model.predict(tensor)
+
+    results = [measure("inference.predict_single", single, ops=images, unit="image")]
+    for batch_size in batch_sizes:
+        def batched(batch_size=batch_size):
+            for i in range(0, images, batch_size):
+                model.predict_batch(tensors[i:i + batch_size])
+        results.append(measure(f"inference.predict_batch[{batch_size}]", batched,
+                               ops=images, unit="image", params={"batch_size": batch_size}))
+
+    with MicroBatcher(model, max_batch_size=32, max_latency_ms=2) as batcher, \
+            ThreadPoolExecutor(32) as pool:
+        def concurrent():
+            list(pool.map(batcher.predict, tensors))
+        results.append(measure("inference.micro_batcher[32 clients]", concurrent,
+                               ops=images, unit="image"))
+    return results
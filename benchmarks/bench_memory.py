@@ -0,0 +1,132 @@
+"""
+Память на запись доменных объектов hw_1: прежняя раскладка против компактной.
+
+Прежняя раскладка (обычный @dataclass с __dict__, Decimal и datetime)
+воспроизведена здесь один в один, компактная - текущие классы hw_1.
+
+    python benchmarks/bench_memory.py --records 200000
+"""
+import argparse
+import gc
+import sys
+import threading
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import hw_1  # noqa: E402
+
+
+@dataclass
+class LegacyTransaction:
+    id: int
+    txn_type: str
+    amount: Decimal
+    report_dttm: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class LegacyTransactionRecord:
+    txn_id: int
+    user_id: int
+    txn_type: str
+    amount: Decimal
+    timestamp: datetime = field(default_factory=datetime.now)
+    status: str = "success"
+
+
+@dataclass
+class LegacyPredictionRecord:
+    prediction_id: int
+    user_id: int
+    input_image: str
+    output_result: str
+    timestamp: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class LegacyEvent:
+    id: int
+    title: str
+    creator: object
+    description: str
+    image: Optional[str] = None
+    result: Optional[str] = None
+    amount: Optional[Decimal] = Decimal("0.00")
+    report_dttm: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class LegacyWallet:
+    balance: Decimal = Decimal("0.00")
+    history: List = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def bytes_per_record(factory: Callable[[int], object], n: int) -> float:
+    """Прирост памяти (tracemalloc) на одну живую запись"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [factory(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Сам список хранит по указателю на запись - это не вес записи
+    overhead = sys.getsizeof(records)
+    del records
+    return (after - before - overhead) / n
+
+
+def _amount(i: int) -> str:
+    # Суммы из текстового источника (API, БД): каждая - новый объект
+    return f"{i % 10000 // 100}.{i % 100:02d}"
+
+
+def _txn_type(i: int) -> str:
+    # Тип транзакции, пришедший извне, а не из литерала
+    return "".join(["Service", "Transaction"])
+
+
+def run(n: int) -> List[tuple]:
+    user = hw_1.User(id=1, email="bench@mail.ru", password="bench_password")
+    cases = [
+        ("Transaction",
+         lambda i: LegacyTransaction(i, _txn_type(i), Decimal(_amount(i))),
+         lambda i: hw_1.ServiceTransaction(i, _txn_type(i), Decimal(_amount(i)))),
+        ("TransactionRecord",
+         lambda i: LegacyTransactionRecord(i, i % 1000, _txn_type(i), Decimal(_amount(i))),
+         lambda i: hw_1.TransactionRecord(i, i % 1000, _txn_type(i), Decimal(_amount(i)))),
+        ("PredictionRecord",
+         lambda i: LegacyPredictionRecord(i, i % 1000, "image.jpg", "sparrow"),
+         lambda i: hw_1.PredictionRecord(i, i % 1000, "image.jpg", "sparrow")),
+        ("Event",
+         lambda i: LegacyEvent(i, "Вызов модели", user, "Birds recognition",
+                               image="image.jpg", amount=Decimal(_amount(i))),
+         lambda i: hw_1.Event(i, "Вызов модели", user, "Birds recognition",
+                              image="image.jpg", amount=Decimal(_amount(i)))),
+        ("Wallet",
+         lambda i: LegacyWallet(Decimal(_amount(i))),
+         lambda i: hw_1.Wallet(Decimal(_amount(i)))),
+    ]
+    return [(name, bytes_per_record(legacy, n), bytes_per_record(compact, n))
+            for name, legacy, compact in cases]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'class':20s} {'legacy B/rec':>13s} {'compact B/rec':>14s} {'saved':>7s}")
+    for name, legacy, compact in run(args.records):
+        print(f"{name:20s} {legacy:13.1f} {compact:14.1f} {1 - compact / legacy:7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""create_user / get_all_users на таблице из N строк (SQLite по умолчанию)."""
+from typing import List, Sequence
+
+from harness import Result, measure, reset_database
+
+
+def run(sizes: Sequence[int] = (10_000, 100_000)) -> List[Result]:
+    from sqlmodel import Session
+
+    from database.database import get_database_engine
+    from models.user import User
+    from services.crud.bulk import bulk_insert_users
+    from services.crud.user import create_user, get_all_users
+
+    results = []
+    for size in sizes:
+        reset_database()
+        engine = get_database_engine()
+        with Session(engine) as session:
+            bulk_insert_users(({"email": f"user{i}@mail.ru", "password_hash": "hash"}
+                               for i in range(size)), session)
+        counter = iter(range(10 ** 9))
+
+        def create(n: int = 100):
+            with Session(engine) as session:
+                for _ in range(n):
+                    create_user(User(email=f"new{next(counter)}@mail.ru",
+                                     password_hash="hash"), session)
+
+        def fetch_all():
+            with Session(engine) as session:
+                get_all_users(session)
+
+        results.append(measure(f"orm.create_user[{size}]", create, ops=100, unit="row",
+                               repeat=3, params={"rows": size}))
+        results.append(measure(f"orm.get_all_users[{size}]", fetch_all, ops=size, unit="row",
+                               repeat=3, params={"rows": size}))
+    return results
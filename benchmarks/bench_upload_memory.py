@@ -0,0 +1,106 @@
+"""
+Пиковая память декодирования одной загрузки (services.ml.preprocessing).
+
+Каждое изображение декодируется в отдельном процессе из тела на диске
+(как загрузка больше UPLOAD_MEMORY_BYTES): прирост пика RSS (VmHWM, перед
+декодированием сбрасывается через /proc/self/clear_refs, поэтому только
+Linux) за время decode_image - фактический пик, включая прочитанные
+через mmap страницы тела. Рядом - оценка UploadStats.decode_bytes,
+которую сервис пишет в гистограмму preprocess_decode_bytes. JPEG
+декодируется в draft-режиме и почти не зависит от размера, PNG -
+целиком, до UPLOAD_MAX_PIXELS.
+
+    python benchmarks/bench_upload_memory.py --sizes 1024,4096
+"""
+import argparse
+import io
+import multiprocessing
+import shutil
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from typing import List, Tuple
+
+import harness  # noqa: F401  (добавляет app в sys.path)
+
+
+def _encode(fmt: str, side: int) -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(side)
+    # Шум плохо сжимается: размер тела близок к худшему случаю
+    image = Image.fromarray(rng.integers(0, 256, (side, side, 3), dtype=np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def _rss_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"{field} not found in /proc/self/status")
+
+
+def _decode_in_child(path: str, max_pixels: int, queue) -> None:
+    from services.ml.preprocessing import UploadStats, decode_image
+
+    # Тело копируется на диск кусками и в память целиком не попадает
+    spool = SpooledTemporaryFile(max_size=1)
+    with open(path, "rb") as f:
+        shutil.copyfileobj(f, spool)
+    spool.flush()
+    stats = UploadStats(size=spool.tell(), on_disk=True)
+    # Пик RSS наследуется от родителя и копился при импортах - сбрасываем до текущего
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    before = _rss_kb("VmRSS")
+    try:
+        decode_image(spool, (224, 224), on_disk=True, max_pixels=max_pixels, stats=stats)
+        error = ""
+    except ValueError as e:
+        error = type(e).__name__
+    after = _rss_kb("VmHWM")
+    queue.put(((after - before) * 1024, stats.decode_bytes, error))
+
+
+def measure_case(body: bytes, max_pixels: int) -> Tuple[int, int, str]:
+    with NamedTemporaryFile(suffix=".img") as f:
+        f.write(body)
+        f.flush()
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=_decode_in_child, args=(f.name, max_pixels, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+    return result
+
+
+def run(sizes: List[int], max_pixels: int) -> List[tuple]:
+    rows = []
+    for fmt in ("JPEG", "PNG"):
+        for side in sizes:
+            body = _encode(fmt, side)
+            rss, estimate, error = measure_case(body, max_pixels)
+            rows.append((fmt, side, len(body), estimate, rss, error))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="512,2048,4096", help="стороны квадратных изображений")
+    parser.add_argument("--max-pixels", type=int, default=4096 * 4096)
+    args = parser.parse_args()
+
+    print(f"{'format':6s} {'side':>6s} {'body MB':>8s} {'decode_bytes MB':>16s} "
+          f"{'RSS peak MB':>12s}")
+    for fmt, side, body, estimate, rss, error in run(
+            [int(s) for s in args.sizes.split(",")], args.max_pixels):
+        print(f"{fmt:6s} {side:6d} {body / 2**20:8.1f} {estimate / 2**20:16.1f} "
+              f"{rss / 2**20:12.1f} {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Проверка полей при массовой регистрации: построчно против пакетной (Arrow)."""
+from typing import List
+
+from harness import Result, measure
+
+
+def run(rows: int = 100_000) -> List[Result]:
+    from models.event import DESCRIPTION_MAX_LENGTH, TITLE_MAX_LENGTH, TITLE_MIN_LENGTH
+    from models.user import EMAIL_MAX_LENGTH, EMAIL_MIN_LENGTH, EMAIL_PATTERN
+    from services.validation import validate_events, validate_users
+
+    emails = [f"user{i}@mail.ru" if i % 10 else f"broken{i}" for i in range(rows)]
+    titles = ["Вызов модели" if i % 10 else "" for i in range(rows)]
+    descriptions = ["Birds recognition " * (i % 40) for i in range(rows)]
+
+    def per_row():
+        for email, title, description in zip(emails, titles, descriptions):
+            (EMAIL_MIN_LENGTH <= len(email) <= EMAIL_MAX_LENGTH
+             and EMAIL_PATTERN.fullmatch(email) is not None)
+            TITLE_MIN_LENGTH <= len(title) <= TITLE_MAX_LENGTH
+            len(description) <= DESCRIPTION_MAX_LENGTH
+
+    def batch():
+        validate_users(emails).valid
+        validate_events(titles, descriptions).valid
+
+    return [
+        measure("validation.per_row", per_row, ops=rows, unit="row"),
+        measure("validation.batch", batch, ops=rows, unit="row"),
+    ]
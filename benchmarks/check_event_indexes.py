@@ -0,0 +1,83 @@
+"""
+Проверка по EXPLAIN, что горячие запросы к событиям идут по индексам.
+
+Засевает события нескольких пользователей, обновляет статистику и
+проверяет планы: страница истории пользователя (первая и по курсору) -
+по ix_event_creator_id_created_at, вызовы модели за период - по
+частичному ix_event_model_calls_created_at. Код выхода 1, если нет.
+На SQLite то же проверяет tests/test_event_indexes.py при каждом прогоне
+тестов; скрипт нужен для проверки планов на Postgres.
+
+Запуск (по умолчанию на временной SQLite; таблицы базы пересоздаются, поэтому
+Postgres - только явно, --database-url URL --destroy):
+    python benchmarks/check_event_indexes.py --users 50 --events 200
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+
+from harness import add_database_arguments, reset_database, use_database
+
+
+def seed(users: int, events: int) -> None:
+    from sqlalchemy import insert, text
+
+    from database.database import get_database_engine
+    from models.event import MODEL_CALL_TITLE, Event
+    from models.user import User
+
+    reset_database()
+    engine = get_database_engine()
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "email": f"user{i}@mail.ru", "password_hash": "x" * 64,
+             "created_at": now} for i in range(1, users + 1)])
+        conn.execute(insert(Event), [
+            {"creator_id": user_id,
+             "title": MODEL_CALL_TITLE if n % 20 == 0 else "Пополнение",
+             "image": "bird.jpg", "description": "",
+             "created_at": now - timedelta(minutes=n * users + user_id)}
+            for user_id in range(1, users + 1) for n in range(events)])
+        conn.execute(text("ANALYZE"))
+
+
+def check() -> bool:
+    from database.database import get_database_engine
+    from database.schema import explain
+    from services.crud.event import model_calls_statement, user_events_statement
+
+    engine = get_database_engine()
+    now = datetime.now(timezone.utc)
+    cases = [
+        ("user_events", user_events_statement(7, limit=50),
+         "ix_event_creator_id_created_at"),
+        ("user_events.after", user_events_statement(7, (now - timedelta(days=1), 10**9), 50),
+         "ix_event_creator_id_created_at"),
+        ("model_calls", model_calls_statement(now - timedelta(days=1), now, 100),
+         "ix_event_model_calls_created_at"),
+    ]
+    ok = True
+    for name, statement, index in cases:
+        plan = explain(engine, statement)
+        used = index in plan
+        ok &= used
+        print(f"{name:20s} {'OK' if used else 'FAIL'} ({index})")
+        if not used:
+            print("    " + plan.replace("\n", "\n    "))
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--events", type=int, default=200, help="событий на пользователя")
+    add_database_arguments(parser)
+    args = parser.parse_args()
+    use_database(args)
+    seed(args.users, args.events)
+    sys.exit(0 if check() else 1)
+
+
+if __name__ == "__main__":
+    main()
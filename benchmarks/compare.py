@@ -0,0 +1,37 @@
+"""
+Сравнение двух файлов результатов: код возврата 1, если есть регрессия.
+
+    python benchmarks/compare.py results/base.json results/head.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="допустимое падение ops/sec (доля)")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)["results"]
+    with open(args.head) as f:
+        head = json.load(f)["results"]
+
+    regressions = 0
+    for name in sorted(base.keys() & head.keys()):
+        old, new = base[name]["ops_per_sec"], head[name]["ops_per_sec"]
+        change = (new - old) / old if old else 0.0
+        flag = "REGRESSION" if change < -args.threshold else ""
+        regressions += bool(flag)
+        print(f"{name:45s} {old:12.1f} -> {new:12.1f}  {change:+7.1%} {flag}")
+    for name in sorted(base.keys() - head.keys()):
+        print(f"{name:45s} missing in head")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Минимальный харнесс бенчмарков: замеры, сохранение в JSON, метаданные запуска, одноразовая база."""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+
+@dataclass
+class Result:
+    """
+    Результат одного сценария.
+
+    Attributes:
+        name (str): имя сценария, уникальное в пределах запуска
+        unit (str): единица операции (call, image, row, request)
+        ops (int): операций за один прогон
+        times (List[float]): длительность каждого прогона, секунды
+        params (Dict): параметры сценария
+    """
+    name: str
+    unit: str
+    ops: int
+    times: List[float]
+    params: Dict = field(default_factory=dict)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.times)
+
+    def to_dict(self) -> Dict:
+        per_op = sorted(t / self.ops for t in self.times)
+        return {
+            **asdict(self),
+            "median_s": self.median,
+            "min_s": min(self.times),
+            "per_op_median_s": statistics.median(per_op),
+            "per_op_p95_s": per_op[min(len(per_op) - 1, int(len(per_op) * 0.95))],
+            "ops_per_sec": self.ops / self.median if self.median else 0.0,
+        }
+
+
+def measure(name: str, fn: Callable[[], object], ops: int = 1, unit: str = "call",
+            repeat: int = 5, warmup: int = 1, params: Optional[Dict] = None) -> Result:
+    """Запускает fn warmup + repeat раз, fn выполняет ops операций за вызов"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return Result(name, unit, ops, times, params or {})
+
+
+# База, которую запуск разрешил пересоздавать (см. use_database)
+_DISPOSABLE_DB_ENV = "BENCH_DISPOSABLE_DATABASE_URL"
+
+
+def add_database_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--database-url", default=None,
+                        help="база для сценариев с БД (по умолчанию - временная SQLite); "
+                             "все таблицы в ней удаляются и создаются заново")
+    parser.add_argument("--destroy", action="store_true",
+                        help="подтверждение, что таблицы в --database-url можно удалить")
+
+
+def use_database(args: Namespace) -> str:
+    """
+    Настраивает базу для сценариев, которые пересоздают схему.
+
+    DATABASE_URL и DB_HOST окружения не используются: в контейнере app они
+    указывают на рабочую базу. Без --database-url база - новая временная
+    SQLite, другая - только с явным --destroy. Вызывать до первого
+    get_settings().
+    """
+    if args.database_url is None:
+        url = f"sqlite:///{Path(tempfile.mkdtemp(prefix='bench-')) / 'bench.db'}"
+    elif not args.destroy:
+        raise SystemExit(f"--database-url {_masked(args.database_url)} would drop every "
+                         "table there, add --destroy to confirm")
+    else:
+        url = args.database_url
+    os.environ["DATABASE_URL"] = url
+    os.environ[_DISPOSABLE_DB_ENV] = url
+    return url
+
+
+def reset_database() -> None:
+    """init_db(drop_all=True), но только на базе, разрешённой use_database"""
+    from database.config import get_settings
+    from database.database import init_db
+
+    url = get_settings().DATABASE_URL_psycopg
+    if os.environ.get(_DISPOSABLE_DB_ENV) != url:
+        raise RuntimeError(f"Refusing to drop tables of {_masked(url)}: run the benchmark "
+                           "through use_database (--database-url URL --destroy)")
+    init_db(drop_all=True)
+
+
+def _masked(url: str) -> str:
+    from sqlalchemy.engine import make_url
+
+    return make_url(url).render_as_string(hide_password=True)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=APP_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save(results: List[Result], path: Optional[Path] = None) -> Path:
+    commit = _git_commit()
+    if path is None:
+        path = Path(__file__).resolve().parent / "results" / f"{commit}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": {r.name: r.to_dict() for r in results},
+    }
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False))
+    return path
@@ -0,0 +1,51 @@
+"""
+Запуск бенчмарков и сохранение результатов в JSON.
+
+    python benchmarks/run.py                       # все сценарии
+    python benchmarks/run.py --only inference,http
+    python benchmarks/run.py --rows 10000,100000,1000000
+    python benchmarks/compare.py results/old.json results/new.json
+
+База - новая временная SQLite; таблицы другой базы сценарии удаляют, поэтому
+она задаётся только явно: --database-url URL --destroy.
+"""
+import argparse
+from pathlib import Path
+
+SCENARIOS = ("inference", "backends", "billing", "orm", "http", "validation")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(SCENARIOS))
+    parser.add_argument("--rows", default="10000,100000",
+                        help="размеры таблицы users для ORM-сценариев")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="файл результатов (по умолчанию results/<commit>.json)")
+    from harness import add_database_arguments, save, use_database
+
+    add_database_arguments(parser)
+    args = parser.parse_args()
+    use_database(args)
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    results = []
+    for name in selected:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}")
+        module = __import__(f"bench_{name}")
+        if name == "orm":
+            results += module.run(sizes=[int(n) for n in args.rows.split(",")])
+        else:
+            results += module.run()
+
+    for result in results:
+        data = result.to_dict()
+        print(f"{result.name:45s} {data['ops_per_sec']:12.1f} {result.unit}/s"
+              f"   p95 {data['per_op_p95_s'] * 1000:8.3f} ms/{result.unit}")
+    print(f"Saved to {save(results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
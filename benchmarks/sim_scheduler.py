@@ -0,0 +1,136 @@
+"""
+Симуляция очереди к модели: один тяжёлый пользователь и несколько лёгких.
+
+Тяжёлый пользователь шлёт запросы быстрее, чем модель успевает их
+обрабатывать, лёгкие - редко. Сравниваются обычная очередь в порядке
+прихода и FairScheduler; для лёгких пользователей печатаются p50/p99
+задержки. Код выхода 1, если со справедливой очередью p99 лёгких
+пользователей больше --bound секунд.
+
+Модель заменена задержкой: base + per_item * размер батча.
+
+    python benchmarks/sim_scheduler.py --seconds 3 --heavy-rate 4000
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+
+class SleepModel:
+    """Модель-заглушка: время батча растёт с его размером"""
+
+    def __init__(self, base: float, per_item: float):
+        self.base = base
+        self.per_item = per_item
+
+    def predict_batch(self, images: List) -> List[Dict]:
+        time.sleep(self.base + self.per_item * len(images))
+        return [{"output": "bird"} for _ in images]
+
+    def predict(self, image) -> Dict:
+        return self.predict_batch([image])[0]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def simulate(fair: bool, seconds: float, heavy_rate: float, light_users: int,
+             light_rate: float, model: SleepModel, slo: float) -> Dict:
+    from services.ml.batcher import MicroBatcher
+    from services.ml.scheduler import AdmissionRejected, FairScheduler
+
+    scheduler = FairScheduler(slo=slo, timeout=slo * 5) if fair else None
+    batcher = MicroBatcher(model, max_batch_size=32, max_latency_ms=2,
+                           scheduler=scheduler).start()
+    latencies: Dict[str, List[float]] = {"heavy": [], "light": []}
+    counts = {"heavy": 0, "light": 0, "rejected_heavy": 0, "rejected_light": 0,
+              "failed": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def record(kind: str, started: float, future) -> None:
+        with lock:
+            if future.exception() is not None:
+                counts["failed"] += 1
+            else:
+                latencies[kind].append(time.monotonic() - started)
+
+    def client(kind: str, flow: str, rate: float) -> None:
+        # Запросы пачками раз в 10 мс, чтобы не упираться в точность sleep
+        per_tick = rate / 100
+        owed = 0.0
+        while time.monotonic() < stop_at:
+            owed += per_tick
+            while owed >= 1:
+                owed -= 1
+                started = time.monotonic()
+                try:
+                    future = batcher.submit(None, flow=flow)
+                except AdmissionRejected:
+                    with lock:
+                        counts[f"rejected_{kind}"] += 1
+                    continue
+                with lock:
+                    counts[kind] += 1
+                future.add_done_callback(
+                    lambda f, kind=kind, started=started: record(kind, started, f))
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=client, args=("heavy", "user:heavy", heavy_rate))]
+    threads += [threading.Thread(target=client, args=("light", f"user:light{i}", light_rate))
+                for i in range(light_users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.stop()
+    light = latencies["light"]
+    return {
+        "mode": "fair" if fair else "fifo",
+        "light_p50": statistics.median(light) if light else float("nan"),
+        "light_p99": _percentile(light, 0.99),
+        "heavy_p99": _percentile(latencies["heavy"], 0.99),
+        **counts,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--heavy-rate", type=float, default=4000, help="запросов/с тяжёлого")
+    parser.add_argument("--light-users", type=int, default=5)
+    parser.add_argument("--light-rate", type=float, default=10, help="запросов/с каждого лёгкого")
+    parser.add_argument("--batch-base-ms", type=float, default=2.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.5)
+    parser.add_argument("--slo", type=float, default=0.5, help="SLO ожидания в очереди, с")
+    parser.add_argument("--bound", type=float, default=0.25,
+                        help="допустимый p99 лёгких пользователей, с")
+    args = parser.parse_args()
+
+    model = SleepModel(args.batch_base_ms / 1000, args.per_item_ms / 1000)
+    results: List[Dict] = []
+    for fair in (False, True):
+        results.append(simulate(fair, args.seconds, args.heavy_rate, args.light_users,
+                                args.light_rate, model, args.slo))
+    for result in results:
+        print(f"{result['mode']:5s} light p50 {result['light_p50'] * 1000:8.1f} ms"
+              f"  p99 {result['light_p99'] * 1000:8.1f} ms"
+              f" | heavy p99 {result['heavy_p99'] * 1000:8.1f} ms"
+              f"  admitted {result['heavy']}  rejected {result['rejected_heavy']}"
+              f" | light rejected {result['rejected_light']}  expired {result['failed']}")
+    fair_p99: Optional[float] = results[-1]["light_p99"]
+    sys.exit(0 if fair_p99 <= args.bound else 1)
+
+
+if __name__ == "__main__":
+    main()
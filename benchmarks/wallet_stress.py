@@ -0,0 +1,86 @@
+"""
+Стресс-проверка кошелька: много потоков одновременно списывают с одного баланса.
+
+Запуск (по умолчанию на временной SQLite; таблицы базы пересоздаются, поэтому
+Postgres - только явно, --database-url URL --destroy):
+    python benchmarks/wallet_stress.py --threads 16 --charges 200
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from harness import add_database_arguments, reset_database, use_database
+
+
+def run(threads: int, charges: int, initial: Decimal, amount: Decimal) -> dict:
+    from sqlmodel import Session, func, select
+
+    from database.database import get_database_engine
+    from models.user import User
+    from models.wallet import Transaction
+    from services.crud.user import create_user
+    from services.crud.wallet import (InsufficientFundsError, charge, create_wallet,
+                                      deposit, get_balance)
+
+    reset_database()
+    engine = get_database_engine()
+    with Session(engine) as session:
+        user = create_user(User(email="stress@mail.ru", password_hash="stress"), session)
+        user_id = user.id
+        create_wallet(user_id, session)
+        deposit(user_id, initial, session)
+
+    def worker(n: int) -> int:
+        ok = 0
+        with Session(engine) as session:
+            for i in range(charges):
+                try:
+                    # Каждый запрос повторяется дважды с одним ключом - второй не должен списать
+                    key = f"{n}-{i}"
+                    charge(user_id, amount, session, idempotency_key=key)
+                    charge(user_id, amount, session, idempotency_key=key)
+                    ok += 1
+                except InsufficientFundsError:
+                    pass
+        return ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        succeeded = sum(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    with Session(engine) as session:
+        balance = get_balance(user_id, session)
+        service_txns = session.scalar(select(func.count()).select_from(Transaction)
+                                      .where(Transaction.txn_type == "Service"))
+        distinct_ids = session.scalar(select(func.count(func.distinct(Transaction.id))))
+        all_txns = session.scalar(select(func.count()).select_from(Transaction))
+
+    expected = initial - amount * succeeded
+    assert balance >= 0, f"negative balance {balance}"
+    assert balance == expected, f"lost update: balance {balance}, expected {expected}"
+    assert service_txns == succeeded, f"{service_txns} transactions for {succeeded} charges"
+    assert distinct_ids == all_txns, "duplicate transaction ids"
+    return {
+        "charges": succeeded,
+        "balance": str(balance),
+        "seconds": round(elapsed, 3),
+        "charges_per_sec": round(succeeded / elapsed, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--charges", type=int, default=100)
+    parser.add_argument("--initial", type=Decimal, default=Decimal("10.00"))
+    parser.add_argument("--amount", type=Decimal, default=Decimal("0.01"))
+    add_database_arguments(parser)
+    args = parser.parse_args()
+    use_database(args)
+    print(run(args.threads, args.charges, args.initial, args.amount))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,74 @@
 from dataclasses import dataclass, field, InitVar
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from heapq import merge
+from itertools import count
+from operator import attrgetter
 import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import weakref
 from decimal import Decimal
 from pathlib import Path
 from typing import Optional
 from datetime import datetime
 import hashlib
+import hmac
+import os
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+
+# Компактное представление: суммы - целые копейки, время - unix time.
+# Decimal и datetime создаются только при обращении к публичным атрибутам.
+
+def to_cents(amount) -> int:
+    """Сумма в копейках; доли копейки не допускаются"""
+    cents = Decimal(amount).scaleb(2)
+    if cents != cents.to_integral_value():
+        raise ValueError(f"Amount {amount} has fractions of a cent")
+    return int(cents)
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def to_ts(dttm: Optional[datetime]) -> float:
+    return time.time() if dttm is None else dttm.timestamp()
+
+
+def record_ts(ts=None, timestamp: Optional[datetime] = None) -> float:
+    """Время записи: ts (unix time или datetime) или, как раньше, timestamp (datetime)"""
+    if timestamp is not None:
+        if ts is not None:
+            raise TypeError("Pass either ts or timestamp, not both")
+        return timestamp.timestamp()
+    if isinstance(ts, datetime):
+        return ts.timestamp()
+    return time.time() if ts is None else ts
+
+
+# Снимок баланса кошелька на каждые SNAPSHOT_EVERY транзакций
+SNAPSHOT_EVERY = 100
+
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+def hash_password(password: str, salt: Optional[bytes] = None) -> str:
+    """Солёный хеш пароля (scrypt): соль$хеш в hex"""
+    salt = os.urandom(16) if salt is None else salt
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=2 ** 14, r=8, p=1)
+    return f"{salt.hex()}${digest.hex()}"
+
                  
-@dataclass
+@dataclass(slots=True, init=False)
 class Transaction(ABC):
     """
     Абстрактный класс для транзакций.
@@ -17,13 +76,33 @@ class Transaction(ABC):
     Attributes:
         id (int): Уникальный идентификатор транзакции
         txn_type (str): Тип транзакции
-        amount (Decimal): Сумма транзакции
-        report_dttm: datetime Время транзакции
+        amount (Decimal): Сумма транзакции (хранится в amount_cents)
+        report_dttm: datetime Время транзакции (хранится в ts)
     """
     id: int
     txn_type: str
-    amount: Decimal
-    report_dttm: datetime = field(default_factory=datetime.now)
+    amount_cents: int
+    ts: float
+
+    def __init__(self, id: int, txn_type: str, amount: Decimal,
+                 report_dttm: Optional[datetime] = None):
+        self.id = id
+        self.txn_type = sys.intern(txn_type)
+        self.amount_cents = to_cents(amount)
+        self.ts = to_ts(report_dttm)
+
+    @property
+    def amount(self) -> Decimal:
+        return from_cents(self.amount_cents)
+
+    @property
+    def report_dttm(self) -> datetime:
+        return datetime.fromtimestamp(self.ts)
+
+    @property
+    @abstractmethod
+    def delta_cents(self) -> int:
+        """Изменение баланса в копейках"""
 
     @abstractmethod
     def execute(self, wallet: 'Wallet'):
@@ -35,9 +114,16 @@ class DepositTransaction(Transaction):
     
     Переопределяем excute - полиморфизм.
     """
+    __slots__ = ()
+
+    @property
+    def delta_cents(self) -> int:
+        return self.amount_cents
+
     def execute(self, wallet: 'Wallet'):
-        wallet.balance += self.amount
-        wallet.history.append(self)
+        with wallet.lock:
+            wallet.balance_cents += self.amount_cents
+            wallet.record(self)
 
 class ServiceTransaction(Transaction):
     """
@@ -45,23 +131,86 @@ class ServiceTransaction(Transaction):
     
     Переопределяем excute - полиморфизм.
     """
+    __slots__ = ()
+
+    @property
+    def delta_cents(self) -> int:
+        return -self.amount_cents
+
     def execute(self, wallet: 'Wallet'):
-        if wallet.balance < self.amount:
-            raise ValueError("Insufficient funds")
-        wallet.balance -= self.amount
-        wallet.history.append(self)
+        with wallet.lock:
+            if wallet.balance_cents < self.amount_cents:
+                raise ValueError("Insufficient funds")
+            wallet.balance_cents -= self.amount_cents
+            wallet.record(self)
         
-@dataclass
+@dataclass(slots=True, init=False)
 class Wallet:
     """
     Класс для кошелька.
     
     Attributes:
-        balance (Decimal): Баланс
-        history: История транзакций
+        balance (Decimal): Баланс (хранится в balance_cents)
+        history: История транзакций (только дописывается, в порядке времени)
+        opening_cents: Баланс до всей истории в копейках
+        snapshots: Снимки (время, число транзакций, баланс в копейках) каждые
+            SNAPSHOT_EVERY транзакций, создаются с первым снимком (для переданной
+            истории - сразу, по её транзакциям)
+        lock: Блокировка для атомарной проверки и изменения баланса
     """
-    balance: Decimal = Decimal("0.00")
-    history: List[Transaction] = field(default_factory=list)
+    balance_cents: int
+    history: List[Transaction]
+    opening_cents: int = field(repr=False, compare=False)
+    snapshots: Optional[List[Tuple[float, int, int]]] = field(repr=False, compare=False)
+    lock: threading.Lock = field(repr=False, compare=False)
+
+    def __init__(self, balance: Decimal = Decimal("0.00"),
+                 history: Optional[List[Transaction]] = None):
+        self.balance_cents = to_cents(balance)
+        self.history = [] if history is None else history
+        self.opening_cents = self.balance_cents - sum(txn.delta_cents for txn in self.history)
+        self.snapshots = None
+        self.lock = threading.Lock()
+        cents = self.opening_cents
+        for n, txn in enumerate(self.history, 1):
+            cents += txn.delta_cents
+            if n % SNAPSHOT_EVERY == 0:
+                if self.snapshots is None:
+                    self.snapshots = []
+                self.snapshots.append((txn.ts, n, cents))
+
+    def record(self, txn: Transaction) -> None:
+        """Дописывает применённую транзакцию в историю (под wallet.lock)"""
+        self.history.append(txn)
+        if len(self.history) % SNAPSHOT_EVERY == 0:
+            if self.snapshots is None:
+                self.snapshots = []
+            self.snapshots.append((txn.ts, len(self.history), self.balance_cents))
+
+    def balance_at(self, dttm: datetime) -> Decimal:
+        """
+        Баланс на момент dttm: ближайший снимок плюс транзакции после него
+        до dttm (при согласованных снимках - не больше SNAPSHOT_EVERY).
+        """
+        ts = to_ts(dttm)
+        with self.lock:
+            snapshots = self.snapshots or ()
+            idx = bisect_right(snapshots, ts, key=lambda snapshot: snapshot[0])
+            _, start, cents = snapshots[idx - 1] if idx else (None, 0, self.opening_cents)
+            history = self.history
+            for i in range(start, len(history)):
+                if history[i].ts > ts:
+                    break
+                cents += history[i].delta_cents
+        return from_cents(cents)
+
+    @property
+    def balance(self) -> Decimal:
+        return from_cents(self.balance_cents)
+
+    @balance.setter
+    def balance(self, value: Decimal) -> None:
+        self.balance_cents = to_cents(value)
 
     @property
     def balance_amount(self) -> Decimal:
@@ -101,19 +250,19 @@ class User:
         
     def _validate_email(self) -> None:
         """Проверяет корректность email."""
-        email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-        if not email_pattern.match(self.email):
+        if not EMAIL_PATTERN.fullmatch(self.email):
             raise ValueError("Invalid email format")
 
     def _validate_password(self, password : str) -> str:
         """Проверяет минимальную длину пароля."""
         if len(password) < 8:
             raise ValueError("Password must be at least 8 characters long")
-        return hashlib.sha256(password.encode()).hexdigest()
+        return hash_password(password)
         
     def check_password(self, password: str) -> bool:
         """Проверка соответствия пароля."""
-        return self.password_hash == hashlib.sha256(password.encode()).hexdigest()
+        salt, _ = self.password_hash.split("$")
+        return hmac.compare_digest(self.password_hash, hash_password(password, bytes.fromhex(salt)))
 
     def add_event(self, event: 'Event') -> None:
         """Добавляет событие в список событий пользователя."""
@@ -152,9 +301,12 @@ class Admin(User):
 class BillingService:
     """ Класс для обработки транзакций"""
     
+    # Сквозная нумерация транзакций, не зависящая от длины истории кошелька
+    _txn_ids = count(1)
+    
     @staticmethod
     def execute_transaction(user: User, amount: Decimal, txn_class: type):
-        txn_id = len(user.wallet.history) + 1
+        txn_id = next(BillingService._txn_ids)
         txn = txn_class(id = txn_id, amount = amount, txn_type = txn_class.__name__)
         
         txn.execute(user.wallet)
@@ -163,7 +315,8 @@ class BillingService:
             txn_id = txn.id,
             user_id = user.id,
             txn_type = txn.txn_type,
-            amount = txn.amount
+            amount_cents = txn.amount_cents,
+            ts = txn.ts
         )
         HistoryManager.add_transaction(record)
 
@@ -171,30 +324,113 @@ class BillingService:
 class Model:
     """
     Класс для вызова модели
-    model_path (str): путь до модели
+    model_path (str): путь до модели (.npz с весами классификатора)
     """
     
+    # Веса и их версия загружаются один раз на процесс
+    _weights_cache: Dict[Path, Tuple[Dict, str]] = {}
+    
     def __init__(self, model_path):
-        self.model_path = Path(model_path)
+        self.model_path = Path(model_path).resolve()
+        self.version = ""
         self._load_model()
        
     def _load_model(self):
         if self.model_path.exists():
+            if self.model_path not in Model._weights_cache:
+                with np.load(self.model_path, allow_pickle=False) as data:
+                    weights = {k: data[k] for k in data.files}
+                Model._weights_cache[self.model_path] = (weights, file_digest(self.model_path)[:12])
+            self._weights, self.version = Model._weights_cache[self.model_path]
             self._is_loaded = True
         else:
             print(f'Ошибка загрузки модели')
             self._is_loaded = False
     
-    def predict(self, input_data: str) -> str:
+    def _preprocess(self, input_data: str) -> np.ndarray:
+        from PIL import Image
+        height, width = (int(x) for x in self._weights["input_size"])
+        with Image.open(input_data) as image:
+            array = np.asarray(image.convert("RGB").resize((width, height)))
+        return array.reshape(-1).astype(np.float32) / 255.0
+    
+    def predict_batch(self, images: List[str]) -> List[Dict]:
+        """Прогноз модели для батча изображений за один прямой проход"""
+        if not self._is_loaded:
+            raise RuntimeError("Model is not loaded")
+        if not images:
+            return []
+        x = np.stack([self._preprocess(image) for image in images])
+        n_layers = sum(1 for k in self._weights if k.startswith("W"))
+        for i in range(n_layers):
+            x = x @ self._weights[f"W{i}"] + self._weights[f"b{i}"]
+            if i != n_layers - 1:
+                x = np.maximum(x, 0)
+        classes = self._weights["classes"]
+        return [
+            {"input": image, "output": str(classes[idx])}
+            for image, idx in zip(images, x.argmax(axis=1))
+        ]
+    
+    def predict(self, input_data: str) -> Dict:
         """Прогноз модели для конкретного изображения"""    
-        result = 'Model'.predict(input_data)
-        
-        return {
-            "input": input_data,
-            "output": result
-        }
+        return self.predict_batch([input_data])[0]
 
-@dataclass
+
+def file_digest(path) -> str:
+    """sha256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU-кеш прогнозов по версии модели и хешу содержимого изображения:
+    повторная загрузка того же фото отвечается без запуска модели.
+
+    Attributes:
+        max_entries (int): сколько прогнозов держать
+        hits (int): ответов из кеша
+        misses (int): запусков модели
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def predict(self, model: Model, image: str) -> Dict:
+        # Незагруженная модель и нечитаемый файл - ошибки самой модели,
+        # кеш в них не участвует
+        if not model._is_loaded:
+            return model.predict(image)
+        try:
+            key = f"{model.version}-{file_digest(image)}"
+        except OSError:
+            return model.predict(image)
+        with self._lock:
+            prediction = self._entries.get(key)
+            if prediction is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return {**prediction, "input": image}
+        prediction = model.predict(image)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = prediction
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prediction
+
+
+PREDICTION_CACHE = PredictionCache()
+
+@dataclass(slots=True, init=False)
 class Event:
     """
     Класс для представления события.
@@ -206,22 +442,45 @@ class Event:
         description (str): Описание события
         image (str): Путь к изображению события
         result(str): Результат модели
-        amount (Decimal): Сумма для пополнения баланса        
-        report_dttm (datetime): Дата и время события
+        amount (Decimal): Сумма для пополнения баланса (хранится в amount_cents)
+        report_dttm (datetime): Дата и время события (хранится в ts)
     """
     id: int
     title: str
     creator: User
     description: str
-    image: Optional[str] = None
-    result: Optional[str] = None
-    amount: Optional[Decimal] = Decimal("0.00")
-    report_dttm: datetime = field(default_factory=datetime.now)
-
-    def __post_init__(self) -> None:
+    image: Optional[str]
+    result: Optional[str]
+    amount_cents: Optional[int]
+    ts: float
+
+    def __init__(self, id: int, title: str, creator: User, description: str,
+                 image: Optional[str] = None, result: Optional[str] = None,
+                 amount: Optional[Decimal] = Decimal("0.00"),
+                 report_dttm: Optional[datetime] = None):
+        self.id = id
+        self.title = sys.intern(title)
+        self.creator = creator
+        self.description = description
+        self.image = image
+        self.result = result
+        self.amount = amount
+        self.ts = to_ts(report_dttm)
         self._validate_title()
         self._validate_description()
 
+    @property
+    def amount(self) -> Optional[Decimal]:
+        return None if self.amount_cents is None else from_cents(self.amount_cents)
+
+    @amount.setter
+    def amount(self, value: Optional[Decimal]) -> None:
+        self.amount_cents = None if value is None else to_cents(value)
+
+    @property
+    def report_dttm(self) -> datetime:
+        return datetime.fromtimestamp(self.ts)
+
     def _validate_title(self) -> None:
         """Проверяет длину названия события."""
         if not 1 <= len(self.title) <= 100:
@@ -232,22 +491,33 @@ class Event:
         if len(self.description) > 500:
             raise ValueError("Description must not exceed 500 characters")            
            
-    def action(self, model: Optional[Model], billing : BillingService) -> None:
+    def action(self, model: Optional[Model], billing : BillingService,
+               producer=None) -> Optional[str]:
+        """
+        Выполняет событие. С producer (PredictionProducer из
+        app/services/ml/pipeline.py) вызов модели только ставится в очередь:
+        прогноз выполнят обработчики очереди, возвращается id задания.
+        """
         if self.title == 'Пополнение баланса':
             if self.amount <= 0:
                 raise ValueError("Deposit amount must be positive")
             billing.execute_transaction(self.creator, self.amount, DepositTransaction)
             
         elif self.title == 'Вызов модели':
+            if producer is not None:
+                job_id = producer.submit(self)
+                self.amount = Decimal("0.01")
+                billing.execute_transaction(self.creator, self.amount, ServiceTransaction)
+                return job_id
             if not model:
                 raise ValueError("Model is required for this action")
-            prediction = model.predict(self.image)
+            prediction = PREDICTION_CACHE.predict(model, self.image)
             self.result = prediction["output"]
             self.amount = Decimal("0.01") 
             billing.execute_transaction(self.creator, self.amount, ServiceTransaction)
                         
             pred_record = PredictionRecord(
-                prediction_id = len(HistoryManager.predictions) + 1,
+                prediction_id = HistoryManager.next_prediction_id(),
                 user_id = self.creator.id,
                 input_image = self.image,
                 output_result = self.result
@@ -255,7 +525,7 @@ class Event:
             HistoryManager.add_prediction(pred_record)
         
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True, init=False)
 class TransactionRecord:
     
     """Класс записи истории транзакций
@@ -264,43 +534,297 @@ class TransactionRecord:
         txn_id (int): id транзакции
         user_id (int): id пользователя
         txn_type (str): тип транзакции
-        amount (Decimal): сумма транзакции
-        timestamp (datetime): время совершения транзакции
+        amount (Decimal): сумма транзакции (хранится в amount_cents,
+            в конструктор можно сразу передать amount_cents)
+        ts (float): время совершения транзакции (unix time; конструктор
+            принимает и datetime - в ts или в прежнем аргументе timestamp)
         status (str) : статус
     """
     
     txn_id: int
     user_id: int
     txn_type: str
-    amount: Decimal
-    timestamp: datetime = field(default_factory=datetime.now)
-    status: str = "success"
+    amount_cents: int
+    ts: float
+    status: str
+
+    def __init__(self, txn_id: int, user_id: int, txn_type: str,
+                 amount: Optional[Decimal] = None, ts: Optional[float] = None,
+                 status: str = "success", amount_cents: Optional[int] = None,
+                 timestamp: Optional[datetime] = None):
+        setattr_ = object.__setattr__
+        setattr_(self, "txn_id", txn_id)
+        setattr_(self, "user_id", user_id)
+        setattr_(self, "txn_type", sys.intern(txn_type))
+        setattr_(self, "amount_cents", to_cents(amount) if amount_cents is None else amount_cents)
+        setattr_(self, "ts", record_ts(ts, timestamp))
+        setattr_(self, "status", sys.intern(status))
+
+    @property
+    def amount(self) -> Decimal:
+        return from_cents(self.amount_cents)
+
+    @property
+    def record_id(self) -> int:
+        return self.txn_id
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.ts)
+
+    def to_row(self) -> tuple:
+        return (self.txn_id, self.user_id, self.ts, self.txn_type, str(self.amount), self.status)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'TransactionRecord':
+        txn_id, user_id, ts, txn_type, amount, status = row
+        return cls(txn_id, user_id, txn_type, Decimal(amount), ts, status)
 
     def __repr__(self):
         return f"[{self.timestamp.strftime('%Y-%m-%d %H:%M')}] TXN-{self.txn_id}: {self.txn_type} | {self.amount} | User: {self.user_id}"
         
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True, init=False)
 class PredictionRecord:
-        """Класс записи истории предсказаний
+    """Класс записи истории предсказаний
     
     Attributes:
         prediction_id (int): id предсказания
         user_id (int): id пользователя
         input_image (str): изображение
         output_result (str): результат модели
-        timestamp (datetime): время совершения транзакции
+        ts (float): время предсказания (unix time; конструктор принимает
+            и datetime - в ts или в прежнем аргументе timestamp)
     """
     prediction_id: int
     user_id: int
     input_image: str
     output_result: str
-    timestamp: datetime = field(default_factory=datetime.now)
+    ts: float
+
+    def __init__(self, prediction_id: int, user_id: int, input_image: str,
+                 output_result: str, ts: Optional[float] = None,
+                 timestamp: Optional[datetime] = None):
+        setattr_ = object.__setattr__
+        setattr_(self, "prediction_id", prediction_id)
+        setattr_(self, "user_id", user_id)
+        setattr_(self, "input_image", input_image)
+        setattr_(self, "output_result", output_result)
+        setattr_(self, "ts", record_ts(ts, timestamp))
+
+    @property
+    def record_id(self) -> int:
+        return self.prediction_id
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.ts)
+
+    def to_row(self) -> tuple:
+        return (self.prediction_id, self.user_id, self.ts, self.input_image, self.output_result)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'PredictionRecord':
+        prediction_id, user_id, ts, input_image, output_result = row
+        return cls(prediction_id, user_id, input_image, output_result, ts)
 
     def __repr__(self):
         return f"[{self.timestamp.strftime('%Y-%m-%d %H:%M')}] PREDICT-{self.prediction_id}: User {self.user_id} | Res: {self.output_result}"
 
 
+def _record_size(record) -> int:
+    """Примерный объём записи в памяти журнала: объект, его строки и ссылки в индексах"""
+    size = sys.getsizeof(record) + _INDEX_OVERHEAD
+    for name in record.__slots__:
+        value = getattr(record, name)
+        if isinstance(value, str):
+            size += sys.getsizeof(value)
+    return size
+
+
+# Ссылки в _records и _by_user и float в _ts
+_INDEX_OVERHEAD = 2 * 8 + sys.getsizeof(0.0)
+
+
+def _close_spill(db: sqlite3.Connection, temporary: Optional[Path]) -> None:
+    db.close()
+    if temporary is not None:
+        temporary.unlink(missing_ok=True)
+
+
+class HistoryLog:
+    """ Журнал записей одного типа с индексами по пользователю и времени.
+    
+    Последние записи хранятся в памяти, более старые выгружаются в SQLite,
+    как только превышен бюджет: max_in_memory записей или max_bytes байт
+    (оценка через sys.getsizeof). Выгружается пачка до половины бюджета.
+    Без open() выгрузка идёт во временный файл, он удаляется в close()
+    или при сборке журнала.
+    
+    Записи можно добавлять не по порядку времени: тогда between переходит
+    с бинарного поиска на просмотр записей в памяти.
+    
+    Attributes:
+        table (str): имя таблицы для выгрузки
+        record_cls: класс записи (TransactionRecord / PredictionRecord)
+        columns (str): колонки таблицы, первые три - id, user_id, ts
+        max_in_memory (int): сколько записей держать в памяти
+        max_bytes (Optional[int]): сколько байт записей держать в памяти
+    """
+    
+    def __init__(self, table: str, record_cls: type, columns: str, max_in_memory: int = 100_000,
+                 max_bytes: Optional[int] = None):
+        self.table = table
+        self.record_cls = record_cls
+        self.columns = columns
+        self.max_in_memory = max_in_memory
+        self.max_bytes = max_bytes
+        self.db_path: Optional[Path] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._close_db: Optional[weakref.finalize] = None
+        self._temporary = False
+        self._spilled = 0
+        self._records: List = []
+        self._ts: List[float] = []
+        self._ordered = True
+        self._bytes = 0
+        self._by_user: Dict[int, List] = {}
+        self._ids = count(1)
+        self._lock = threading.RLock()
+
+    def next_id(self) -> int:
+        """Монотонный id, не зависящий от числа записей в памяти"""
+        with self._lock:
+            return next(self._ids)
+
+    def append(self, record) -> None:
+        with self._lock:
+            if self._ts and record.ts < self._ts[-1]:
+                self._ordered = False
+            self._records.append(record)
+            self._ts.append(record.ts)
+            self._bytes += _record_size(record)
+            self._by_user.setdefault(record.user_id, []).append(record)
+            if len(self._records) > self.max_in_memory:
+                self._spill(max(1, self.max_in_memory // 2))
+            elif self.max_bytes is not None and self._bytes > self.max_bytes:
+                self._spill(self._count_to_free(self._bytes - self.max_bytes // 2))
+
+    def _count_to_free(self, nbytes: int) -> int:
+        """Сколько самых старых записей занимают не меньше nbytes"""
+        freed = 0
+        for n, record in enumerate(self._records, 1):
+            freed += _record_size(record)
+            if freed >= nbytes:
+                return n
+        return len(self._records)
+
+    def open(self, db_path: str) -> None:
+        """Подключает файл выгрузки и продолжает нумерацию после уже сохранённых записей"""
+        with self._lock:
+            self.close()
+            self.db_path = Path(db_path)
+            stored, max_id = self._connect().execute(
+                f"SELECT COUNT(*), MAX(id) FROM {self.table}").fetchone()
+            self._spilled = stored
+            if max_id is not None:
+                last = max([max_id] + [record.record_id for record in self._records])
+                self._ids = count(last + 1)
+
+    def close(self) -> None:
+        """Закрывает файл выгрузки; временный файл удаляется вместе с выгруженными записями"""
+        with self._lock:
+            if self._close_db is not None:
+                self._close_db()
+                self._close_db = None
+            self._db = None
+            if self._temporary:
+                self.db_path = None
+                self._temporary = False
+                self._spilled = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.db_path is None:
+                fd, path = tempfile.mkstemp(prefix=f"{self.table}-", suffix=".sqlite3")
+                os.close(fd)
+                self.db_path = Path(path)
+                self._temporary = True
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._close_db = weakref.finalize(
+                self, _close_spill, self._db, self.db_path if self._temporary else None)
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({self.columns})")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_user ON {self.table} (user_id, id)")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_ts ON {self.table} (ts)")
+        return self._db
+
+    def _spill(self, n: int) -> None:
+        """Выгружает n самых старых записей на диск"""
+        old = self._records[:n]
+        db = self._connect()
+        placeholders = ", ".join("?" * len(old[0].to_row()))
+        with db:
+            db.executemany(f"INSERT INTO {self.table} VALUES ({placeholders})",
+                           (record.to_row() for record in old))
+        self._bytes -= sum(_record_size(record) for record in old)
+        del self._records[:n]
+        del self._ts[:n]
+        if not self._ordered:
+            self._ordered = all(a <= b for a, b in zip(self._ts, self._ts[1:]))
+        per_user = Counter(record.user_id for record in old)
+        for user_id, k in per_user.items():
+            user_records = self._by_user[user_id]
+            del user_records[:k]
+            if not user_records:
+                del self._by_user[user_id]
+        self._spilled += n
+
+    def _query(self, sql: str, params: tuple) -> List:
+        if not self._spilled:
+            return []
+        rows = self._connect().execute(f"SELECT * FROM {self.table} {sql}", params)
+        return [self.record_cls.from_row(row) for row in rows]
+
+    def last_for_user(self, user_id: int, limit: int = 50) -> List:
+        """Последние limit записей пользователя, от новых к старым - O(limit)"""
+        with self._lock:
+            user_records = self._by_user.get(user_id, [])
+            result = user_records[:-limit - 1:-1] if limit else []
+            if len(result) < limit:
+                result += self._query("WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                                      (user_id, limit - len(result)))
+            return result
+
+    def between(self, start: datetime, end: datetime) -> List:
+        """
+        Записи за интервал времени [start, end] по возрастанию времени.
+
+        Бинарный поиск по индексу времени, пока записи добавлялись по
+        порядку; иначе - просмотр записей в памяти.
+        """
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        with self._lock:
+            result = self._query("WHERE ts BETWEEN ? AND ? ORDER BY ts", (start_ts, end_ts))
+            if self._ordered:
+                lo = bisect_left(self._ts, start_ts)
+                hi = bisect_right(self._ts, end_ts)
+                in_memory = self._records[lo:hi]
+            else:
+                in_memory = sorted((record for record in self._records
+                                    if start_ts <= record.ts <= end_ts), key=attrgetter("ts"))
+            return list(merge(result, in_memory, key=attrgetter("ts")))
+
+    def __len__(self) -> int:
+        return self._spilled + len(self._records)
+
+    def __iter__(self):
+        with self._lock:
+            spilled = self._query("ORDER BY id", ()) if self._spilled else []
+            records = list(self._records)
+        yield from spilled
+        yield from records
+
+
 class HistoryManager:
     
     """ Класс для хранения истории событий 
@@ -310,8 +834,22 @@ class HistoryManager:
         predictions: Предсказания
     """
     
-    transactions: List[TransactionRecord] = []
-    predictions: List[PredictionRecord] = []
+    transactions = HistoryLog(
+        "transactions", TransactionRecord,
+        "id INTEGER PRIMARY KEY, user_id INTEGER, ts REAL, txn_type TEXT, amount TEXT, status TEXT")
+    predictions = HistoryLog(
+        "predictions", PredictionRecord,
+        "id INTEGER PRIMARY KEY, user_id INTEGER, ts REAL, input_image TEXT, output_result TEXT")
+
+    @classmethod
+    def configure(cls, max_in_memory: int, db_path: Optional[str] = None,
+                  max_bytes: Optional[int] = None) -> None:
+        """Задаёт бюджет памяти (записей и байт на журнал) и файл для выгрузки"""
+        for log in (cls.transactions, cls.predictions):
+            log.max_in_memory = max_in_memory
+            log.max_bytes = max_bytes
+            if db_path is not None:
+                log.open(db_path)
 
     @classmethod
     def add_transaction(cls, record: TransactionRecord):
@@ -321,6 +859,18 @@ class HistoryManager:
     def add_prediction(cls, record: PredictionRecord):
         cls.predictions.append(record)
 
+    @classmethod
+    def next_prediction_id(cls) -> int:
+        return cls.predictions.next_id()
+
+    @classmethod
+    def user_predictions(cls, user_id: int, limit: int = 50) -> List[PredictionRecord]:
+        return cls.predictions.last_for_user(user_id, limit)
+
+    @classmethod
+    def user_transactions(cls, user_id: int, limit: int = 50) -> List[TransactionRecord]:
+        return cls.transactions.last_for_user(user_id, limit)
+
 
             
 def main() -> None:
@@ -357,7 +907,8 @@ def main() -> None:
         print(f"Created user: {user}")
         print(f"Number of user events: {len(user.events)}")
         
-    except ValueError as e:
+    except (ValueError, RuntimeError) as e:
+        # RuntimeError - модель не загрузилась (нет или повреждён файл весов)
         print(f"Error: {e}")
 
 
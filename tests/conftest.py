@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Код приложения импортируется так же, как в контейнере: из каталога app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
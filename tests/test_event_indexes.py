@@ -0,0 +1,52 @@
+"""
+Горячие запросы к событиям идут по индексам (EXPLAIN на временной SQLite).
+
+Тот же разбор планов на Postgres - benchmarks/check_event_indexes.py.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlmodel import SQLModel
+
+from database.database import _import_models
+from database.schema import ensure_indexes, explain
+from models.event import MODEL_CALL_TITLE, Event
+from models.user import User
+from services.crud.event import model_calls_statement, user_events_statement
+
+USERS, EVENTS = 20, 100
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    _import_models()
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('db') / 'events.db'}")
+    SQLModel.metadata.create_all(engine)
+    ensure_indexes(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "email": f"user{i}@mail.ru", "password_hash": "x" * 64,
+             "created_at": NOW} for i in range(1, USERS + 1)])
+        conn.execute(insert(Event), [
+            {"creator_id": user_id,
+             "title": MODEL_CALL_TITLE if n % 20 == 0 else "Пополнение",
+             "image": "bird.jpg", "description": "",
+             "created_at": NOW - timedelta(minutes=n * USERS + user_id)}
+            for user_id in range(1, USERS + 1) for n in range(EVENTS)])
+        conn.execute(text("ANALYZE"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("statement, index", [
+    (user_events_statement(7, limit=50), "ix_event_creator_id_created_at"),
+    (user_events_statement(7, (NOW - timedelta(days=1), 10**9), 50),
+     "ix_event_creator_id_created_at"),
+    (model_calls_statement(NOW - timedelta(days=1), NOW, 100),
+     "ix_event_model_calls_created_at"),
+], ids=["user_events", "user_events.after", "model_calls"])
+def test_event_query_uses_index(engine, statement, index):
+    plan = explain(engine, statement)
+    assert index in plan, plan